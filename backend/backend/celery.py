@@ -1,6 +1,8 @@
 import os
 from celery import Celery
-from celery.schedules import crontab  
+from celery.schedules import crontab
+from celery.signals import celeryd_init
+from kombu import Queue
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
@@ -8,10 +10,90 @@ app = Celery('backend')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
+# Task queues
+# - alerts: emergency alert fan-out, must never wait behind other work
+# - notifications: transactional emails/SMS/push
+# - bulk: nightly syncs and cleanups that may run for minutes
+app.conf.task_queues = (
+    Queue('alerts', routing_key='alerts'),
+    Queue('notifications', routing_key='notifications'),
+    Queue('bulk', routing_key='bulk'),
+)
+app.conf.task_default_queue = 'notifications'
+app.conf.task_default_routing_key = 'notifications'
+
+app.conf.task_routes = {
+    'estates.tasks.send_email_alert': {'queue': 'alerts'},
+    'estates.tasks.send_sms_alert_batch': {'queue': 'alerts'},
+    'estates.tasks.escalate_notification': {'queue': 'alerts'},
+    'estates.tasks.send_due_payment_notification': {'queue': 'notifications'},
+    'estates.tasks.send_account_approved_email': {'queue': 'notifications'},
+    'estates.tasks.send_payment_approved_email': {'queue': 'notifications'},
+    'estates.tasks.generate_receipt': {'queue': 'notifications'},
+    'estates.tasks.process_webhook_events': {'queue': 'notifications'},
+    'estates.tasks.requeue_pending_webhook_events': {'queue': 'notifications'},
+    'estates.tasks.sync_subscriptions_from_paystack': {'queue': 'bulk'},
+    'estates.tasks.cleanup_expired_codes': {'queue': 'bulk'},
+    'estates.tasks.expire_subscriptions': {'queue': 'bulk'},
+    'estates.tasks.generate_report': {'queue': 'bulk'},
+    'estates.tasks.cleanup_report_jobs': {'queue': 'bulk'},
+    'estates.tasks.notify_subscription_expiry': {'queue': 'notifications'},
+}
+
+# Default worker concurrency per queue. Run one worker per queue, e.g.
+#   celery -A backend worker -Q alerts -n alerts@%h
+#   celery -A backend worker -Q notifications -n notifications@%h
+#   celery -A backend worker -Q bulk -n bulk@%h
+# An explicit -c/--concurrency on the command line always wins.
+QUEUE_CONCURRENCY = {
+    'alerts': 8,
+    'notifications': 4,
+    'bulk': 1,
+}
+
+
+@celeryd_init.connect
+def configure_queue_worker(sender=None, conf=None, options=None, **kwargs):
+    """Apply per-queue concurrency and prefetch settings to a dedicated worker."""
+    options = options or {}
+    queues = options.get('queues') or []
+    if isinstance(queues, str):
+        queues = [q.strip() for q in queues.split(',') if q.strip()]
+
+    if len(queues) != 1 or queues[0] not in QUEUE_CONCURRENCY:
+        return
+
+    queue = queues[0]
+    if not options.get('concurrency'):
+        conf.worker_concurrency = QUEUE_CONCURRENCY[queue]
+
+    if queue == 'alerts':
+        # Take one message at a time so a slow send never holds alerts hostage
+        conf.worker_prefetch_multiplier = 1
+        conf.task_acks_late = True
+
+
 # Celery Beat Schedule
 app.conf.beat_schedule = {
     'sync-subscriptions-daily': {
-        'task': 'estates.tasks.sync_subscriptions_from_paystack', 
-        'schedule': crontab(hour=0, minute=0),  
+        'task': 'estates.tasks.sync_subscriptions_from_paystack',
+        'schedule': crontab(hour=0, minute=0),
+    },
+    'cleanup-expired-visitor-codes-hourly': {
+        'task': 'estates.tasks.cleanup_expired_codes',
+        'schedule': crontab(minute=30),
+    },
+    'requeue-pending-webhook-events': {
+        'task': 'estates.tasks.requeue_pending_webhook_events',
+        'schedule': crontab(minute='*/5'),
+    },
+    'cleanup-report-jobs-hourly': {
+        'task': 'estates.tasks.cleanup_report_jobs',
+        'schedule': crontab(minute=45),
+    },
+    'expire-subscriptions-nightly': {
+        # After the midnight sync, so renewals Paystack already took are applied first
+        'task': 'estates.tasks.expire_subscriptions',
+        'schedule': crontab(hour=1, minute=0),
     },
 }
@@ -75,6 +75,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'estates.middleware.AuditLogMiddleware',  # Add audit logging middleware
+    'estates.middleware.SubscriptionGateMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -125,12 +126,23 @@ REST_FRAMEWORK = {
 }
 
 
-# Cache for rate limiting
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Cache for rate limiting and metrics
+# Set CACHE_URL (e.g. redis://...) so web and Celery worker processes share one cache;
+# production refuses to start without it (see production.py)
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
@@ -155,15 +167,58 @@ CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/
 CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
+# Maximum acceptable enqueue-to-start time (seconds) per queue before we log a warning
+CELERY_QUEUE_WAIT_BUDGETS = {
+    'alerts': 5,
+    'notifications': 60,
+}
+
+# Expired visitor code cleanup (runs hourly via Celery beat)
+VISITOR_CODE_CLEANUP_BATCH_SIZE = 1000
+VISITOR_CODE_CLEANUP_MAX_RUNTIME = 60  # seconds per run
 
 # Paystack settings - with defaults
 PAYSTACK_SECRET_KEY = config('PAYSTACK_SECRET_KEY', default='')
 PAYSTACK_PUBLIC_KEY = config('PAYSTACK_PUBLIC_KEY', default='')
+PAYSTACK_BASE_URL = config('PAYSTACK_BASE_URL', default='https://api.paystack.co')
+PAYSTACK_MAX_RETRIES = config('PAYSTACK_MAX_RETRIES', default=3, cast=int)
+PAYSTACK_RETRY_BACKOFF = 0.5  # seconds, doubled on each retry
+PAYSTACK_SYNC_PAGE_SIZE = config('PAYSTACK_SYNC_PAGE_SIZE', default=100, cast=int)
+PAYSTACK_TIMEOUT = config('PAYSTACK_TIMEOUT', default=30, cast=int)
+PAYSTACK_FULL_SYNC_INTERVAL_DAYS = config('PAYSTACK_FULL_SYNC_INTERVAL_DAYS', default=7, cast=int)
+PAYSTACK_SYNC_LOCK_TIMEOUT = 60 * 60  # seconds a sync may hold the single-flight lock
+WEBHOOK_MAX_ATTEMPTS = 5  # tries per stored webhook event before it is left as failed
+ENTITLEMENT_CACHE_TIMEOUT = 60 * 60  # seconds; entries are also dropped whenever a subscription changes
+# 'user': every resident needs their own subscription. 'estate': an EstateSubscription covers all
+# the estate's residents, who fall back to their own subscription if the estate has none.
+SUBSCRIPTION_ENTITLEMENT_SCOPE = config('SUBSCRIPTION_ENTITLEMENT_SCOPE', default='user')
+SUBSCRIPTION_CANCEL_AFTER_DAYS = 14  # days past the billing date before a past_due subscription is cancelled
+REPORT_CHUNK_SIZE = 2000  # rows fetched per query while rendering PDF reports
+REPORT_SPOOL_MAX_SIZE = 5 * 1024 * 1024  # bytes of report PDF kept in memory before spilling to a temp file
+REPORT_CACHE_MAX_AGE = 60 * 60  # seconds a rendered report is reused while its data watermark is unchanged
+REPORT_RENDER_TIMEOUT = 15 * 60  # seconds a report job may stay pending/running before it's failed as lost
+REPORT_RETENTION = 24 * 60 * 60  # seconds rendered reports and their jobs are kept (cleanup_report_jobs)
+
+# Paths gated on an active subscription by SubscriptionGateMiddleware (regexes on request.path_info)
+SUBSCRIPTION_GATED_PATHS = [
+    r'^/api/dashboard/$',
+]
+SUBSCRIPTION_ADMIN_GATED_PATHS = [
+    r'^/api/admin/pending-residents/$',
+    r'^/api/admin/approve-resident/\d+/$',
+    r'^/api/admin/residents/pdf/$',
+    r'^/api/admin/residents/export/$',
+    r'^/api/admin/reports/',
+]
 
 # Twilio settings (for SMS)
 TWILIO_ACCOUNT_SID = config('TWILIO_ACCOUNT_SID', default='')
 TWILIO_AUTH_TOKEN = config('TWILIO_AUTH_TOKEN', default='')
 TWILIO_PHONE_NUMBER = config('TWILIO_PHONE_NUMBER', default='') 
+TWILIO_API_BASE_URL = config('TWILIO_API_BASE_URL', default='')  # override for a local stand-in API
+TWILIO_HTTP_TIMEOUT = config('TWILIO_HTTP_TIMEOUT', default=10, cast=int)
+SMS_MAX_CONCURRENCY = config('SMS_MAX_CONCURRENCY', default=8, cast=int)  # parallel sends per alert fan-out
+SMS_DEFAULT_COUNTRY_CODE = '234'  # used to match local (0803...) and international numbers
 
 # Vapid keys for push notifications
 VAPID_PUBLIC_KEY = config('VAPID_PUBLIC_KEY')
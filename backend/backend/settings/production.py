@@ -3,6 +3,7 @@ Django production settings - CSRF Fixed Version
 """
 
 from .base import *
+from django.core.exceptions import ImproperlyConfigured
 import dj_database_url
 import os
 
@@ -12,6 +13,14 @@ SECRET_KEY = config('SECRET_KEY')
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = config('DEBUG', default=False, cast=bool)
 
+# Cached subscription entitlements are invalidated by Celery workers (webhooks,
+# the Paystack sync, the expiry sweep), which a per-process LocMemCache in the
+# web processes would never see
+if not CACHE_URL and not DEBUG:
+    raise ImproperlyConfigured(
+        "CACHE_URL must point at a cache shared by web and worker processes (e.g. redis://...)"
+    )
+
 # Production allowed hosts
 ALLOWED_HOSTS_RAW = config('ALLOWED_HOSTS', default='*.railway.app,*.vercel.app')
 ALLOWED_HOSTS = [host.strip() for host in ALLOWED_HOSTS_RAW.split(',') if host.strip()]
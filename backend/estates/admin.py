@@ -87,8 +87,34 @@ class SubscriptionPlanAdmin(admin.ModelAdmin):
 
 
 @admin.register(UserSubscription)
-class EstateSubscriptionAdmin(admin.ModelAdmin):
+class UserSubscriptionAdmin(admin.ModelAdmin):
     list_display = ('user', 'plan', 'status', 'next_billing_date')
     readonly_fields = ('created_at', 'updated_at')
     list_filter  = ('status',)
     search_fields = ('user__name', 'paystack_subscription_code')
+
+
+@admin.register(EstateSubscription)
+class EstateSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('estate', 'plan', 'status', 'next_billing_date')
+    readonly_fields = ('created_at', 'updated_at')
+    list_filter  = ('status',)
+    search_fields = ('estate__name', 'paystack_subscription_code')
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('received_at', 'event', 'customer_key', 'status', 'attempts', 'processed_at')
+    list_filter = ('status', 'event')
+    search_fields = ('customer_key', 'event_id')
+    readonly_fields = ('event_id', 'event', 'customer_key', 'payload', 'received_at', 'processed_at', 'last_error')
+    ordering = ('-received_at',)
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'estate', 'report', 'status', 'row_count', 'finished_at')
+    list_filter = ('status', 'report')
+    search_fields = ('estate__name', 'job_id')
+    readonly_fields = ('job_id', 'watermark', 'created_at', 'finished_at', 'error')
+    ordering = ('-created_at',)
@@ -7,3 +7,4 @@ class EstatesConfig(AppConfig):
 
     def ready(self):
         import estates.signals
+        import estates.task_metrics
@@ -0,0 +1,245 @@
+# estates/entitlements.py
+"""
+Cached subscription entitlements and the subscription gate.
+
+A user's entitlement is just their subscription status and billing date (or
+their estate's, in estate scope), kept in the shared cache so gated requests don't touch the database. Expiry
+and grace period are worked out from the cached timestamp on every check, so
+entries never go stale with time; they're only dropped when the subscription
+itself changes (model signals, webhook and sync updates). Most of those
+happen in Celery workers, so the cache has to be shared with them (CACHE_URL,
+required in production).
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+
+ENTITLEMENT_KEY = 'entitlement:user:{}'
+ESTATE_ENTITLEMENT_KEY = 'entitlement:estate:{}'
+GRACE_PERIOD = timedelta(days=1)
+
+# Cached for users and estates without a subscription, so they're a cache hit too
+NO_SUBSCRIPTION = ('', None)
+
+
+class Entitlement:
+    """
+    Read-only view of a user's or estate's subscription as the gates need it.
+
+    Mirrors the UserSubscription checks (is_active, is_expired,
+    grace_period_active) so callers can use it in its place.
+    """
+
+    def __init__(self, status, next_billing_date):
+        self.status = status
+        self.next_billing_date = next_billing_date
+
+    def is_active(self):
+        if self.status != 'active':
+            return False
+        return timezone.now() < (self.next_billing_date + GRACE_PERIOD)
+
+    def is_expired(self):
+        return timezone.now() > self.next_billing_date
+
+    def grace_period_active(self):
+        if not self.is_expired():
+            return False
+        return timezone.now() < (self.next_billing_date + GRACE_PERIOD)
+
+
+def _load(model, **lookup):
+    row = model.objects.filter(**lookup).values_list('status', 'next_billing_date').first()
+    if not row:
+        return NO_SUBSCRIPTION
+    status, next_billing_date = row
+    return (status, next_billing_date.timestamp())
+
+
+def _cached_entitlement(key, model, **lookup):
+    cached = cache.get(key)
+    if cached is None:
+        cached = _load(model, **lookup)
+        cache.set(key, cached, timeout=getattr(settings, 'ENTITLEMENT_CACHE_TIMEOUT', 60 * 60))
+
+    status, timestamp = cached
+    if not status:
+        return None
+    return Entitlement(status, datetime.fromtimestamp(timestamp, tz=dt_timezone.utc))
+
+
+def get_estate_entitlement(estate_id):
+    """
+    Return an estate's entitlement, shared by all of its residents.
+
+    Returns:
+        Entitlement: The estate's subscription state, or None if it has none
+    """
+    from .models import EstateSubscription
+    return _cached_entitlement(ESTATE_ENTITLEMENT_KEY.format(estate_id), EstateSubscription, estate_id=estate_id)
+
+
+def get_entitlement(user):
+    """
+    Return the user's entitlement, loading it into the cache on a miss.
+
+    With SUBSCRIPTION_ENTITLEMENT_SCOPE = 'estate', a user whose estate has
+    an EstateSubscription gets the estate's entitlement (one cache entry for
+    the whole estate); everyone else falls back to their own subscription.
+
+    Returns:
+        Entitlement: The user's subscription state, or None if they have none
+    """
+    from .models import UserSubscription
+
+    if user.estate_id and getattr(settings, 'SUBSCRIPTION_ENTITLEMENT_SCOPE', 'user') == 'estate':
+        entitlement = get_estate_entitlement(user.estate_id)
+        if entitlement is not None:
+            return entitlement
+    return _cached_entitlement(ENTITLEMENT_KEY.format(user.pk), UserSubscription, user_id=user.pk)
+
+
+def invalidate_entitlements(user_ids):
+    """
+    Drop cached entitlements for the given users.
+
+    Entries are dropped straight away and again once the surrounding
+    transaction commits, so a request that reads the old row in between
+    can't leave it cached.
+    """
+    keys = [ENTITLEMENT_KEY.format(user_id) for user_id in set(user_ids) if user_id]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_entitlement(user_id):
+    invalidate_entitlements([user_id])
+
+
+def invalidate_estate_entitlement(estate_id):
+    """Drop an estate's cached entitlement (on commit as well, like users')."""
+    key = ESTATE_ENTITLEMENT_KEY.format(estate_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+# -------------------- GATE --------------------
+
+def _user_denial(entitlement):
+    if entitlement is None:
+        return ({
+            'error': 'No subscription found for your account.',
+            'message': 'Please subscribe to access the platform.',
+            'action_required': 'setup_subscription'
+        }, status.HTTP_402_PAYMENT_REQUIRED)
+
+    if entitlement.is_active():
+        return None
+
+    # Provide specific error messages based on status
+    if entitlement.status == 'cancelled':
+        return ({
+            'error': 'Your subscription has been cancelled.',
+            'message': 'Please renew your subscription to continue using the service.',
+            'action_required': 'renew_subscription'
+        }, status.HTTP_402_PAYMENT_REQUIRED)
+
+    if entitlement.status == 'past_due':
+        return ({
+            'error': 'Your subscription payment is past due.',
+            'message': 'Please update your payment method to restore access.',
+            'action_required': 'update_payment'
+        }, status.HTTP_402_PAYMENT_REQUIRED)
+
+    if entitlement.is_expired():
+        if entitlement.grace_period_active():
+            return ({
+                'error': 'Your subscription has expired but is in grace period.',
+                'message': 'Please renew immediately to avoid service interruption.',
+                'action_required': 'renew_subscription',
+                'grace_period': True
+            }, status.HTTP_402_PAYMENT_REQUIRED)
+        return ({
+            'error': 'Your subscription has expired.',
+            'message': 'Please renew your subscription to continue using the service.',
+            'expired_date': entitlement.next_billing_date.isoformat(),
+            'action_required': 'renew_subscription'
+        }, status.HTTP_402_PAYMENT_REQUIRED)
+
+    return ({
+        'error': f'Your subscription is {entitlement.status}.',
+        'message': 'Please contact support for assistance.',
+        'action_required': 'contact_support'
+    }, status.HTTP_402_PAYMENT_REQUIRED)
+
+
+def _admin_denial(user, entitlement):
+    if not user.estate_id:
+        return ({'error': 'No estate associated with your account.'},
+                status.HTTP_403_FORBIDDEN)
+
+    if entitlement is None:
+        return ({
+            'error': 'No subscription found for you.',
+            'message': 'Please set up a subscription to access admin features.',
+            'action_required': 'setup_subscription'
+        }, status.HTTP_402_PAYMENT_REQUIRED)
+
+    if not entitlement.is_active():
+        return ({
+            'error': 'User subscription is not active.',
+            'message': 'Please ensure your subscription is active to access admin features.',
+            'status': entitlement.status,
+            'next_billing_date': entitlement.next_billing_date.isoformat(),
+            'action_required': 'renew_subscription'
+        }, status.HTTP_402_PAYMENT_REQUIRED)
+
+    return None
+
+
+def check_subscription(request, admin=False, user=None):
+    """
+    Run the subscription gate for a request.
+
+    The entitlement is resolved at most once per request and attached as
+    request.entitlement, so the middleware, the decorators and the views
+    all share it.
+
+    Args:
+        request: Django HttpRequest or DRF Request
+        admin (bool, optional): Apply the admin-only gate
+        user (User, optional): User to check instead of request.user
+
+    Returns:
+        tuple: (payload, status_code) to deny with, or None to let it through
+    """
+    # DRF's Request only proxies reads, so memoise on the underlying request
+    http_request = getattr(request, '_request', request)
+    user = user or request.user
+
+    if not user.is_authenticated:
+        return ({'error': 'Authentication required.'}, status.HTTP_401_UNAUTHORIZED)
+
+    # Allow superusers to bypass subscription checks
+    if user.is_superuser:
+        return None
+
+    if admin and user.role != 'admin':
+        return ({'error': 'Admin access required.'}, status.HTTP_403_FORBIDDEN)
+    if not admin and user.role not in ['admin', 'resident']:
+        return ({'error': 'Access restricted to authorized users only.'},
+                status.HTTP_403_FORBIDDEN)
+
+    if not hasattr(http_request, 'entitlement'):
+        http_request.entitlement = get_entitlement(user)
+    entitlement = http_request.entitlement
+
+    if admin:
+        return _admin_denial(user, entitlement)
+    return _user_denial(entitlement)
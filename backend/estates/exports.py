@@ -0,0 +1,193 @@
+# estates/exports.py
+"""
+CSV and XLSX exports of payment records and residents.
+
+Rows are read with .iterator() and written out as they arrive. CSV is
+streamed straight into a StreamingHttpResponse, so memory stays flat however
+many rows there are. XLSX uses openpyxl's write-only workbook (rows go to
+a temp file as they're appended) and is spooled like the PDF reports,
+since a zip archive can't be sent before it's finished.
+"""
+
+import csv
+import re
+from tempfile import SpooledTemporaryFile
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from openpyxl import Workbook
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+PAYMENT_EXPORT_COLUMNS = [
+    'Payment ID', 'Resident', 'Email', 'Due', 'Amount Paid', 'Payment Date',
+    'Status', 'Approved By', 'Approved At',
+]
+RESIDENT_EXPORT_COLUMNS = [
+    'Name', 'Email', 'Phone', 'Address', 'House Type', 'Type', 'Status', 'Date Joined',
+]
+RESIDENT_STATUSES = ['approved', 'pending']
+
+
+EXPORT_FORMATS = ['csv', 'xlsx']
+
+
+def _chunk_size():
+    return getattr(settings, 'REPORT_CHUNK_SIZE', 2000)
+
+
+def _date_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f"{name} must be a date (YYYY-MM-DD)")
+    return parsed
+
+
+def _date_range(params, field):
+    """Lookups for the inclusive date_from/date_to query params."""
+    lookups = {}
+    date_from = _date_param(params, 'date_from')
+    date_to = _date_param(params, 'date_to')
+    if date_from and date_to and date_from > date_to:
+        raise ValueError("date_from must not be after date_to")
+    if date_from:
+        lookups[f'{field}__date__gte'] = date_from
+    if date_to:
+        lookups[f'{field}__date__lte'] = date_to
+    return lookups
+
+
+def payment_export_filters(params):
+    """
+    Queryset filters for a payments export from request query params.
+
+    Supports date_from/date_to (payment date, inclusive), due (id) and
+    status. Raises ValueError with a message for the client on bad input.
+    """
+    from .models import DuePayment
+
+    lookups = _date_range(params, 'payment_date')
+    due = params.get('due')
+    if due:
+        if not due.isdigit():
+            raise ValueError("due must be a due id")
+        lookups['due_id'] = int(due)
+    payment_status = params.get('status')
+    if payment_status:
+        choices = [choice for choice, _ in DuePayment.PAYMENT_STATUS_CHOICES]
+        if payment_status not in choices:
+            raise ValueError(f"status must be one of: {', '.join(choices)}")
+        lookups['status'] = payment_status
+    return lookups
+
+
+def resident_export_filters(params):
+    """
+    Queryset filters for a residents export from request query params.
+
+    Supports date_from/date_to (date joined, inclusive) and status
+    ('approved' or 'pending'; approved residents only by default, as in
+    the PDF report).
+    """
+    lookups = _date_range(params, 'date_joined')
+    resident_status = params.get('status') or 'approved'
+    if resident_status not in RESIDENT_STATUSES:
+        raise ValueError(f"status must be one of: {', '.join(RESIDENT_STATUSES)}")
+    lookups['is_approved'] = resident_status == 'approved'
+    return lookups
+
+
+def _timestamp(value):
+    return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+def payment_export_rows(estate, **filters):
+    """Payment export rows for an estate, read in chunks."""
+    from .models import DuePayment
+
+    payments = DuePayment.objects.filter(due__estate=estate, **filters).order_by('id').values_list(
+        'id', 'resident__first_name', 'resident__last_name', 'resident__email', 'due__title',
+        'amount_paid', 'payment_date', 'status', 'approved_by__first_name', 'approved_by__last_name',
+        'approved_at',
+    )
+    for (payment_id, first_name, last_name, email, title, amount, paid_at, payment_status,
+         approver_first, approver_last, approved_at) in payments.iterator(chunk_size=_chunk_size()):
+        approved_by = f"{approver_first or ''} {approver_last or ''}".strip()
+        yield [
+            payment_id, f"{first_name} {last_name}".strip(), email, title, amount,
+            _timestamp(paid_at), payment_status, approved_by, _timestamp(approved_at),
+        ]
+
+
+def resident_export_rows(estate, **filters):
+    """Residents export rows for an estate, read in chunks."""
+    from .models import User
+
+    residents = User.objects.filter(estate=estate, **filters).order_by('id').values_list(
+        'first_name', 'last_name', 'email', 'phone_number', 'home_address', 'house_type',
+        'resident_type', 'is_approved', 'date_joined',
+    )
+    for (first_name, last_name, email, phone, address, house_type, resident_type,
+         is_approved, joined) in residents.iterator(chunk_size=_chunk_size()):
+        yield [
+            f"{first_name} {last_name}".strip(), email, phone, address, house_type,
+            resident_type or '', 'approved' if is_approved else 'pending', _timestamp(joined),
+        ]
+
+
+_NUMBER_LIKE = re.compile(r'[+-]?[\d\s().-]+')
+
+
+def _safe_cell(value):
+    # Spreadsheet apps run cells starting with these as formulas; phone
+    # numbers like +234... are left alone
+    if (isinstance(value, str) and value[:1] in ('=', '+', '-', '@', '\t', '\r')
+            and not _NUMBER_LIKE.fullmatch(value)):
+        return "'" + value
+    return value
+
+
+class _Echo:
+    """File-like object whose write() hands back what it's given, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_response(columns, rows, filename):
+    """Stream rows as a CSV attachment, one line at a time."""
+    writer = csv.writer(_Echo())
+
+    def lines():
+        # Byte order mark so Excel reads the file as UTF-8 (₦, accented names)
+        yield '\ufeff' + writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow([_safe_cell(value) for value in row])
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def xlsx_response(columns, rows, filename, title):
+    """Write rows to a write-only workbook, spool it and stream it back."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title)
+    sheet.append(columns)
+    for row in rows:
+        sheet.append([_safe_cell(value) for value in row])
+
+    out = SpooledTemporaryFile(max_size=getattr(settings, 'REPORT_SPOOL_MAX_SIZE', 5 * 1024 * 1024))
+    workbook.save(out)
+    out.seek(0)
+    return FileResponse(out, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def export_response(file_format, columns, rows, basename, title):
+    if file_format == 'xlsx':
+        return xlsx_response(columns, rows, f'{basename}.xlsx', title)
+    return csv_response(columns, rows, f'{basename}.csv')
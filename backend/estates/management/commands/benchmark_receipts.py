@@ -0,0 +1,74 @@
+# estates/management/commands/benchmark_receipts.py
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from estates.models import Due, DuePayment, Estate, User
+from estates.receipts import ReceiptRenderer, get_receipt_renderer
+
+
+def _payments(count):
+    """Unsaved approved payments; rendering never touches the database."""
+    estate = Estate(name="Receipt Bench Estate", address="1 Bench Rd")
+    admin = User(first_name="Bench", last_name="Admin")
+    resident = User(first_name="Bench", last_name="Resident")
+    due = Due(
+        estate=estate, title="Service charge", amount=Decimal('5000'),
+        description="Monthly service charge covering security, waste collection and street lighting " * 2,
+    )
+    now = timezone.now()
+    return [
+        DuePayment(
+            id=n + 1, due=due, resident=resident, amount_paid=Decimal('5000'),
+            status='approved', approved_by=admin, approved_at=now,
+            admin_notes="Verified against the bank statement for this month" if n % 2 else '',
+        )
+        for n in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Report receipts/sec for single and batch receipt PDF generation, with the "
+        "styles and static flowables rebuilt per receipt or shared by one renderer"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200,
+                            help="Receipts per batch")
+        parser.add_argument('--repeat', type=int, default=3,
+                            help="Runs per measurement; the best one is reported")
+
+    def handle(self, *args, **options):
+        payments = _payments(options['count'])
+        repeat = max(1, options['repeat'])
+        # Warm up reportlab's font and module caches so neither strategy pays for them
+        ReceiptRenderer().render(payments[0])
+
+        strategies = {
+            # What every receipt used to cost: a fresh stylesheet, styles and flowables each time
+            'rebuilt': lambda batch: [ReceiptRenderer().render(payment) for payment in batch],
+            'shared': lambda batch: list(get_receipt_renderer().render_many(batch)),
+        }
+
+        self.stdout.write(f"{'RENDERER':<10}{'MODE':<8}{'RECEIPTS':>9}{'SECONDS':>9}{'PER SEC':>9}{'MS EACH':>9}")
+        for name, render in strategies.items():
+            # Single: one receipt per call, as the generate_receipt task does
+            single = min(self._time(lambda: render(payments[:1])) for _ in range(repeat * 20))
+            self._report(name, 'single', 1, single)
+
+            # Batch: a run of receipts in one call
+            batch = min(self._time(lambda: render(payments)) for _ in range(repeat))
+            self._report(name, 'batch', len(payments), batch)
+
+    def _time(self, render):
+        started = time.perf_counter()
+        render()
+        return time.perf_counter() - started
+
+    def _report(self, name, mode, count, elapsed):
+        self.stdout.write(
+            f"{name:<10}{mode:<8}{count:>9}{elapsed:>9.3f}{count / elapsed:>9.1f}{elapsed / count * 1000:>9.2f}"
+        )
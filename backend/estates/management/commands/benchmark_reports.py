@@ -0,0 +1,133 @@
+# estates/management/commands/benchmark_reports.py
+import resource
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
+
+from estates.models import Due, DuePayment, Estate, User
+from estates.reports import (
+    PAYMENT_COL_WIDTHS, PAYMENT_COLUMNS, PAYMENT_TABLE_STYLE,
+    RESIDENT_COL_WIDTHS, RESIDENT_COLUMNS, RESIDENT_TABLE_STYLE,
+    payment_rows, render_payments_report, render_residents_report, resident_rows,
+)
+
+REPORTS = {
+    'residents': (render_residents_report, resident_rows, RESIDENT_COLUMNS, RESIDENT_COL_WIDTHS, RESIDENT_TABLE_STYLE),
+    'payments': (render_payments_report, payment_rows, PAYMENT_COLUMNS, PAYMENT_COL_WIDTHS, PAYMENT_TABLE_STYLE),
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _single_table(estate, out, rows, columns, col_widths, style):
+    """The previous approach: every row in one Table, built in memory."""
+    doc = SimpleDocTemplate(out, pagesize=letter)
+    table = Table([columns] + list(rows(estate)), colWidths=col_widths)
+    table.setStyle(TableStyle(style))
+    doc.build([table])
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the residents/payments PDF reports for synthetic estates of the given sizes "
+        "and report time, peak memory and output size"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='10000,100000',
+                            help="Comma-separated row counts to benchmark")
+        parser.add_argument('--report', choices=sorted(REPORTS), default='residents')
+        parser.add_argument('--compare', action='store_true',
+                            help="Also render with a single in-memory Table, as the views used to")
+        parser.add_argument('--trace-memory', action='store_true',
+                            help="Measure Python peak allocations with tracemalloc (slower)")
+
+    def handle(self, *args, **options):
+        sizes = [int(n) for n in options['rows'].split(',') if n.strip()]
+        render, rows, columns, col_widths, style = REPORTS[options['report']]
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{options['report']} report"))
+        self.stdout.write(f"{'ROWS':>8}  {'METHOD':<12}{'SECONDS':>9}{'PEAK MB':>9}{'PDF MB':>8}")
+
+        # Fixtures live in a transaction that is rolled back afterwards
+        try:
+            with transaction.atomic():
+                for size in sizes:
+                    estate = self._create_estate(size, options['report'])
+                    self._run(size, 'streaming', options,
+                              lambda out: render(estate, out), spooled=True)
+                    if options['compare']:
+                        self._run(size, 'single-table', options,
+                                  lambda out: _single_table(estate, out, rows, columns, col_widths, style))
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"Process max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    def _run(self, size, method, options, render, spooled=False):
+        if spooled:
+            out = SpooledTemporaryFile(max_size=getattr(settings, 'REPORT_SPOOL_MAX_SIZE', 5 * 1024 * 1024))
+        else:
+            out = BytesIO()
+
+        if options['trace_memory']:
+            tracemalloc.start()
+        started = time.perf_counter()
+        render(out)
+        elapsed = time.perf_counter() - started
+        peak = 'n/a'
+        if options['trace_memory']:
+            peak = f"{tracemalloc.get_traced_memory()[1] / 1024 / 1024:.1f}"
+            tracemalloc.stop()
+
+        out.seek(0, 2)
+        pdf_mb = out.tell() / 1024 / 1024
+        out.close()
+        self.stdout.write(f"{size:>8}  {method:<12}{elapsed:>9.2f}{peak:>9}{pdf_mb:>8.2f}")
+
+    def _create_estate(self, size, report):
+        tag = f"{report}-{size}-{time.monotonic_ns()}"
+        estate = Estate.objects.create(
+            name=f"Report bench {tag}", address="1 Bench Rd",
+            phone_number=tag[-20:], email=f"bench-{tag}@example.com"
+        )
+        admin = User.objects.bulk_create([User(
+            email=f'report-bench-{tag}-admin@example.com', phone_number=f'+997{tag[-8:]}',
+            estate=estate, role='admin', is_approved=True,
+        )])[0]
+        # Before the residents exist, so the new-due notification has nobody to notify
+        due = Due.objects.create(
+            estate=estate, title='Service charge', description='Bench', amount=Decimal('5000'),
+            due_date=timezone.now() + timedelta(days=30), created_by=admin,
+        )
+        residents = User.objects.bulk_create([
+            User(
+                email=f'report-bench-{tag}-{n}@example.com', phone_number=f'+998{tag[-8:]}{n:07d}',
+                first_name='Resident', last_name=str(n), estate=estate, is_approved=True,
+                role='resident', home_address=f'{n} Bench Close', house_type='flat', resident_type='tenant',
+            )
+            for n in range(size if report == 'residents' else min(size, 500))
+        ], batch_size=2000)
+
+        if report == 'payments':
+            DuePayment.objects.bulk_create([
+                DuePayment(
+                    due=due, resident=residents[n % len(residents)], amount_paid=Decimal('5000'),
+                    payment_evidence='payment_evidence/bench.png', status='approved',
+                )
+                for n in range(size)
+            ], batch_size=2000)
+        return estate
@@ -0,0 +1,220 @@
+# estates/management/commands/benchmark_webhooks.py
+import hashlib
+import hmac
+import json
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from estates.models import SubscriptionPlan, User, UserSubscription, WebhookEvent
+from estates.task_metrics import _percentile
+from estates.webhooks import handle_paystack_event
+
+BENCH_SECRET = 'sk_bench_webhooks'
+BENCH_PLAN_CODE = 'PLN_webhook_bench'
+EVENT_TYPES = [
+    'charge.success',
+    'subscription.create',
+    'invoice.payment_successful',
+    'invoice.payment_failed',
+    'subscription.disable',
+    'subscription.enable',
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+def sign(body, secret=BENCH_SECRET):
+    return hmac.new(secret.encode(), msg=body, digestmod=hashlib.sha512).hexdigest()
+
+
+def build_payload(event, n, seq):
+    """Build a Paystack-shaped payload for bench customer n; seq keeps bodies unique."""
+    customer = {'email': f'webhook-bench-{n}@example.com', 'customer_code': f'CUS_bench_{n}'}
+    subscription_code = f'SUB_bench_{n}'
+    next_payment = (timezone.now() + timedelta(days=30)).isoformat()
+
+    if event == 'charge.success':
+        data = {
+            'id': seq, 'reference': f'ref_{n}_{seq}', 'status': 'success',
+            'paid_at': timezone.now().isoformat(), 'customer': customer,
+            'subscription_code': subscription_code,
+            'plan': {'plan_code': BENCH_PLAN_CODE},
+            'authorization': {'authorization_code': f'AUTH_bench_{n}'},
+        }
+    elif event in ('invoice.payment_successful', 'invoice.payment_failed'):
+        data = {
+            'id': seq, 'customer': customer, 'paid_at': timezone.now().isoformat(),
+            'subscription': {'subscription_code': subscription_code, 'next_payment_date': next_payment},
+        }
+    else:
+        data = {
+            'id': seq, 'customer': customer, 'subscription_code': subscription_code,
+            'plan': {'plan_code': BENCH_PLAN_CODE}, 'next_payment_date': next_payment,
+        }
+    return json.dumps({'event': event, 'data': data}).encode()
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay signed Paystack webhook payloads (with duplicates and out-of-order "
+        "deliveries) and report events/sec, p50/p99 latency and queries per event type"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=600, help="Unique events to generate")
+        parser.add_argument('--customers', type=int, default=50)
+        parser.add_argument('--duplicates', type=float, default=0.2,
+                            help="Fraction of events delivered a second time")
+        parser.add_argument('--shuffle', action='store_true',
+                            help="Deliver events out of order instead of per-customer order")
+        parser.add_argument('--process', action='store_true',
+                            help="Also apply the stored events the way the worker does")
+        parser.add_argument('--url', help="POST to a running server instead of the in-process test client")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        deliveries = self._deliveries(rng, options)
+
+        if options['url']:
+            self._replay_over_http(options['url'], deliveries)
+            return
+
+        # Everything runs inside one transaction that is rolled back, so the
+        # fixtures and inbox rows never persist and no worker is dispatched
+        try:
+            with override_settings(PAYSTACK_SECRET_KEY=BENCH_SECRET,
+                                   ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver']):
+                with transaction.atomic():
+                    self._create_fixtures(options['customers'])
+                    self._replay_in_process(deliveries)
+                    if options['process']:
+                        self._process_stored_events()
+                    raise _Rollback
+        except _Rollback:
+            pass
+
+    def _deliveries(self, rng, options):
+        deliveries = []
+        for seq in range(options['events']):
+            n = rng.randrange(options['customers'])
+            event = rng.choice(EVENT_TYPES)
+            deliveries.append((event, build_payload(event, n, seq)))
+
+        duplicates = rng.sample(deliveries, int(len(deliveries) * options['duplicates']))
+        if options['shuffle']:
+            deliveries += duplicates
+            rng.shuffle(deliveries)
+        else:
+            # Redeliveries arrive a little after the original
+            for duplicate in duplicates:
+                index = deliveries.index(duplicate)
+                deliveries.insert(min(len(deliveries), index + rng.randint(1, 10)), duplicate)
+        return deliveries
+
+    def _create_fixtures(self, customers):
+        plan, _ = SubscriptionPlan.objects.get_or_create(
+            paystack_plan_code=BENCH_PLAN_CODE, defaults={'name': 'Webhook bench', 'amount': 100000}
+        )
+        users = User.objects.bulk_create([
+            User(email=f'webhook-bench-{n}@example.com', phone_number=f'+999000{n:06d}')
+            for n in range(customers)
+        ])
+        UserSubscription.objects.bulk_create([
+            UserSubscription(
+                user=user, plan=plan, paystack_customer_code=f'CUS_bench_{n}',
+                paystack_subscription_code=f'SUB_bench_{n}',
+                next_billing_date=timezone.now() + timedelta(days=10),
+            )
+            for n, user in enumerate(users)
+        ])
+
+    def _replay_in_process(self, deliveries):
+        client = Client()
+        stats = defaultdict(lambda: {'latency': [], 'queries': [], 'outcomes': defaultdict(int)})
+
+        started = time.perf_counter()
+        for event, body in deliveries:
+            with CaptureQueriesContext(connection) as queries:
+                t0 = time.perf_counter()
+                resp = client.post(
+                    '/api/paystack/webhook/', data=body, content_type='application/json',
+                    HTTP_X_PAYSTACK_SIGNATURE=sign(body)
+                )
+                elapsed = time.perf_counter() - t0
+            stats[event]['latency'].append(elapsed * 1000)
+            stats[event]['queries'].append(len(queries))
+            stats[event]['outcomes'][resp.json().get('status', resp.status_code)] += 1
+        total = time.perf_counter() - started
+
+        self._report('Ingest (paystack_webhook)', stats, total, len(deliveries))
+
+    def _process_stored_events(self):
+        stats = defaultdict(lambda: {'latency': [], 'queries': [], 'outcomes': defaultdict(int)})
+        events = WebhookEvent.objects.order_by('customer_key', 'id')
+
+        started = time.perf_counter()
+        for stored in events:
+            with CaptureQueriesContext(connection) as queries:
+                t0 = time.perf_counter()
+                with transaction.atomic():
+                    outcome = handle_paystack_event(stored.event, stored.payload.get('data') or {})
+                elapsed = time.perf_counter() - t0
+            stats[stored.event]['latency'].append(elapsed * 1000)
+            stats[stored.event]['queries'].append(len(queries))
+            stats[stored.event]['outcomes'][outcome] += 1
+        total = time.perf_counter() - started
+
+        self._report('Process (handle_paystack_event)', stats, total, len(events))
+
+    def _replay_over_http(self, url, deliveries):
+        import requests
+
+        secret = settings.PAYSTACK_SECRET_KEY
+        session = requests.Session()
+        stats = defaultdict(lambda: {'latency': [], 'queries': [], 'outcomes': defaultdict(int)})
+
+        started = time.perf_counter()
+        for event, body in deliveries:
+            t0 = time.perf_counter()
+            resp = session.post(url, data=body, timeout=30, headers={
+                'Content-Type': 'application/json',
+                'x-paystack-signature': sign(body, secret),
+            })
+            stats[event]['latency'].append((time.perf_counter() - t0) * 1000)
+            stats[event]['outcomes'][resp.status_code] += 1
+        total = time.perf_counter() - started
+
+        self._report(f'Ingest over HTTP ({url})', stats, total, len(deliveries))
+
+    def _report(self, title, stats, total_seconds, count):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{title}: {count} events in {total_seconds:.2f}s "
+            f"({count / total_seconds if total_seconds else 0:.1f} events/sec)"
+        ))
+        self.stdout.write(
+            f"{'EVENT':<30}{'COUNT':>7}{'EV/SEC':>10}{'P50 MS':>10}{'P99 MS':>10}{'QUERIES':>9}  OUTCOMES"
+        )
+        for event in sorted(stats):
+            latency = stats[event]['latency']
+            queries = stats[event]['queries']
+            avg_queries = f"{sum(queries) / len(queries):.1f}" if queries else 'n/a'
+            per_sec = len(latency) / (sum(latency) / 1000) if sum(latency) else 0
+            outcomes = ', '.join(f"{k}={v}" for k, v in sorted(stats[event]['outcomes'].items(), key=str))
+            self.stdout.write(
+                f"{event:<30}{len(latency):>7}{per_sec:>10.1f}"
+                f"{_percentile(latency, 50):>10.2f}{_percentile(latency, 99):>10.2f}"
+                f"{avg_queries:>9}  {outcomes}"
+            )
+        self.stdout.write('')
@@ -0,0 +1,74 @@
+# estates/management/commands/compact_subscription_history.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from estates.models import UserSubscriptionHistory
+
+
+class Command(BaseCommand):
+    help = (
+        "Collapse consecutive UserSubscriptionHistory rows that recorded no change "
+        "and back-fill content hashes on the rows that remain"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Report without deleting anything")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        rows = UserSubscriptionHistory.objects.only(
+            'id', 'user_id', 'plan_id', 'paystack_subscription_code', 'status',
+            'next_billing_date', 'authorization_code', 'email_token', 'content_hash',
+        ).order_by('user_id', 'paystack_subscription_code', 'synced_at', 'id')
+
+        previous_key = None
+        previous_hash = None
+        to_delete = []
+        to_hash = []
+        deleted = 0
+        hashed = 0
+        scanned = 0
+
+        def flush():
+            nonlocal deleted, hashed
+            if dry_run:
+                deleted += len(to_delete)
+                hashed += len(to_hash)
+            else:
+                with transaction.atomic():
+                    if to_delete:
+                        # Nothing references history rows, so skip the collector and audit receivers
+                        batch = UserSubscriptionHistory.objects.filter(pk__in=to_delete)
+                        deleted += batch._raw_delete(batch.db)
+                    if to_hash:
+                        UserSubscriptionHistory.objects.bulk_update(to_hash, ['content_hash'])
+                        hashed += len(to_hash)
+            to_delete.clear()
+            to_hash.clear()
+
+        for row in rows.iterator(chunk_size=batch_size):
+            scanned += 1
+            key = (row.user_id, row.paystack_subscription_code)
+            content_hash = row.compute_content_hash()
+
+            # Keep the first row of each unchanged run, the one that recorded the change
+            if key == previous_key and content_hash == previous_hash:
+                to_delete.append(row.pk)
+            elif row.content_hash != content_hash:
+                row.content_hash = content_hash
+                to_hash.append(row)
+
+            previous_key = key
+            previous_hash = content_hash
+
+            if len(to_delete) + len(to_hash) >= batch_size:
+                flush()
+        flush()
+
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {scanned} history rows. {verb} {deleted} duplicates, hashed {hashed} rows."
+        ))
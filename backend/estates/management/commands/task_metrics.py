@@ -0,0 +1,45 @@
+# estates/management/commands/task_metrics.py
+import json
+
+from django.core.management.base import BaseCommand
+
+from estates.task_metrics import (
+    get_queue_latency_metrics, get_task_metrics, reset_task_metrics
+)
+
+
+class Command(BaseCommand):
+    help = "Show Celery queue-wait and per-task timing metrics"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help="Print raw JSON")
+        parser.add_argument('--reset', action='store_true', help="Clear all metrics after printing")
+
+    def handle(self, *args, **options):
+        queues = get_queue_latency_metrics()
+        tasks = get_task_metrics()
+
+        if options['json']:
+            self.stdout.write(json.dumps({'queues': queues, 'tasks': tasks}, indent=2))
+        else:
+            self.stdout.write(f"{'QUEUE':<20}{'COUNT':>8}{'AVG WAIT':>12}{'MAX WAIT':>12}")
+            for queue, m in queues.items():
+                self.stdout.write(
+                    f"{queue:<20}{m['count']:>8}{m['avg_wait_ms']:>10}ms{m['max_wait_ms']:>10}ms"
+                )
+
+            self.stdout.write('')
+            self.stdout.write(
+                f"{'TASK':<45}{'RUNS':>7}{'FAIL':>6}{'RETRY':>7}"
+                f"{'AVG WAIT':>12}{'AVG RUN':>12}{'P95 RUN':>12}{'MAX RUN':>12}"
+            )
+            for name, m in tasks.items():
+                self.stdout.write(
+                    f"{name:<45}{m['count']:>7}{m['failures']:>6}{m['retries']:>7}"
+                    f"{m['avg_wait_ms']:>10}ms{m['avg_run_ms']:>10}ms"
+                    f"{m['p95_run_ms']:>10}ms{m['max_run_ms']:>10}ms"
+                )
+
+        if options['reset']:
+            reset_task_metrics()
+            self.stdout.write(self.style.SUCCESS("Task metrics cleared"))
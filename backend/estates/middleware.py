@@ -1,7 +1,11 @@
 from django.conf import settings
-from django.http import HttpResponseForbidden
+from django.http import HttpResponseForbidden, JsonResponse
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
 from threading import current_thread
+from .entitlements import check_subscription
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
@@ -62,3 +66,61 @@ class AuditLogMiddleware:
             delattr(current_thread(), 'request')
 
         return response
+
+
+class SubscriptionGateMiddleware:
+    """
+    Apply the subscription gate to the paths configured in settings.
+
+    SUBSCRIPTION_ADMIN_GATED_PATHS get the admin gate and
+    SUBSCRIPTION_GATED_PATHS the resident one (regexes matched against
+    request.path_info). The entitlement is resolved once and attached as
+    request.entitlement; a denied request gets the same 402/403 payload the
+    decorators return, without reaching the view.
+
+    Token-authenticated API requests aren't authenticated by Django's
+    AuthenticationMiddleware, so the token is checked here as well. Anonymous
+    requests are left for the view's own authentication to reject.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        path = request.path_info
+        if self._matches(path, 'SUBSCRIPTION_ADMIN_GATED_PATHS'):
+            admin = True
+        elif self._matches(path, 'SUBSCRIPTION_GATED_PATHS'):
+            admin = False
+        else:
+            return None
+
+        user = self._resolve_user(request)
+        if user is None:
+            return None
+
+        denial = check_subscription(request, admin=admin, user=user)
+        if denial:
+            payload, status_code = denial
+            return JsonResponse(payload, status=status_code)
+        return None
+
+    @staticmethod
+    def _matches(path, setting):
+        return any(re.match(pattern, path) for pattern in getattr(settings, setting, []))
+
+    @staticmethod
+    def _resolve_user(request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user
+        # Don't set request.user from the token: DRF would then treat the
+        # request as session-authenticated and enforce CSRF on it
+        try:
+            result = TokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        return result[0] if result else None
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-19 01:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estates', '0029_notification_action_url_notification_is_push_sent_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visitorcode',
+            index=models.Index(fields=['is_used', 'expires_at'], name='visitorcode_used_expires_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-19 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estates', '0030_visitorcode_used_expires_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaystackSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_page', models.PositiveIntegerField(default=1)),
+                ('in_progress', models.BooleanField(default=False)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
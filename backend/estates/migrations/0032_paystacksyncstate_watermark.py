@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-19 01:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estates', '0031_paystacksyncstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paystacksyncstate',
+            name='last_full_sync_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='paystacksyncstate',
+            name='mode',
+            field=models.CharField(choices=[('full', 'Full'), ('incremental', 'Incremental')], default='full', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='paystacksyncstate',
+            name='run_watermark',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='paystacksyncstate',
+            name='watermark',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
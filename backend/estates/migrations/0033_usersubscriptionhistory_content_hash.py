@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estates', '0032_paystacksyncstate_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersubscriptionhistory',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
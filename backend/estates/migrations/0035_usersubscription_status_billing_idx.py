@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estates', '0034_webhookevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['status', 'next_billing_date'], name='usersub_status_billing_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estates', '0035_usersubscription_status_billing_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstateSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paystack_customer_code', models.CharField(max_length=100)),
+                ('paystack_subscription_code', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('paused', 'Paused'), ('cancelled', 'Cancelled'), ('past_due', 'Past Due')], default='active', max_length=20)),
+                ('next_billing_date', models.DateTimeField()),
+                ('authorization_code', models.CharField(blank=True, max_length=150, null=True)),
+                ('email_token', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('estate', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='subscription', to='estates.estate')),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='estates.subscriptionplan')),
+            ],
+        ),
+    ]
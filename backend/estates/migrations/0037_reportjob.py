@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:30
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estates', '0036_estatesubscription'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('report', models.CharField(choices=[('residents', 'Residents'), ('payments', 'Payment records')], max_length=20)),
+                ('watermark', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('file', models.FileField(blank=True, null=True, upload_to='reports/')),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('estate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_jobs', to='estates.estate')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['estate', 'report', 'watermark'], name='reportjob_lookup_idx')],
+            },
+        ),
+    ]
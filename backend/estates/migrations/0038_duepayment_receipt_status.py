@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estates', '0037_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='duepayment',
+            name='receipt_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='duepayment',
+            name='receipt_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], max_length=20),
+        ),
+    ]
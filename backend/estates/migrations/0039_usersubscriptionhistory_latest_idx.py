@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estates', '0038_duepayment_receipt_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usersubscriptionhistory',
+            index=models.Index(fields=['user', 'paystack_subscription_code', 'synced_at'], name='usersubhist_latest_idx'),
+        ),
+    ]
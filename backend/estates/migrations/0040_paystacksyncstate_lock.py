@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estates', '0039_usersubscriptionhistory_latest_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paystacksyncstate',
+            name='job_id',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='paystacksyncstate',
+            name='locked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
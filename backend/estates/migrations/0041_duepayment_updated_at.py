@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-19 04:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estates', '0040_paystacksyncstate_lock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='duepayment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
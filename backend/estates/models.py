@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from datetime import timedelta
+import hashlib
 import random
 import string
 from django.utils.translation import gettext_lazy as _
@@ -56,6 +57,31 @@ class CustomUserManager(BaseUserManager):
             raise ValueError('Superuser must have is_superuser=True.')
         
         return self.create_user(email, password, **extra_fields)
+
+    def with_subscription_state(self):
+        """
+        Users with their estate joined and is_subscription_active computed
+        in SQL, matching the entitlement gate, so listing them doesn't cost
+        a subscription query per row.
+        """
+        billed_after = timezone.now() - timedelta(days=1)
+        active = models.Q(
+            subscription__status='active',
+            subscription__next_billing_date__gt=billed_after,
+        )
+        if getattr(settings, 'SUBSCRIPTION_ENTITLEMENT_SCOPE', 'user') == 'estate':
+            # Same fallback order as entitlements.get_entitlement
+            active = models.Q(
+                estate__subscription__status='active',
+                estate__subscription__next_billing_date__gt=billed_after,
+            ) | (models.Q(estate__subscription__isnull=True) & active)
+        return self.get_queryset().select_related('estate').annotate(
+            is_subscription_active=models.Case(
+                models.When(active, then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            )
+        )
  
 class User(AbstractUser):
     username = None  # ❌ Remove username
@@ -138,6 +164,12 @@ class VisitorCode(models.Model):
     is_used = models.BooleanField(default=False)
     used_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Serves the expired-code cleanup: WHERE is_used = false AND expires_at < now
+            models.Index(fields=['is_used', 'expires_at'], name='visitorcode_used_expires_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.code:
             self.code = self.generate_code()
@@ -191,8 +223,17 @@ class DuePayment(models.Model):
         blank=True,
         help_text="Generated receipt PDF for approved payments"
     )
+    RECEIPT_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    # Receipts are generated in the background after approval (tasks.generate_receipt)
+    receipt_status = models.CharField(max_length=20, choices=RECEIPT_STATUS_CHOICES, blank=True)
+    receipt_error = models.TextField(blank=True)
     approved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='approved_payments')
     approved_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     # class Meta:
     #     unique_together = ('due', 'resident')
@@ -337,6 +378,12 @@ class UserSubscription(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # expire_subscriptions sweeps by status and billing date
+            models.Index(fields=['status', 'next_billing_date'], name='usersub_status_billing_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.email}: {self.plan.name} [{self.status}]"
 
@@ -385,77 +432,207 @@ class UserSubscriptionHistory(models.Model):
     authorization_code = models.CharField(max_length=100, blank=True, null=True)
     email_token = models.CharField(max_length=100, blank=True, null=True)
     synced_at = models.DateTimeField(default=timezone.now)
+    # Hash of the tracked fields, so a sync only records a row when something changed
+    content_hash = models.CharField(max_length=64, blank=True, default='')
 
     class Meta:
         ordering = ["-synced_at"]
+        indexes = [
+            # Latest row per subscription, read by the sync's change check
+            models.Index(fields=['user', 'paystack_subscription_code', 'synced_at'],
+                         name='usersubhist_latest_idx'),
+        ]
+
+    def compute_content_hash(self):
+        """
+        Hash the fields a history row tracks.
+
+        Returns:
+            str: SHA-256 hex digest
+        """
+        next_billing = str(self.next_billing_date.timestamp()) if self.next_billing_date else ''
+        parts = [
+            self.paystack_subscription_code or '',
+            str(self.plan_id or ''),
+            self.status or '',
+            next_billing,
+            self.authorization_code or '',
+            self.email_token or '',
+        ]
+        return hashlib.sha256('|'.join(parts).encode()).hexdigest()
 
     def __str__(self):
         return f"{self.user.email} - {self.plan.name if self.plan else 'No Plan'} ({self.status})"
 
-# class EstateSubscription(models.Model):
-    # """
-    # Links an Estate to its Paystack subscription status.
-    # """
-    # ESTATE_STATUS = [
-    #     ('active', 'Active'),
-    #     ('paused', 'Paused'),
-    #     ('cancelled', 'Cancelled'),
-    #     ('past_due', 'Past Due'), 
-    # ]
-
-    # estate = models.OneToOneField(
-    #     'Estate', on_delete=models.CASCADE, related_name='subscription')
-    # paystack_customer_code = models.CharField(max_length=100)
-    # paystack_subscription_code = models.CharField(max_length=100)
-    # plan = models.ForeignKey(SubscriptionPlan, on_delete=models.PROTECT)
-    # status = models.CharField(max_length=20, choices=ESTATE_STATUS, default='active')
-    # next_billing_date = models.DateTimeField()
-    # authorization_code = models.CharField(max_length=150, blank=True, null=True)
-    # email_token = models.CharField(max_length=255, blank=True, null=True)
-    # created_at = models.DateTimeField(auto_now_add=True)
-    # updated_at = models.DateTimeField(auto_now=True)
-
-    # def __str__(self):
-    #     return f"{self.estate.name}: {self.plan.name} [{self.status}]"
-
-    # def is_active(self):
-    #     """
-    #     Check if subscription is active and hasn't expired
-    #     """
-    #     # Must have active status
-    #     if self.status != 'active':
-    #         return False
+class PaystackSyncState(models.Model):
+    """
+    Checkpoint for a paginated Paystack sync, so an interrupted run resumes
+    from the last committed page instead of rescanning from page one.
+    """
+    MODES = [
+        ('full', 'Full'),
+        ('incremental', 'Incremental'),
+    ]
+
+    name = models.CharField(max_length=50, unique=True)
+    mode = models.CharField(max_length=20, choices=MODES, default='full')
+    next_page = models.PositiveIntegerField(default=1)
+    in_progress = models.BooleanField(default=False)
+    # Latest Paystack updatedAt applied by a completed run; incremental runs skip anything older
+    watermark = models.DateTimeField(null=True, blank=True)
+    # Latest updatedAt seen by the run in progress, promoted to watermark when it completes
+    run_watermark = models.DateTimeField(null=True, blank=True)
+    last_full_sync_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    # Single-flight lock: the sync job running now (in_progress alone also marks a
+    # checkpoint left to resume), and when it took the lock
+    job_id = models.CharField(max_length=255, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        state = f'running {self.mode}' if self.in_progress else 'idle'
+        return f"{self.name} [{state}, next page {self.next_page}]"
+
+class WebhookEvent(models.Model):
+    """
+    Inbox of verified Paystack webhook deliveries. Events are stored as they
+    arrive and applied later by a worker, in order per customer.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=64, unique=True)
+    event = models.CharField(max_length=100)
+    customer_key = models.CharField(max_length=255)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['customer_key', 'status', 'id'], name='webhook_customer_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} for {self.customer_key} [{self.status}]"
+
+
+class ReportJob(models.Model):
+    """
+    A PDF report rendered in the background and kept in default storage.
+    Requests for the same report over unchanged data reuse the stored file
+    (see reports.report_watermark).
+    """
+    REPORT_CHOICES = [
+        ('residents', 'Residents'),
+        ('payments', 'Payment records'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    estate = models.ForeignKey(Estate, on_delete=models.CASCADE, related_name='report_jobs')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    report = models.CharField(max_length=20, choices=REPORT_CHOICES)
+    watermark = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    file = models.FileField(upload_to='reports/', null=True, blank=True)
+    row_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['estate', 'report', 'watermark'], name='reportjob_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.report} report for {self.estate.name} [{self.status}]"
+
+class EstateSubscription(models.Model):
+    """
+    Links an Estate to its Paystack subscription status.
+
+    With SUBSCRIPTION_ENTITLEMENT_SCOPE = 'estate' this covers every resident
+    of the estate (see entitlements.get_entitlement).
+    """
+    ESTATE_STATUS = [
+        ('active', 'Active'),
+        ('paused', 'Paused'),
+        ('cancelled', 'Cancelled'),
+        ('past_due', 'Past Due'), 
+    ]
+
+    estate = models.OneToOneField(
+        'Estate', on_delete=models.CASCADE, related_name='subscription')
+    paystack_customer_code = models.CharField(max_length=100)
+    paystack_subscription_code = models.CharField(max_length=100)
+    plan = models.ForeignKey(SubscriptionPlan, on_delete=models.PROTECT)
+    status = models.CharField(max_length=20, choices=ESTATE_STATUS, default='active')
+    next_billing_date = models.DateTimeField()
+    authorization_code = models.CharField(max_length=150, blank=True, null=True)
+    email_token = models.CharField(max_length=255, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.estate.name}: {self.plan.name} [{self.status}]"
+
+    def is_active(self):
+        """
+        Check if subscription is active and hasn't expired
+        """
+        # Must have active status
+        if self.status != 'active':
+            return False
         
-    #     # Must not be past the next billing date (with some grace period)
-    #     # Adding 1 day grace period in case of processing delays
-    #     grace_period = timezone.timedelta(days=1)
-    #     return timezone.now() < (self.next_billing_date + grace_period)
-
-    # def is_expired(self):
-    #     """
-    #     Check if subscription has expired
-    #     """
-    #     return timezone.now() > self.next_billing_date
-
-    # def days_until_expiry(self):
-    #     """
-    #     Calculate days until subscription expires
-    #     """
-    #     if self.is_expired():
-    #         return 0
+        # Must not be past the next billing date (with some grace period)
+        # Adding 1 day grace period in case of processing delays
+        grace_period = timezone.timedelta(days=1)
+        return timezone.now() < (self.next_billing_date + grace_period)
+
+    def is_expired(self):
+        """
+        Check if subscription has expired
+        """
+        return timezone.now() > self.next_billing_date
+
+    def days_until_expiry(self):
+        """
+        Calculate days until subscription expires
+        """
+        if self.is_expired():
+            return 0
         
-    #     delta = self.next_billing_date - timezone.now()
-    #     return delta.days
-
-    # def grace_period_active(self):
-    #     """
-    #     Check if we're in the grace period (expired but within 1 day)
-    #     """
-    #     if not self.is_expired():
-    #         return False
+        delta = self.next_billing_date - timezone.now()
+        return delta.days
+
+    def grace_period_active(self):
+        """
+        Check if we're in the grace period (expired but within 1 day)
+        """
+        if not self.is_expired():
+            return False
         
-    #     grace_period = timezone.timedelta(days=1)
-    #     return timezone.now() < (self.next_billing_date + grace_period)
+        grace_period = timezone.timedelta(days=1)
+        return timezone.now() < (self.next_billing_date + grace_period)
 
     
 
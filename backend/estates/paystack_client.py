@@ -0,0 +1,166 @@
+# estates/paystack_client.py
+"""
+Shared Paystack API client.
+
+One pooled requests.Session per process with timeouts on every call and
+automatic retries with exponential backoff on 429 and 5xx responses. POSTs are
+only retried on 429, which Paystack returns before acting on a request, so a
+retry can never create a second customer or subscription.
+
+Responses are returned as the decoded JSON body, so callers check
+``resp.get('status')`` and ``resp['data']`` as Paystack documents them.
+"""
+
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import logging
+import requests
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://api.paystack.co"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class PaystackError(Exception):
+    """Raised when Paystack can't be reached or returns a non-JSON body."""
+
+
+class PaystackRetry(Retry):
+    """Retry policy that only resends a POST when Paystack rate-limited it."""
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method and method.upper() == 'POST':
+            return status_code == 429 and bool(self.total)
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class PaystackClient:
+    """
+    Thin client over the Paystack REST API.
+
+    Args:
+        secret_key (str): Paystack secret key
+        base_url (str, optional): API root, e.g. a local stand-in for tests
+        timeout (float, optional): Seconds per request (connect and read)
+        max_retries (int, optional): Retries on 429/5xx and connection errors
+        backoff_factor (float, optional): Backoff between retries
+        pool_size (int, optional): Pooled connections kept to the API host
+    """
+
+    def __init__(self, secret_key, base_url=None, timeout=30, max_retries=3,
+                 backoff_factor=0.5, pool_size=10):
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip('/')
+        self.timeout = timeout
+
+        retry = PaystackRetry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            # Idempotent methods only; POST is handled in PaystackRetry.is_retry
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {secret_key}",
+            "Content-Type": "application/json",
+        })
+
+    def request(self, method, path, params=None, json=None, timeout=None):
+        """
+        Call the API and return the decoded JSON body.
+
+        Returns:
+            dict: Paystack response body (error bodies included)
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        try:
+            resp = self.session.request(
+                method, url, params=params, json=json,
+                timeout=timeout or self.timeout,
+            )
+        except requests.RequestException as e:
+            raise PaystackError(f"{method} {path} failed: {str(e)}") from e
+
+        try:
+            return resp.json()
+        except ValueError:
+            raise PaystackError(f"{method} {path} returned {resp.status_code}: {resp.text[:200]}")
+
+    def get(self, path, params=None, **kwargs):
+        return self.request('GET', path, params=params, **kwargs)
+
+    def post(self, path, json=None, **kwargs):
+        return self.request('POST', path, json=json, **kwargs)
+
+    # -------------------- ENDPOINTS --------------------
+
+    def verify_transaction(self, reference):
+        return self.get(f"transaction/verify/{reference}")
+
+    def create_customer(self, email, first_name='', last_name='', phone=''):
+        return self.post("customer", json={
+            "email": email,
+            "first_name": first_name,
+            "last_name": last_name,
+            "phone": phone,
+        })
+
+    def create_subscription(self, customer, plan, authorization):
+        return self.post("subscription", json={
+            "customer": customer,
+            "plan": plan,
+            "authorization": authorization,
+        })
+
+    def list_subscriptions(self, page=1, per_page=50, customer=None):
+        params = {"page": page, "perPage": per_page}
+        if customer:
+            params["customer"] = customer
+        return self.get("subscription", params=params)
+
+    def disable_subscription(self, code, token):
+        return self.post("subscription/disable", json={"code": code, "token": token})
+
+    def enable_subscription(self, code, token):
+        return self.post("subscription/enable", json={"code": code, "token": token})
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_paystack_client():
+    """
+    Return the shared Paystack client, creating it on first use.
+
+    Returns:
+        PaystackClient: Client configured from settings
+    """
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PaystackClient(
+                    settings.PAYSTACK_SECRET_KEY,
+                    base_url=getattr(settings, 'PAYSTACK_BASE_URL', DEFAULT_BASE_URL),
+                    timeout=getattr(settings, 'PAYSTACK_TIMEOUT', 30),
+                    max_retries=getattr(settings, 'PAYSTACK_MAX_RETRIES', 3),
+                    backoff_factor=getattr(settings, 'PAYSTACK_RETRY_BACKOFF', 0.5),
+                )
+    return _client
+
+
+def reset_paystack_client():
+    """Drop the shared client so the next call picks up fresh settings."""
+    global _client
+    with _client_lock:
+        _client = None
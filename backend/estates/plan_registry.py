@@ -0,0 +1,114 @@
+# estates/plan_registry.py
+"""
+Cached SubscriptionPlan registry.
+
+Plans are a handful of rows that change a few times a year, so every process
+keeps them in memory keyed by Paystack plan code. Saving or deleting a plan
+replaces a version token in the shared cache; each process reloads its copy
+the next time it sees a token it hasn't loaded. Codes the registry doesn't
+know are checked against the database, so a new plan is never reported
+missing just because its token hasn't reached this process.
+
+The cached instances are shared by every thread in the process, so lookups
+hand out copies.
+"""
+
+from django.core.cache import cache
+import copy
+import threading
+import uuid
+
+PLAN_VERSION_KEY = 'subscription_plans:version'
+
+_plans_by_code = {}
+_plans = []
+_loaded_version = None
+_lock = threading.Lock()
+
+
+def _current_version():
+    version = cache.get(PLAN_VERSION_KEY)
+    if version is None:
+        # First process to look after a cache flush starts a new version
+        cache.add(PLAN_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(PLAN_VERSION_KEY)
+    return version
+
+
+def _ensure_loaded(force=False):
+    global _plans_by_code, _plans, _loaded_version
+    from .models import SubscriptionPlan
+
+    version = _current_version()
+    if version == _loaded_version and not force:
+        return
+
+    with _lock:
+        if version == _loaded_version and not force:
+            return
+        plans = list(SubscriptionPlan.objects.order_by('pk'))
+        _plans = plans
+        _plans_by_code = {plan.paystack_plan_code: plan for plan in plans}
+        _loaded_version = version
+
+
+def _find_missing(plan_codes):
+    """
+    Check the database for codes the registry doesn't know.
+
+    The version token only reaches processes that share the cache, so a plan
+    added elsewhere may not have been announced here yet; if any of the codes
+    exist, the registry is reloaded so they're served from memory from then on.
+    """
+    from .models import SubscriptionPlan
+
+    if SubscriptionPlan.objects.filter(paystack_plan_code__in=plan_codes).exists():
+        _ensure_loaded(force=True)
+
+
+def get_plan_by_code(plan_code):
+    """
+    Look up a plan by its Paystack plan code.
+
+    Returns:
+        SubscriptionPlan: The plan, or None if the code is unknown
+    """
+    if not plan_code:
+        return None
+    _ensure_loaded()
+    if plan_code not in _plans_by_code:
+        _find_missing([plan_code])
+    plan = _plans_by_code.get(plan_code)
+    return copy.copy(plan) if plan is not None else None
+
+
+def get_plans_by_codes(plan_codes):
+    """
+    Look up several plans at once.
+
+    Returns:
+        dict: plan code -> SubscriptionPlan, for the codes that exist
+    """
+    _ensure_loaded()
+    missing = [code for code in plan_codes if code not in _plans_by_code]
+    if missing:
+        _find_missing(missing)
+    return {code: copy.copy(_plans_by_code[code]) for code in plan_codes if code in _plans_by_code}
+
+
+def get_all_plans():
+    """Return every plan, in primary-key order."""
+    _ensure_loaded()
+    return [copy.copy(plan) for plan in _plans]
+
+
+def get_plan_codes():
+    _ensure_loaded()
+    return list(_plans_by_code)
+
+
+def invalidate_plans():
+    """Make every process reload plans on its next lookup."""
+    global _loaded_version
+    cache.set(PLAN_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    _loaded_version = None
@@ -0,0 +1,225 @@
+# estates/receipts.py
+"""
+Payment receipt PDFs.
+
+Receipts are rendered and uploaded by the generate_receipt task once an
+approval commits, so approving payments never waits on reportlab or storage.
+DuePayment.receipt_status tracks where each receipt is.
+"""
+
+import threading
+from io import BytesIO
+from django.core.files.base import ContentFile
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+
+INFO_COL_WIDTHS = [1.8*inch, 4.2*inch]
+DATE_FORMAT = "%B %d, %Y at %I:%M %p"
+
+
+class ReceiptRenderer:
+    """
+    Builds payment receipt PDFs.
+
+    The stylesheet, paragraph and table styles and the static flowables
+    (title, section headings, footer) are built once, when the renderer is
+    created, and reused for every receipt it renders. Only the per-payment
+    tables and paragraphs are built per receipt.
+
+    Flowables keep layout state while a document is built, so one renderer
+    must not be used by two threads at once; get_receipt_renderer() keeps
+    one per thread.
+    """
+
+    def __init__(self):
+        styles = getSampleStyleSheet()
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            textColor=colors.darkblue
+        )
+        heading_style = ParagraphStyle(
+            'CustomHeading',
+            parent=styles['Heading2'],
+            fontSize=16,
+            spaceAfter=12,
+            textColor=colors.darkblue
+        )
+        footer_style = ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=10,
+            alignment=TA_CENTER,
+            textColor=colors.grey
+        )
+        self.normal_style = styles['Normal']
+
+        # Style for wrapping text in table cells
+        self.wrap_style = ParagraphStyle(
+            'WrapStyle',
+            parent=styles['Normal'],
+            fontSize=11,
+            leading=13,
+            wordWrap='LTR'
+        )
+
+        self.receipt_table_style = TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ])
+        self.payment_table_style = TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),  # Top alignment for better readability
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),  # Increased padding for better spacing
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
+            ('BACKGROUND', (0, 0), (0, -1), colors.lightblue),
+            # Special styling for the description row to allow more height
+            ('ROWBACKGROUNDS', (0, 2), (-1, 2), [colors.white]),  # Description row background
+        ])
+        self.approval_table_style = TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),  # Top alignment for better readability
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),  # Increased padding
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
+            ('BACKGROUND', (0, 0), (0, -1), colors.lightgreen),
+        ])
+
+        # Static flowables, shared by every receipt
+        self.header = [Paragraph("PAYMENT RECEIPT", title_style), Spacer(1, 20)]
+        self.payment_heading = Paragraph("Payment Information", heading_style)
+        self.approval_heading = Paragraph("Approval Information", heading_style)
+        self.footer = [
+            Spacer(1, 50),
+            Paragraph(
+                "This is an official receipt for the approved payment. "
+                "Please keep this receipt for your records.",
+                footer_style
+            ),
+        ]
+        self.section_gap = Spacer(1, 30)
+        self.estate_gap = Spacer(1, 20)
+
+    def elements(self, payment):
+        """Flowables for one payment's receipt."""
+        elements = list(self.header)
+
+        # Estate Information (if available)
+        if hasattr(payment, 'due') and hasattr(payment.due, 'estate'):
+            elements.append(Paragraph(f"<b>{payment.due.estate.name}</b><br/>"
+                                      f"{getattr(payment.due.estate, 'address', '')}",
+                                      self.normal_style))
+            elements.append(self.estate_gap)
+
+        # Receipt Details Table
+        receipt_table = Table([
+            ['Receipt Number:', f'RCP-{payment.id}-{payment.approved_at.strftime("%Y%m%d")}'],
+            ['Date Issued:', payment.approved_at.strftime(DATE_FORMAT)],
+            ['Status:', 'APPROVED'],
+        ], colWidths=[2*inch, 3*inch])
+        receipt_table.setStyle(self.receipt_table_style)
+        elements += [receipt_table, self.section_gap, self.payment_heading]
+
+        # Wrap long descriptions in Paragraph for proper text wrapping
+        due_description = getattr(payment.due, 'description', 'N/A')
+        if due_description and due_description != 'N/A':
+            description_para = Paragraph(due_description, self.wrap_style)
+        else:
+            description_para = 'N/A'
+
+        payment_table = Table([
+            ['Resident Name:', f"{payment.resident.first_name} {payment.resident.last_name}"],
+            ['Due Title:', payment.due.title],
+            ['Due Description:', description_para],
+            ['Original Amount:', f"₦{payment.due.amount:,.2f}"],
+            ['Amount Paid:', f"₦{payment.amount_paid:,.2f}"]
+        ], colWidths=INFO_COL_WIDTHS)
+        payment_table.setStyle(self.payment_table_style)
+        elements += [payment_table, self.section_gap, self.approval_heading]
+
+        # Format admin notes with proper text wrapping
+        admin_notes = payment.admin_notes if payment.admin_notes else 'No additional notes'
+        if admin_notes and len(admin_notes) > 50:
+            notes_para = Paragraph(admin_notes, self.wrap_style)
+        else:
+            notes_para = admin_notes
+
+        approval_table = Table([
+            ['Approved By:', f"{payment.approved_by.first_name} {payment.approved_by.last_name}" if payment.approved_by else 'Admin'],
+            ['Approval Date:', payment.approved_at.strftime(DATE_FORMAT)],
+            ['Admin Notes:', notes_para],
+        ], colWidths=INFO_COL_WIDTHS)
+        approval_table.setStyle(self.approval_table_style)
+        elements.append(approval_table)
+
+        return elements + self.footer
+
+    def render(self, payment):
+        """Render one payment's receipt and return the PDF bytes."""
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72,
+                                topMargin=72, bottomMargin=18)
+        doc.build(self.elements(payment))
+        pdf_data = buffer.getvalue()
+        buffer.close()
+        return pdf_data
+
+    def render_many(self, payments):
+        """Yield (payment, pdf bytes) for each payment."""
+        for payment in payments:
+            yield payment, self.render(payment)
+
+
+_renderers = threading.local()
+
+
+def get_receipt_renderer():
+    """The current thread's ReceiptRenderer, created on first use."""
+    renderer = getattr(_renderers, 'renderer', None)
+    if renderer is None:
+        renderer = _renderers.renderer = ReceiptRenderer()
+    return renderer
+
+
+def generate_payment_receipt(payment):
+    """
+    Generate a PDF receipt for an approved payment
+    """
+    return get_receipt_renderer().render(payment)
+
+
+def receipt_filename(payment):
+    return f"receipt_{payment.id}_{payment.approved_at.strftime('%Y%m%d_%H%M%S')}.pdf"
+
+
+def store_payment_receipt(payment):
+    """
+    Render a payment's receipt, upload it and mark it ready.
+
+    The row is written with a queryset update so the DuePayment save
+    receivers (status snapshot, notifications) don't run again for it.
+    """
+    from .models import DuePayment
+
+    pdf_data = generate_payment_receipt(payment)
+    payment.receipt.save(receipt_filename(payment), ContentFile(pdf_data), save=False)
+    DuePayment.objects.filter(pk=payment.pk).update(
+        receipt=payment.receipt.name, receipt_status='ready', receipt_error=''
+    )
+    payment.receipt_status = 'ready'
+    return payment.receipt.name
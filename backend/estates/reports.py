@@ -0,0 +1,347 @@
+# estates/reports.py
+"""
+Admin PDF reports (residents, payment records).
+
+Rows are read with .iterator() and laid out as one LongTable per page, each
+with its own header row, so reportlab never has to split (and copy) a huge
+table page after page. Each page's table is measured with wrap(), drawn and
+finished before the next page's rows are read, so only the current page's
+rows are held in memory. Output goes to any binary file object;
+report_response() spools it to a temporary file and streams it.
+"""
+
+import hashlib
+from collections import deque
+from datetime import timedelta
+from itertools import islice
+from tempfile import SpooledTemporaryFile
+from django.conf import settings
+from django.http import FileResponse
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Frame, LayoutError, LongTable, Paragraph, Spacer, TableStyle
+
+
+RESIDENT_COLUMNS = ["Name", "Email", "Phone", "Address", "House Type", "Type"]
+RESIDENT_COL_WIDTHS = [100, 120, 80, 180, 60, 80]
+RESIDENT_TABLE_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+]
+
+PAYMENT_COLUMNS = ['Resident', 'Description', 'Amount', 'Date', 'Status']
+PAYMENT_COL_WIDTHS = [120, 150, 80, 80, 80]
+PAYMENT_TABLE_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (2, 1), (4, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+]
+
+
+# Same page geometry as SimpleDocTemplate's defaults
+PAGE_MARGIN = inch
+FRAME_PADDING = 6
+
+
+def _cell(value):
+    # Newlines would make rows taller than the page layout assumes
+    return '' if value is None else str(value).replace('\n', ' ')
+
+
+def _row_heights(columns, col_widths, table_style):
+    """Header and single-line row heights, measured with wrap()."""
+    header = LongTable([columns], colWidths=col_widths)
+    header.setStyle(table_style)
+    sample = LongTable([columns, columns], colWidths=col_widths)
+    sample.setStyle(table_style)
+    header_height = header.wrap(0, 0)[1]
+    return header_height, sample.wrap(0, 0)[1] - header_height
+
+
+def _fit_table(columns, page, col_widths, table_style, width, height):
+    """
+    Build the table for as many leading rows of page as fit in height.
+
+    Tables are measured with wrap(), so rows taller than one line just push
+    later rows onto the next page.
+
+    Returns:
+        tuple: (table, number of rows used)
+    """
+    count = len(page)
+    while True:
+        table = _page_table(columns, page[:count], col_widths, table_style)
+        table_height = table.wrap(width, height)[1]
+        if table_height <= height or count <= 1:
+            return table, count
+        count = max(1, min(count - 1, int(count * height / table_height)))
+
+
+def build_table_report(out, title, columns, col_widths, style, rows):
+    """
+    Render a titled table report as a PDF into out.
+
+    Args:
+        out: Writable binary file object
+        title (str): Report title (may contain reportlab markup)
+        columns (list): Header row
+        col_widths (list): Column widths in points
+        style (list): TableStyle commands, applied to every page's table
+        rows: Iterable of row sequences
+
+    Returns:
+        int: Number of rows written
+    """
+    page_width, page_height = letter
+    frame_width, frame_height = page_width - 2 * PAGE_MARGIN, page_height - 2 * PAGE_MARGIN
+    width, height = frame_width - 2 * FRAME_PADDING, frame_height - 2 * FRAME_PADDING
+    styles = getSampleStyleSheet()
+
+    # Title & Generated Time
+    heading = [
+        Paragraph(f"<b>{title}</b>", styles['Title']),
+        Paragraph(f"Generated on: {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']),
+        Spacer(1, 12),
+    ]
+    heading_height = sum(
+        f.wrap(width, height)[1] + f.getSpaceBefore() + f.getSpaceAfter() for f in heading
+    )
+    table_style = TableStyle(style)
+    header_height, row_height = _row_heights(columns, col_widths, table_style)
+
+    canv = canvas.Canvas(out, pagesize=letter)
+    rows_iter = iter(rows)
+    pending = deque()
+    written = 0
+    first = True
+    while True:
+        available = height - (heading_height if first else 0)
+        # Rows are at least one line high, so this many always fills the page
+        wanted = max(1, int((available - header_height) // row_height))
+        pending.extend(
+            [_cell(v) for v in row] for row in islice(rows_iter, max(0, wanted - len(pending)))
+        )
+        if not pending and not first:
+            break
+
+        table, count = _fit_table(
+            columns, list(islice(pending, wanted)), col_widths, table_style, width, available
+        )
+        frame = Frame(PAGE_MARGIN, PAGE_MARGIN, frame_width, frame_height)
+        if first:
+            for flowable in heading:
+                frame.add(flowable, canv)
+        if not frame.add(table, canv):
+            raise LayoutError(f"Report row too tall for one page: {pending[0]}")
+        canv.showPage()
+
+        for _ in range(count):
+            pending.popleft()
+        written += count
+        first = False
+
+    canv.save()
+    return written
+
+
+def _page_table(columns, page, col_widths, table_style):
+    table = LongTable([columns] + page, colWidths=col_widths, repeatRows=1)
+    table.setStyle(table_style)
+    return table
+
+
+# -------------------- REPORTS --------------------
+
+def _chunk_size():
+    return getattr(settings, 'REPORT_CHUNK_SIZE', 2000)
+
+
+def resident_rows(estate):
+    """Residents report rows for an estate, read in chunks."""
+    from .models import User
+
+    residents = User.objects.filter(estate=estate, is_approved=True).order_by('id').values_list(
+        'first_name', 'last_name', 'email', 'phone_number', 'home_address', 'house_type', 'resident_type'
+    )
+    for first_name, last_name, email, phone, address, house_type, resident_type in residents.iterator(
+            chunk_size=_chunk_size()):
+        yield [f"{first_name} {last_name}".strip(), email, phone, address, house_type, resident_type]
+
+
+def payment_rows(estate):
+    """Payment records report rows for an estate, read in chunks."""
+    from .models import DuePayment
+
+    payments = DuePayment.objects.filter(due__estate=estate).order_by('id').values_list(
+        'resident__first_name', 'resident__last_name', 'due__title', 'amount_paid', 'payment_date', 'status'
+    )
+    for first_name, last_name, title, amount, paid_at, status in payments.iterator(chunk_size=_chunk_size()):
+        yield [
+            f"{first_name} {last_name}",
+            title,
+            f"₦{amount:.2f}",
+            timezone.localtime(paid_at).strftime('%Y-%m-%d'),
+            status.capitalize(),
+        ]
+
+
+def render_residents_report(estate, out):
+    return build_table_report(
+        out, f"Residents Report - {estate.name}",
+        RESIDENT_COLUMNS, RESIDENT_COL_WIDTHS, RESIDENT_TABLE_STYLE, resident_rows(estate)
+    )
+
+
+def render_payments_report(estate, out):
+    return build_table_report(
+        out, f"All Payment Records - {estate.name}",
+        PAYMENT_COLUMNS, PAYMENT_COL_WIDTHS, PAYMENT_TABLE_STYLE, payment_rows(estate)
+    )
+
+
+def report_response(render, estate, filename):
+    """
+    Render a report into a spooled temporary file and stream it back.
+
+    Small reports stay in memory; past REPORT_SPOOL_MAX_SIZE bytes they spill
+    to disk. FileResponse closes the file once the response is sent.
+    """
+    out = SpooledTemporaryFile(max_size=getattr(settings, 'REPORT_SPOOL_MAX_SIZE', 5 * 1024 * 1024))
+    render(estate, out)
+    out.seek(0)
+    return FileResponse(out, as_attachment=True, filename=filename, content_type='application/pdf')
+
+
+# -------------------- BACKGROUND JOBS --------------------
+
+REPORT_RENDERERS = {
+    'residents': render_residents_report,
+    'payments': render_payments_report,
+}
+REPORT_FILENAMES = {
+    'residents': 'residents_report.pdf',
+    'payments': 'payment_records.pdf',
+}
+
+
+def _stamp(value):
+    return value.timestamp() if value else 0
+
+
+def report_watermark(estate, report):
+    """
+    Fingerprint of the data a report covers, from one aggregate query.
+
+    Payments are fingerprinted on row count, highest id and the latest
+    updated_at, so new, deleted and edited rows (status changes included)
+    all move it. Residents use count, highest id and the latest join date;
+    profile edits aren't seen, so stored reports are also only reused for
+    REPORT_CACHE_MAX_AGE seconds. The parts are hashed to keep the value
+    a fixed length.
+    """
+    from django.db.models import Count, Max
+    from .models import DuePayment, User
+
+    if report == 'residents':
+        agg = User.objects.filter(estate=estate, is_approved=True).aggregate(
+            count=Count('id'), last_id=Max('id'), last_at=Max('date_joined')
+        )
+    else:
+        agg = DuePayment.objects.filter(due__estate=estate).aggregate(
+            count=Count('id'), last_id=Max('id'), last_at=Max('updated_at')
+        )
+    # The estate's name and details are printed on the report too
+    parts = [
+        estate.pk, _stamp(estate.updated_at), report,
+        agg['count'], agg['last_id'] or 0, _stamp(agg['last_at']),
+    ]
+    return hashlib.sha256(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _render_timeout():
+    return timedelta(seconds=getattr(settings, 'REPORT_RENDER_TIMEOUT', 15 * 60))
+
+
+def expire_stalled_jobs(**filters):
+    """
+    Mark pending/running jobs older than REPORT_RENDER_TIMEOUT as failed.
+
+    Their task was lost or their worker died mid-render, so they'll never
+    finish; failing them stops them being handed out for reuse.
+
+    Returns:
+        int: Number of jobs marked failed
+    """
+    from .models import ReportJob
+
+    now = timezone.now()
+    return ReportJob.objects.filter(
+        status__in=['pending', 'running'], created_at__lt=now - _render_timeout(), **filters
+    ).update(status='failed', error='Timed out before the report was rendered', finished_at=now)
+
+
+def request_report(estate, report, user=None):
+    """
+    Find a reusable job for the report, or create a new pending one.
+
+    Rendered reports are reused for REPORT_CACHE_MAX_AGE seconds; jobs still
+    pending or running only within REPORT_RENDER_TIMEOUT.
+
+    Returns:
+        tuple: (ReportJob, created); the caller queues generate_report for
+        created jobs
+    """
+    from django.db.models import Q
+    from .models import ReportJob
+
+    expire_stalled_jobs(estate=estate, report=report)
+
+    now = timezone.now()
+    watermark = report_watermark(estate, report)
+    max_age = timedelta(seconds=getattr(settings, 'REPORT_CACHE_MAX_AGE', 60 * 60))
+    existing = ReportJob.objects.filter(
+        Q(status='done', created_at__gte=now - max_age) |
+        Q(status__in=['pending', 'running'], created_at__gte=now - _render_timeout()),
+        estate=estate, report=report, watermark=watermark,
+    ).order_by('-created_at').first()
+    if existing:
+        return existing, False
+
+    job = ReportJob.objects.create(estate=estate, report=report, watermark=watermark, requested_by=user)
+    return job, True
+
+
+def run_report_job(job):
+    """Render a job's report into default storage and record the outcome."""
+    from django.core.files import File
+
+    job.status = 'running'
+    job.save(update_fields=['status'])
+
+    out = SpooledTemporaryFile(max_size=getattr(settings, 'REPORT_SPOOL_MAX_SIZE', 5 * 1024 * 1024))
+    try:
+        job.row_count = REPORT_RENDERERS[job.report](job.estate, out)
+        out.seek(0)
+        job.file.save(f"{job.report}_{job.estate_id}_{job.job_id}.pdf", File(out), save=False)
+        job.status = 'done'
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+        raise
+    finally:
+        out.close()
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'file', 'row_count', 'error', 'finished_at'])
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import *
+from .entitlements import get_entitlement
 import random
 from postmarker.core import PostmarkClient
 from django.conf import settings
@@ -237,10 +238,12 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['is_approved', 'role']
 
     def get_subscription_active(self, obj):
-        subscription = getattr(obj, 'subscription', None)
-        if not subscription:
-            return False
-        return subscription.is_active()
+        # Annotated by User.objects.with_subscription_state() for lists
+        annotated = getattr(obj, 'is_subscription_active', None)
+        if annotated is not None:
+            return annotated
+        entitlement = get_entitlement(obj)
+        return bool(entitlement and entitlement.is_active())
 
 
 
@@ -309,8 +312,8 @@ class DuePaymentSerializer(serializers.ModelSerializer):
         model = DuePayment
         fields = ['id', 'due', 'due_title', 'resident_name', 'amount_paid', 
                  'payment_evidence', 'payment_date', 'status', 'admin_notes', 
-                 'approved_by_name', 'approved_at']
-        read_only_fields = ['status', 'approved_by', 'approved_at']
+                 'approved_by_name', 'approved_at', 'receipt_status']
+        read_only_fields = ['status', 'approved_by', 'approved_at', 'receipt_status']
 
 
 
@@ -5,8 +5,11 @@ from django.utils import timezone
 from threading import current_thread
 from .models import (
     Alert, DuePayment, VisitorCode, User,
-    ArtisanOrDomesticStaff, Announcement, Due, AuditLog
+    ArtisanOrDomesticStaff, Announcement, Due, AuditLog, SubscriptionPlan,
+    UserSubscription, EstateSubscription
 )
+from .entitlements import invalidate_entitlement, invalidate_estate_entitlement
+from .plan_registry import invalidate_plans
 from .utils.push_notification import (
     send_push_notification,
     notify_all_residents,
@@ -37,6 +40,12 @@ def store_pre_save_instance(sender, instance, **kwargs):
     """Store the original instance before save to detect changes"""
     # Only track models in the estates app, exclude AuditLog itself
     if sender._meta.app_label == 'estates' and sender.__name__ != 'AuditLog':
+        # log_model_save only audits saves made by an authenticated request;
+        # skip the extra SELECT (and the stale entry it would leave) otherwise
+        request = getattr(current_thread(), 'request', None)
+        if not request or not hasattr(request, 'user') or not request.user.is_authenticated:
+            return
+
         if instance.pk:
             try:
                 old_instance = sender.objects.get(pk=instance.pk)
@@ -368,4 +377,29 @@ def notify_new_due_created(sender, instance, created, **kwargs):
             notification_type='due',
             action_url=f'/dues/{instance.id}',
             exclude_user=instance.created_by
-        )
\ No newline at end of file
+        )
+
+
+# ============================================
+# CACHE INVALIDATION
+# ============================================
+
+@receiver(post_save, sender=SubscriptionPlan)
+@receiver(post_delete, sender=SubscriptionPlan)
+def invalidate_plan_registry(sender, instance, **kwargs):
+    """Drop every process's cached plans when a plan changes"""
+    invalidate_plans()
+
+
+@receiver(post_save, sender=UserSubscription)
+@receiver(post_delete, sender=UserSubscription)
+def invalidate_subscription_entitlement(sender, instance, **kwargs):
+    """Drop the cached entitlement the subscription gates use"""
+    invalidate_entitlement(instance.user_id)
+
+
+@receiver(post_save, sender=EstateSubscription)
+@receiver(post_delete, sender=EstateSubscription)
+def invalidate_estate_subscription_entitlement(sender, instance, **kwargs):
+    """Drop the estate's cached entitlement, shared by all its residents"""
+    invalidate_estate_entitlement(instance.estate_id)
@@ -0,0 +1,449 @@
+# estates/subscription_sync.py
+"""
+Paginated Paystack subscription sync.
+
+Walks every page of GET /subscription instead of just the first one, applies
+each page on its own and keeps only that page in memory. The next page to
+fetch is committed together with the page's writes, so a run that dies
+half-way resumes where it stopped on the next invocation.
+
+Runs are incremental by default: only customers with a subscription whose
+updatedAt is past the saved watermark are written, and the walk stops at the
+first page with nothing new. Paystack's list endpoint can't filter by
+updatedAt and orders by creation date, so an old subscription changed later
+can sit past that page; a full reconciliation every
+PAYSTACK_FULL_SYNC_INTERVAL_DAYS catches those.
+"""
+
+from collections import defaultdict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta, timezone as dt_timezone
+import logging
+
+from .models import (
+    PaystackSyncState, UserSubscription, UserSubscriptionHistory
+)
+from .entitlements import invalidate_entitlements
+from .paystack_client import PaystackError, get_paystack_client
+from .plan_registry import get_plans_by_codes
+from .subscriptions import normalize_paystack_status
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+SYNC_STATE_NAME = 'paystack_subscriptions'
+
+# Preference when a customer has several subscriptions: active > non-renewing > anything else
+STATUS_RANK = {'active': 2, 'non-renewing': 1}
+
+# Everything on PaystackSyncState but the lock, which other processes may be writing
+CHECKPOINT_FIELDS = [
+    'mode', 'next_page', 'in_progress', 'watermark', 'run_watermark', 'last_full_sync_at',
+    'started_at', 'finished_at', 'last_error', 'updated_at',
+]
+
+SYNC_FIELDS = [
+    'paystack_subscription_code', 'plan', 'paystack_customer_code', 'status',
+    'next_billing_date', 'authorization_code', 'email_token', 'updated_at',
+]
+
+
+class PaystackSyncError(Exception):
+    """Raised when Paystack returns an error for a page request."""
+
+
+def fetch_subscription_page(page, per_page):
+    """
+    Fetch one page of subscriptions from Paystack.
+
+    Returns:
+        tuple: (subscriptions list, page_count int)
+    """
+    payload = get_paystack_client().list_subscriptions(page=page, per_page=per_page)
+    if not payload.get("status"):
+        raise PaystackSyncError(f"Page {page} failed: {payload.get('message', payload)}")
+
+    subscriptions = payload.get("data") or []
+    meta = payload.get("meta") or {}
+    page_count = meta.get("pageCount") or page
+    return subscriptions, int(page_count)
+
+
+def _rank(status):
+    return STATUS_RANK.get(status, 0)
+
+
+def _choose_subscription(subs, current_code=None):
+    """Pick the subscription that should back the user's main record; ties keep current_code."""
+    return max(subs, key=lambda s: (_rank(s.get("status")), s.get("subscription_code") == current_code))
+
+
+def _stored_statuses(history, local_sub):
+    """
+    Last known Paystack status of each of a customer's subscriptions.
+
+    Comes from the newest history row per subscription; the main record's
+    status wins for its own subscription when it was written later (by a
+    webhook, say).
+
+    Args:
+        history (dict): subscription_code -> newest UserSubscriptionHistory
+        local_sub (UserSubscription, optional): The customer's main record
+
+    Returns:
+        dict: subscription_code -> status
+    """
+    statuses = {code: row.status for code, row in history.items()}
+    if local_sub is not None:
+        row = history.get(local_sub.paystack_subscription_code)
+        if row is None or local_sub.updated_at > row.synced_at:
+            statuses[local_sub.paystack_subscription_code] = local_sub.status
+    return statuses
+
+
+def _parse_datetime(value):
+    """Parse a Paystack timestamp into an aware datetime, or None."""
+    try:
+        parsed = parse_datetime(value) if value else None
+    except (TypeError, ValueError):
+        return None
+    if parsed and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def _changed_at(sub):
+    """Paystack's last-modified time for a subscription, or None if unknown."""
+    return _parse_datetime(sub.get("updatedAt") or sub.get("createdAt"))
+
+
+def _latest_history(user_ids):
+    """
+    Get the newest history row per (user, subscription code).
+
+    Only those rows are read (ranked in the database), so the cost doesn't
+    grow with the length of each subscription's history.
+
+    Returns:
+        dict: user_id -> {subscription_code: UserSubscriptionHistory}
+    """
+    rows = UserSubscriptionHistory.objects.filter(user_id__in=user_ids).annotate(
+        recency=Window(
+            RowNumber(),
+            partition_by=[F('user_id'), F('paystack_subscription_code')],
+            order_by=[F('synced_at').desc(), F('id').desc()],
+        )
+    ).filter(recency=1).only(
+        'user_id', 'plan_id', 'paystack_subscription_code', 'status',
+        'next_billing_date', 'authorization_code', 'email_token', 'content_hash', 'synced_at',
+    )
+    latest = defaultdict(dict)
+    for row in rows:
+        latest[row.user_id][row.paystack_subscription_code] = row
+    return latest
+
+
+def sync_subscription_page(subscriptions, since=None, written=None):
+    """
+    Apply one page of Paystack subscriptions to local records.
+
+    Users, plans and existing subscriptions for the whole page are loaded up
+    front and the changes are written with bulk_create/bulk_update in one
+    transaction, so the query count doesn't grow with the page size.
+
+    A customer's subscriptions can span pages, and in incremental runs not
+    every page is applied. Their subscriptions on this page are weighed
+    against the last known status of their others, so the main record is
+    never moved to a worse-ranked subscription than one held elsewhere.
+    Ties go to this page, unless the run already wrote the customer.
+
+    Args:
+        subscriptions (list): Subscription objects from one Paystack page
+        since (datetime, optional): Watermark; customers none of whose
+            subscriptions changed after it are left untouched
+        written (set, optional): Ids of users whose record this run has
+            written; updated in place
+
+    Returns:
+        dict: synced, skipped and unchanged counts for the page, and the
+              latest updatedAt seen on it
+    """
+    user_subs = defaultdict(list)
+    for sub in subscriptions:
+        email = (sub.get("customer") or {}).get("email")
+        if email:
+            user_subs[email].append(sub)
+        else:
+            logger.warning(f"Subscription {sub.get('subscription_code')} has no customer email - skipping")
+
+    unchanged = 0
+    latest = None
+    for email in list(user_subs):
+        changed = [_changed_at(s) for s in user_subs[email]]
+        for changed_at in changed:
+            if changed_at and (latest is None or changed_at > latest):
+                latest = changed_at
+
+        # Unknown timestamps count as changed; the whole group is applied so the
+        # chosen subscription is still picked from all of the customer's subs
+        if since is not None and all(c is not None and c <= since for c in changed):
+            unchanged += 1
+            del user_subs[email]
+
+    # Everything the page needs, in three queries; plans come from the registry
+    users = {u.email: u for u in User.objects.filter(email__in=list(user_subs)).only('id', 'email')}
+    plan_codes = {
+        (s.get("plan") or {}).get("plan_code")
+        for subs in user_subs.values() for s in subs
+    } - {None, ''}
+    plans = get_plans_by_codes(plan_codes)
+    user_ids = [u.id for u in users.values()]
+    local_subs = {
+        sub.user_id: sub
+        for sub in UserSubscription.objects.filter(user_id__in=user_ids)
+    }
+    latest_history = _latest_history(user_ids)
+    if written is None:
+        written = set()
+
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    new_history = []
+    synced = 0
+    skipped = 0
+    for email, subs in user_subs.items():
+        user = users.get(email)
+        if user is None:
+            skipped += 1
+            continue
+
+        local_sub = local_subs.get(user.id)
+        history = latest_history[user.id]
+        chosen_sub = _choose_subscription(subs, local_sub.paystack_subscription_code if local_sub else None)
+
+        page_codes = {s.get("subscription_code") for s in subs}
+        elsewhere = [
+            _rank(status) for code, status in _stored_statuses(history, local_sub).items()
+            if code not in page_codes
+        ]
+        replace = True
+        if elsewhere:
+            chosen_rank, best_elsewhere = _rank(chosen_sub.get("status")), max(elsewhere)
+            replace = chosen_rank > best_elsewhere or (chosen_rank == best_elsewhere and user.id not in written)
+
+        plan = plans.get((chosen_sub.get("plan") or {}).get("plan_code"))
+        if replace and plan is None:
+            logger.warning(f"No local plan for {email}'s subscription {chosen_sub.get('subscription_code')}")
+            replace = False
+
+        if replace:
+            next_billing_date = _parse_datetime(chosen_sub.get("next_payment_date"))
+            if next_billing_date is None:
+                # Paystack sends none for cancelled/non-renewing subscriptions, but the
+                # column is NOT NULL: keep the date we have, or treat it as ending now
+                next_billing_date = local_sub.next_billing_date if local_sub else now
+            values = {
+                "paystack_subscription_code": chosen_sub.get("subscription_code"),
+                "plan": plan,
+                "paystack_customer_code": (chosen_sub.get("customer") or {}).get("customer_code"),
+                "status": normalize_paystack_status(chosen_sub.get("status")),
+                "next_billing_date": next_billing_date,
+                "authorization_code": (chosen_sub.get("authorization") or {}).get("authorization_code"),
+                "email_token": chosen_sub.get("email_token"),
+                "updated_at": now,
+            }
+            written.add(user.id)
+            # Keyed on the user alone: the subscription is one-to-one with the user
+            if local_sub is None:
+                to_create.append(UserSubscription(user=user, **values))
+            else:
+                for field, value in values.items():
+                    setattr(local_sub, field, value)
+                to_update.append(local_sub)
+
+        # record every sub whose tracked fields changed since its last history row
+        for s in subs:
+            entry = UserSubscriptionHistory(
+                user=user,
+                plan=plans.get((s.get("plan") or {}).get("plan_code")),
+                paystack_subscription_code=s.get("subscription_code"),
+                status=s.get("status"),
+                next_billing_date=_parse_datetime(s.get("next_payment_date")),
+                authorization_code=(s.get("authorization") or {}).get("authorization_code"),
+                email_token=s.get("email_token"),
+                synced_at=now,
+            )
+            entry.content_hash = entry.compute_content_hash()
+            last = history.get(entry.paystack_subscription_code)
+            # Rows written before hashing was added get hashed on the fly
+            if last is None or (last.content_hash or last.compute_content_hash()) != entry.content_hash:
+                history[entry.paystack_subscription_code] = entry
+                new_history.append(entry)
+        synced += 1
+
+    with transaction.atomic():
+        if to_create:
+            UserSubscription.objects.bulk_create(to_create)
+        if to_update:
+            UserSubscription.objects.bulk_update(to_update, SYNC_FIELDS)
+        if new_history:
+            UserSubscriptionHistory.objects.bulk_create(new_history)
+        # bulk writes skip the post_save receiver that drops cached entitlements
+        invalidate_entitlements([sub.user_id for sub in to_create + to_update])
+
+    return {"synced": synced, "skipped": skipped, "unchanged": unchanged, "latest": latest}
+
+
+def _get_state():
+    state, _ = PaystackSyncState.objects.get_or_create(name=SYNC_STATE_NAME)
+    return state
+
+
+def _lock_is_stale(state, now):
+    timeout = timedelta(seconds=getattr(settings, 'PAYSTACK_SYNC_LOCK_TIMEOUT', 60 * 60))
+    return state.locked_at is None or now - state.locked_at >= timeout
+
+
+def acquire_sync_lock(job_id):
+    """
+    Claim the single-flight lock for a sync job.
+
+    The lock lives on the PaystackSyncState row, taken with SELECT ... FOR
+    UPDATE, so web processes and workers all see the same holder. A lock
+    held longer than PAYSTACK_SYNC_LOCK_TIMEOUT is treated as abandoned.
+
+    Returns:
+        bool: True if the lock was free (or already held by this job)
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        state, _ = PaystackSyncState.objects.select_for_update().get_or_create(name=SYNC_STATE_NAME)
+        if state.job_id and state.job_id != job_id and not _lock_is_stale(state, now):
+            return False
+        state.job_id = job_id
+        state.locked_at = now
+        state.save(update_fields=['job_id', 'locked_at', 'updated_at'])
+    return True
+
+
+def current_sync_job():
+    """Return the id of the sync job holding the lock, or None."""
+    state = PaystackSyncState.objects.filter(name=SYNC_STATE_NAME).only('job_id', 'locked_at').first()
+    if state is None or not state.job_id or _lock_is_stale(state, timezone.now()):
+        return None
+    return state.job_id
+
+
+def release_sync_lock(job_id):
+    PaystackSyncState.objects.filter(name=SYNC_STATE_NAME, job_id=job_id).update(job_id='', locked_at=None)
+
+
+def _full_sync_due(state):
+    if state.watermark is None or state.last_full_sync_at is None:
+        return True
+    interval = timedelta(days=getattr(settings, 'PAYSTACK_FULL_SYNC_INTERVAL_DAYS', 7))
+    return timezone.now() - state.last_full_sync_at >= interval
+
+
+def sync_all_subscriptions(per_page=None, max_pages=None, restart=False, full=None, on_page=None):
+    """
+    Sync Paystack subscriptions page by page, resuming an interrupted run.
+
+    Args:
+        per_page (int, optional): Page size, defaults to PAYSTACK_SYNC_PAGE_SIZE
+        max_pages (int, optional): Stop after this many pages; the next call continues
+        restart (bool): Ignore any saved checkpoint and start from page one
+        full (bool, optional): Force (True) or rule out (False) a full
+            reconciliation; by default a full run happens when one is due
+        on_page (callable, optional): Called with the running totals after each page
+
+    Returns:
+        dict: mode, pages, synced/skipped/unchanged counts, and whether the walk completed
+    """
+    if per_page is None:
+        per_page = getattr(settings, 'PAYSTACK_SYNC_PAGE_SIZE', 100)
+
+    state = _get_state()
+    if restart or not state.in_progress:
+        if full is None:
+            full = _full_sync_due(state)
+        state.mode = 'full' if full or state.watermark is None else 'incremental'
+        state.next_page = 1
+        state.started_at = timezone.now()
+        state.run_watermark = None
+        state.in_progress = True
+        state.last_error = ''
+        state.save(update_fields=CHECKPOINT_FIELDS)
+    else:
+        logger.info(f"Resuming {state.mode} Paystack subscription sync at page {state.next_page}")
+
+    since = state.watermark if state.mode == 'incremental' else None
+    totals = {"mode": state.mode, "pages": 0, "synced": 0, "skipped": 0, "unchanged": 0, "completed": False}
+    page = state.next_page
+    written = set()
+
+    while True:
+        try:
+            subscriptions, page_count = fetch_subscription_page(page, per_page)
+        except (PaystackSyncError, PaystackError) as e:
+            logger.error(f"Paystack subscription sync stopped at page {page}: {str(e)}")
+            PaystackSyncState.objects.filter(pk=state.pk).update(last_error=str(e))
+            totals["error"] = str(e)
+            return totals
+
+        # The page's writes and the checkpoint commit together; the page runs in
+        # a savepoint so a failure can still be recorded on the state row
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    counts = sync_subscription_page(subscriptions, since=since, written=written)
+            except Exception as e:
+                # Ending the run keeps the next one from retrying this page forever;
+                # the watermark isn't advanced, so nothing on or after it is lost
+                logger.exception(f"Paystack subscription sync failed applying page {page}")
+                state.in_progress = False
+                state.finished_at = timezone.now()
+                state.last_error = f"Page {page}: {e}"
+                state.save(update_fields=CHECKPOINT_FIELDS)
+                totals["error"] = str(e)
+                return totals
+
+            if counts["latest"] and (state.run_watermark is None or counts["latest"] > state.run_watermark):
+                state.run_watermark = counts["latest"]
+
+            state.next_page = page + 1
+            # Incremental runs stop at the first page with nothing new on it
+            nothing_new = since is not None and counts["synced"] == 0 and counts["skipped"] == 0
+            done = not subscriptions or page >= page_count or nothing_new
+            if done:
+                state.in_progress = False
+                state.finished_at = timezone.now()
+                if state.run_watermark and (state.watermark is None or state.run_watermark > state.watermark):
+                    state.watermark = state.run_watermark
+                if state.mode == 'full':
+                    state.last_full_sync_at = state.finished_at
+            state.save(update_fields=CHECKPOINT_FIELDS)
+
+        totals["pages"] += 1
+        for key in ("synced", "skipped", "unchanged"):
+            totals[key] += counts[key]
+        logger.info(
+            f"Synced Paystack subscription page {page}/{page_count} ({state.mode}): "
+            f"{counts['synced']} synced, {counts['skipped']} skipped, {counts['unchanged']} unchanged"
+        )
+        if on_page:
+            on_page(dict(totals))
+
+        if done:
+            totals["completed"] = True
+            return totals
+        if max_pages and totals["pages"] >= max_pages:
+            return totals
+        page += 1
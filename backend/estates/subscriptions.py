@@ -1,16 +1,15 @@
 import datetime
-from django.conf import settings
 from django.shortcuts import get_object_or_404
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 
-from paystackapi.paystack import Paystack
 
 from .models import SubscriptionPlan, UserSubscription
 from .serializers import SubscriptionPlanSerializer
+from .paystack_client import get_paystack_client
+from .plan_registry import get_all_plans
 
-paystack = Paystack(secret_key=settings.PAYSTACK_SECRET_KEY)
 
 def normalize_paystack_status(paystack_status):
     """
@@ -53,7 +52,7 @@ def create_subscription(request):
 
     # Verify the payment with Paystack
     try:
-        verify_resp = paystack.transaction.verify(reference)
+        verify_resp = get_paystack_client().verify_transaction(reference)
     except Exception as e:
         return Response({'error': f'Paystack verification failed: {e}'}, status=status.HTTP_502_BAD_GATEWAY)
 
@@ -74,7 +73,7 @@ def create_subscription(request):
         customer_code = user.subscription.paystack_customer_code
     else:
         try:
-            cust_resp = paystack.customer.create(
+            cust_resp = get_paystack_client().create_customer(
                 email=user.email,
                 first_name=getattr(user, 'first_name', '') or '',
                 last_name=getattr(user, 'last_name', '') or '',
@@ -92,7 +91,7 @@ def create_subscription(request):
 
     # Create Subscription
     try:
-        sub_resp = paystack.subscription.create(
+        sub_resp = get_paystack_client().create_subscription(
             customer=customer_code,
             plan=plan.paystack_plan_code,
             authorization=authorization
@@ -162,7 +161,7 @@ def cancel_subscription(request):
         if subscription.paystack_customer_code:
             try:
                 # Get customer's subscriptions from Paystack
-                customer_subs = paystack.subscription.list(
+                customer_subs = get_paystack_client().list_subscriptions(
                     customer=subscription.paystack_customer_code
                 )
                 
@@ -220,7 +219,7 @@ def cancel_subscription(request):
     # Now we should have a subscription code, proceed with Paystack cancellation
     try:
         # Use the disable endpoint to cancel the subscription
-        cancel_resp = paystack.subscription.disable(
+        cancel_resp = get_paystack_client().disable_subscription(
             code=subscription.paystack_subscription_code,
             token=subscription.email_token
         )
@@ -260,7 +259,7 @@ def subscription_plans(request):
     """
     Get all available subscription plans
     """
-    plans = SubscriptionPlan.objects.all()
+    plans = get_all_plans()
     serializer = SubscriptionPlanSerializer(plans, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -334,7 +333,7 @@ def reactivate_subscription(request):
     # If we have a Paystack subscription code, try to enable it
     if subscription.paystack_subscription_code:
         try:
-            enable_resp = paystack.subscription.enable(
+            enable_resp = get_paystack_client().enable_subscription(
                 code=subscription.paystack_subscription_code,
                 token=subscription.email_token
             )
@@ -384,7 +383,7 @@ def renew_subscription(request):
 
     # Verify the payment with Paystack
     try:
-        verify_resp = paystack.transaction.verify(reference)
+        verify_resp = get_paystack_client().verify_transaction(reference)
     except Exception as e:
         return Response({'error': f'Paystack verification failed: {e}'}, status=status.HTTP_502_BAD_GATEWAY)
 
@@ -405,7 +404,7 @@ def renew_subscription(request):
         customer_code = user.subscription.paystack_customer_code
     else:
         try:
-            cust_resp = paystack.customer.create(
+            cust_resp = get_paystack_client().create_customer(
                 email=user.email,
                 first_name=getattr(user, 'first_name', '') or '',
                 last_name=getattr(user, 'last_name', '') or '',
@@ -423,7 +422,7 @@ def renew_subscription(request):
 
     # Create or update Subscription
     try:
-        sub_resp = paystack.subscription.create(
+        sub_resp = get_paystack_client().create_subscription(
             customer=customer_code,
             plan=plan.paystack_plan_code,
             authorization=authorization
@@ -0,0 +1,321 @@
+# estates/task_metrics.py
+"""
+Celery queue-latency and task timing metrics.
+
+Every published task is stamped with its enqueue time; when a worker picks it
+up, the time spent waiting in the queue is aggregated per queue and per task
+name, along with run time, outcomes and retries. Aggregates live in the Django
+cache, so web and worker processes share one view of the numbers.
+
+Counters use the cache's own add/incr. On Redis, maxima, the queue/task
+name registries and run-time samples are updated with single Redis
+commands too, so concurrent workers can't overwrite each other; other
+backends fall back to a get-then-set under a process-wide lock, which is
+only safe for caches private to one process (LocMem).
+"""
+
+from celery.signals import (
+    before_task_publish, task_prerun, task_postrun, task_failure, task_retry
+)
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY_PREFIX = 'task_metrics'
+METRICS_TIMEOUT = 60 * 60 * 24 * 7  # keep aggregates for a week
+ENQUEUED_AT_HEADER = 'enqueued_at'
+RECENT_SAMPLES = 200  # run-time samples kept per task for percentiles
+
+# task_id -> monotonic start time, for tasks currently running in this process
+_running = {}
+
+# Guards read-modify-write updates on caches other than Redis
+_update_lock = threading.Lock()
+
+_SET_MAX_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]))
+if current == nil or tonumber(ARGV[1]) > current then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+end
+"""
+
+
+def _key(*parts):
+    return ':'.join([METRICS_KEY_PREFIX, *[str(p) for p in parts]])
+
+
+def _incr(key, amount=1):
+    """Increment a cache counter, creating it if it doesn't exist yet."""
+    if cache.add(key, amount, timeout=METRICS_TIMEOUT):
+        return amount
+    try:
+        return cache.incr(key, amount)
+    except ValueError:
+        # Key expired between add() and incr()
+        cache.set(key, amount, timeout=METRICS_TIMEOUT)
+        return amount
+
+
+def _redis(key):
+    """
+    Get the Redis client and full key name for a cache key.
+
+    Returns:
+        tuple: (client, key) when the default cache is Redis, else (None, key)
+    """
+    backend = caches['default']
+    if not isinstance(backend, RedisCache):
+        return None, key
+    full_key = backend.make_and_validate_key(key)
+    return backend._cache.get_client(full_key, write=True), full_key
+
+
+def _set_max(key, value):
+    client, redis_key = _redis(key)
+    if client is not None:
+        # Compare-and-set in one script; Django reads the plain integer back
+        client.eval(_SET_MAX_SCRIPT, 1, redis_key, value, METRICS_TIMEOUT)
+        return
+    with _update_lock:
+        current = cache.get(key)
+        if current is None or value > current:
+            cache.set(key, value, timeout=METRICS_TIMEOUT)
+
+
+def _register(set_key, name):
+    client, redis_key = _redis(set_key)
+    if client is not None:
+        client.pipeline().sadd(redis_key, name).expire(redis_key, METRICS_TIMEOUT).execute()
+        return
+    with _update_lock:
+        names = cache.get(set_key) or []
+        if name not in names:
+            cache.set(set_key, sorted(names + [name]), timeout=METRICS_TIMEOUT)
+
+
+def _add_sample(list_key, value):
+    """Keep value among the latest RECENT_SAMPLES samples under list_key."""
+    client, redis_key = _redis(list_key)
+    if client is not None:
+        client.pipeline().lpush(redis_key, value).ltrim(redis_key, 0, RECENT_SAMPLES - 1) \
+            .expire(redis_key, METRICS_TIMEOUT).execute()
+        return
+    with _update_lock:
+        samples = cache.get(list_key) or []
+        cache.set(list_key, (samples + [value])[-RECENT_SAMPLES:], timeout=METRICS_TIMEOUT)
+
+
+def _samples(list_key):
+    client, redis_key = _redis(list_key)
+    if client is not None:
+        return [int(value) for value in client.lrange(redis_key, 0, -1)]
+    return cache.get(list_key) or []
+
+
+def _registered(set_key):
+    """Names registered under set_key, sorted."""
+    client, redis_key = _redis(set_key)
+    if client is not None:
+        return sorted(member.decode() for member in client.smembers(redis_key))
+    return cache.get(set_key) or []
+
+
+def record_queue_wait(queue, wait_seconds):
+    """Add one queue-wait sample (in seconds) to the aggregates for a queue."""
+    wait_ms = max(0, int(wait_seconds * 1000))
+
+    _register(_key('queues'), queue)
+    _incr(_key('queue', queue, 'count'))
+    _incr(_key('queue', queue, 'wait_total_ms'), wait_ms)
+    _set_max(_key('queue', queue, 'wait_max_ms'), wait_ms)
+
+    budget = getattr(settings, 'CELERY_QUEUE_WAIT_BUDGETS', {}).get(queue)
+    if budget is not None and wait_seconds > budget:
+        logger.warning(
+            f"Queue '{queue}' wait of {wait_seconds:.2f}s exceeded its {budget}s budget"
+        )
+
+
+def record_task_wait(task_name, wait_seconds):
+    """Add one queue-wait sample (in seconds) to the aggregates for a task."""
+    wait_ms = max(0, int(wait_seconds * 1000))
+
+    _register(_key('tasks'), task_name)
+    _incr(_key('task', task_name, 'wait_total_ms'), wait_ms)
+    _set_max(_key('task', task_name, 'wait_max_ms'), wait_ms)
+    _incr(_key('task', task_name, 'wait_count'))
+
+
+def record_task_run(task_name, run_seconds, state):
+    """Add one finished run (in seconds) with its final state to the aggregates for a task."""
+    run_ms = max(0, int(run_seconds * 1000))
+
+    _register(_key('tasks'), task_name)
+    _incr(_key('task', task_name, 'count'))
+    _incr(_key('task', task_name, 'run_total_ms'), run_ms)
+    _set_max(_key('task', task_name, 'run_max_ms'), run_ms)
+
+    _add_sample(_key('task', task_name, 'run_samples'), run_ms)
+
+    if state == 'SUCCESS':
+        _incr(_key('task', task_name, 'successes'))
+
+
+def record_task_failure(task_name):
+    _register(_key('tasks'), task_name)
+    _incr(_key('task', task_name, 'failures'))
+
+
+def record_task_retry(task_name):
+    _register(_key('tasks'), task_name)
+    _incr(_key('task', task_name, 'retries'))
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def get_task_metrics():
+    """
+    Get aggregated timing metrics per task name.
+
+    Returns:
+        dict: task name -> {count, successes, failures, retries,
+              avg_wait_ms, max_wait_ms, avg_run_ms, p50_run_ms, p95_run_ms, max_run_ms}
+    """
+    metrics = {}
+    for task_name in _registered(_key('tasks')):
+        def get(field):
+            return cache.get(_key('task', task_name, field)) or 0
+
+        count = get('count')
+        wait_count = get('wait_count')
+        samples = _samples(_key('task', task_name, 'run_samples'))
+        metrics[task_name] = {
+            'count': count,
+            'successes': get('successes'),
+            'failures': get('failures'),
+            'retries': get('retries'),
+            'avg_wait_ms': round(get('wait_total_ms') / wait_count, 1) if wait_count else 0,
+            'max_wait_ms': get('wait_max_ms'),
+            'avg_run_ms': round(get('run_total_ms') / count, 1) if count else 0,
+            'p50_run_ms': _percentile(samples, 50),
+            'p95_run_ms': _percentile(samples, 95),
+            'max_run_ms': get('run_max_ms'),
+        }
+    return metrics
+
+
+def reset_task_metrics():
+    """Clear every queue and task aggregate."""
+    keys = []
+    for queue in _registered(_key('queues')):
+        keys += [_key('queue', queue, f) for f in ('count', 'wait_total_ms', 'wait_max_ms')]
+    for task_name in _registered(_key('tasks')):
+        keys += [
+            _key('task', task_name, f) for f in (
+                'count', 'successes', 'failures', 'retries', 'wait_count',
+                'wait_total_ms', 'wait_max_ms', 'run_total_ms', 'run_max_ms', 'run_samples',
+            )
+        ]
+    keys += [_key('queues'), _key('tasks')]
+    cache.delete_many(keys)
+
+
+def get_queue_latency_metrics():
+    """
+    Get aggregated queue-wait metrics.
+
+    Returns:
+        dict: queue name -> {count, avg_wait_ms, max_wait_ms}
+    """
+    metrics = {}
+    for queue in _registered(_key('queues')):
+        count = cache.get(_key('queue', queue, 'count')) or 0
+        total = cache.get(_key('queue', queue, 'wait_total_ms')) or 0
+        metrics[queue] = {
+            'count': count,
+            'avg_wait_ms': round(total / count, 1) if count else 0,
+            'max_wait_ms': cache.get(_key('queue', queue, 'wait_max_ms')) or 0,
+        }
+    return metrics
+
+
+# ============================================
+# CELERY SIGNAL HOOKS
+# ============================================
+
+@before_task_publish.connect
+def stamp_enqueue_time(sender=None, headers=None, **kwargs):
+    """Stamp the message with the time it was handed to the broker"""
+    if headers is not None:
+        headers.setdefault(ENQUEUED_AT_HEADER, time.time())
+
+
+@task_prerun.connect
+def record_task_queue_wait(sender=None, task_id=None, task=None, **kwargs):
+    """Measure how long the task sat in its queue before a worker took it"""
+    if task is None:
+        return
+
+    if task_id:
+        _running[task_id] = time.monotonic()
+
+    enqueued_at = getattr(task.request, ENQUEUED_AT_HEADER, None)
+    if not enqueued_at:
+        return  # eager execution or a message published by an older client
+
+    delivery_info = getattr(task.request, 'delivery_info', None) or {}
+    queue = delivery_info.get('routing_key') or 'default'
+
+    try:
+        wait_seconds = time.time() - float(enqueued_at)
+        record_queue_wait(queue, wait_seconds)
+        record_task_wait(task.name, wait_seconds)
+    except Exception as e:
+        # Metrics must never break task execution
+        logger.error(f"Failed to record queue wait for {task.name}: {str(e)}")
+
+
+@task_postrun.connect
+def record_task_run_time(sender=None, task_id=None, task=None, state=None, **kwargs):
+    """Record how long the task body ran and how it finished"""
+    started = _running.pop(task_id, None)
+    if task is None or started is None:
+        return
+
+    try:
+        record_task_run(task.name, time.monotonic() - started, state)
+    except Exception as e:
+        logger.error(f"Failed to record run time for {task.name}: {str(e)}")
+
+
+@task_failure.connect
+def count_task_failure(sender=None, **kwargs):
+    """Count tasks that raised"""
+    if sender is None:
+        return
+    try:
+        record_task_failure(sender.name)
+    except Exception as e:
+        logger.error(f"Failed to record failure for {sender.name}: {str(e)}")
+
+
+@task_retry.connect
+def count_task_retry(sender=None, **kwargs):
+    """Count retries scheduled by tasks"""
+    if sender is None:
+        return
+    try:
+        record_task_retry(sender.name)
+    except Exception as e:
+        logger.error(f"Failed to record retry for {sender.name}: {str(e)}")
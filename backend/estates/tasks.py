@@ -3,35 +3,77 @@ from django.utils import timezone
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives, send_mail
 from django.template.loader import render_to_string
-from .models import VisitorCode, UserSubscription, SubscriptionPlan, UserSubscriptionHistory
-from .subscriptions import normalize_paystack_status
-import requests
+from .models import VisitorCode, UserSubscription
+from .paystack_client import get_paystack_client
+from .subscription_sync import (
+    sync_all_subscriptions, acquire_sync_lock, current_sync_job, release_sync_lock
+)
 from django.contrib.auth import get_user_model
 import logging
-from collections import defaultdict
-
-try:
-    from twilio.rest import Client
-    TWILIO_AVAILABLE = True
-except ImportError:
-    TWILIO_AVAILABLE = False
-    logging.warning("Twilio not installed. SMS notifications will be skipped.")
+import time
+import uuid
+from django.db import models, transaction
+from .utils.sms import TWILIO_AVAILABLE, send_bulk_sms
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
-PAYSTACK_SECRET_KEY = settings.PAYSTACK_SECRET_KEY
-PAYSTACK_BASE_URL = "https://api.paystack.co"
+def _can_raw_delete(model):
+    """
+    A raw DELETE skips the collector, so it's only safe when no other table
+    references the model. The audit post_delete receiver only logs inside a
+    request, so skipping it in a worker loses nothing.
+    """
+    return not any(
+        rel.on_delete is not models.DO_NOTHING
+        for rel in model._meta.related_objects
+    )
+
 
 @shared_task
-def cleanup_expired_codes():
-    expired_codes = VisitorCode.objects.filter(
-        expires_at__lt=timezone.now(),
-        is_used=False
-    )
-    count = expired_codes.count()
-    expired_codes.delete()
-    return f"Cleaned up {count} expired visitor codes"
+def cleanup_expired_codes(batch_size=None, max_runtime=None):
+    """
+    Delete expired, unused visitor codes in bounded primary-key batches.
+    Stops once the runtime budget is spent; the next scheduled run picks up the rest.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'VISITOR_CODE_CLEANUP_BATCH_SIZE', 1000)
+    if max_runtime is None:
+        max_runtime = getattr(settings, 'VISITOR_CODE_CLEANUP_MAX_RUNTIME', 60)
+
+    cutoff = timezone.now()
+    started = time.monotonic()
+    raw_delete = _can_raw_delete(VisitorCode)
+    total_deleted = 0
+    last_pk = 0
+
+    while time.monotonic() - started < max_runtime:
+        # Walk the (is_used, expires_at) index in pk order, one batch at a time
+        pks = list(
+            VisitorCode.objects.filter(
+                is_used=False,
+                expires_at__lt=cutoff,
+                pk__gt=last_pk
+            ).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            break
+
+        batch = VisitorCode.objects.filter(pk__in=pks)
+        if raw_delete:
+            deleted = batch._raw_delete(batch.db)
+        else:
+            deleted, _ = batch.delete()
+
+        total_deleted += deleted
+        last_pk = pks[-1]
+
+        if len(pks) < batch_size:
+            break
+    else:
+        logger.info(f"cleanup_expired_codes stopped after its {max_runtime}s budget")
+
+    return f"Cleaned up {total_deleted} expired visitor codes"
 
 
 @shared_task
@@ -79,114 +121,41 @@ def send_payment_approved_email(recipient_email, resident_name, due_title, amoun
 
 
 
-@shared_task
-def sync_subscriptions_from_paystack():
-    headers = {"Authorization": f"Bearer {PAYSTACK_SECRET_KEY}"}
-    results = []
-    created_subscriptions = []
-
-    print(f"[SYNC] Starting sync - Using secret key: {PAYSTACK_SECRET_KEY[:10]}...")
-
-    url = f"{PAYSTACK_BASE_URL}/subscription"
-    print(f"[SYNC] Fetching from URL: {url}")
-
-    resp = requests.get(url, headers=headers)
-    print(f"[SYNC] Response status: {resp.status_code}")
-
-    if resp.status_code != 200:
-        print(f"[SYNC ERROR] Failed to fetch subscriptions: {resp.text}")
-        return {"error": "Failed to fetch subscriptions from Paystack", "response": resp.text}
-
-    subscriptions = resp.json().get("data", [])
-    print(f"[SYNC] Found {len(subscriptions)} subscriptions from Paystack")
+@shared_task(bind=True)
+def sync_subscriptions_from_paystack(self, per_page=None, max_pages=None, restart=False, full=None):
+    """
+    Walk Paystack subscriptions changed since the last sync (or all of them
+    when a full reconciliation is due or full=True), resuming an interrupted
+    run, then create Paystack subscriptions for local records that lack one.
 
-    # Log first subscription structure for debugging
-    if subscriptions:
-        print(f"[SYNC] Sample subscription data: {subscriptions[0]}")
+    Only one sync runs at a time; progress is published as PROGRESS task state.
+    """
+    job_id = self.request.id or str(uuid.uuid4())
+    if not acquire_sync_lock(job_id):
+        running = current_sync_job()
+        logger.info(f"Paystack sync {running} already running - skipping {job_id}")
+        return {"skipped": True, "running_job_id": running}
 
-    # Group subs by email
-    user_subs = defaultdict(list)
-    for sub in subscriptions:
-        email = sub.get("customer", {}).get("email")
-        if email:
-            user_subs[email].append(sub)
-        else:
-            print(f"[SYNC] Subscription {sub.get('subscription_code')} has no customer email - skipping")
+    try:
+        return _run_subscription_sync(self, per_page, max_pages, restart, full)
+    finally:
+        release_sync_lock(job_id)
 
-    print(f"[SYNC] Grouped subscriptions for {len(user_subs)} unique emails")
 
-    # Update existing subscriptions from Paystack
-    for email, subs in user_subs.items():
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            results.append({"email": email, "status": "skipped (user not found)"})
-            continue
-
-        # pick the "best" sub for main record
-        chosen_sub = None
-        # preference order: active > non-renewing > cancelled
-        for s in subs:
-            if s.get("status") == "active":
-                chosen_sub = s
-                break
-        if not chosen_sub:
-            for s in subs:
-                if s.get("status") == "non-renewing":
-                    chosen_sub = s
-                    break
-        if not chosen_sub:
-            chosen_sub = subs[0]  # fallback (likely cancelled)
-
-        # Log all subscription statuses from Paystack for this user
-        print(f"[SYNC] User {email} - All Paystack subscription statuses: {[s.get('status') for s in subs]}")
-        print(f"[SYNC] User {email} - Chosen subscription code: {chosen_sub.get('subscription_code')}, Status from Paystack: {chosen_sub.get('status')}")
-
-        # map plan
-        plan_code = chosen_sub.get("plan", {}).get("plan_code")
-        plan = SubscriptionPlan.objects.filter(paystack_plan_code=plan_code).first() if plan_code else None
-
-        # update main record with chosen sub
-        # Use both user AND subscription_code to identify the correct subscription
-        paystack_status = chosen_sub.get("status")
-        
-        # Normalize Paystack status to valid model choice
-        normalized_status = normalize_paystack_status(paystack_status)
-        print(f"[SYNC] Normalized status from '{paystack_status}' to '{normalized_status}' for {email}")
-        local_sub, _ = UserSubscription.objects.update_or_create(
-            user=user,
-            paystack_subscription_code=chosen_sub.get("subscription_code"),
-            defaults={
-                "plan": plan,
-                "paystack_customer_code": chosen_sub.get("customer", {}).get("customer_code"),
-                "status": normalized_status,
-                "next_billing_date": chosen_sub.get("next_payment_date"),
-                "authorization_code": chosen_sub.get("authorization", {}).get("authorization_code"),
-                "email_token": chosen_sub.get("email_token"),
-                "updated_at": timezone.now(),
-            }
-        )
+def _report_sync_progress(task, phase, progress):
+    if task.request.id and not task.request.called_directly:
+        task.update_state(state='PROGRESS', meta={"phase": phase, **progress})
 
-        # add *all* subs to history
-        for s in subs:
-            plan_code = s.get("plan", {}).get("plan_code")
-            plan = SubscriptionPlan.objects.filter(paystack_plan_code=plan_code).first() if plan_code else None
 
-            UserSubscriptionHistory.objects.create(
-                user=user,
-                plan=plan,
-                paystack_subscription_code=s.get("subscription_code"),
-                status=s.get("status"),
-                next_billing_date=s.get("next_payment_date"),
-                authorization_code=s.get("authorization", {}).get("authorization_code"),
-                email_token=s.get("email_token"),
-            )
+def _run_subscription_sync(task, per_page, max_pages, restart, full):
+    created_subscriptions = []
 
-        results.append({
-            "user": user.email,
-            "chosen_status": local_sub.status,
-            "total_subs": len(subs),
-        })
+    sync_totals = sync_all_subscriptions(
+        per_page=per_page, max_pages=max_pages, restart=restart, full=full,
+        on_page=lambda totals: _report_sync_progress(task, 'pages', totals),
+    )
+    logger.info(f"Paystack subscription pages processed: {sync_totals}")
+    _report_sync_progress(task, 'creating', {**sync_totals, "created": 0, "failed": 0})
 
     # NOW: Find local subscriptions WITHOUT Paystack subscription codes and create them
     print(f"[SYNC] Checking for local subscriptions without Paystack subscription codes...")
@@ -203,22 +172,16 @@ def sync_subscriptions_from_paystack():
         print(f"[SYNC] Creating Paystack subscription for {local_sub.user.email}...")
         try:
             # Create subscription on Paystack
-            create_payload = {
-                "customer": local_sub.paystack_customer_code,
-                "plan": local_sub.plan.paystack_plan_code,
-                "authorization": local_sub.authorization_code
-            }
-
-            create_resp = requests.post(
-                f"{PAYSTACK_BASE_URL}/subscription",
-                json=create_payload,
-                headers=headers
+            create_resp = get_paystack_client().create_subscription(
+                customer=local_sub.paystack_customer_code,
+                plan=local_sub.plan.paystack_plan_code,
+                authorization=local_sub.authorization_code
             )
 
-            print(f"[SYNC] Paystack subscription creation response: {create_resp.status_code}")
+            print(f"[SYNC] Paystack subscription creation response: {create_resp.get('status')}")
 
-            if create_resp.status_code in [200, 201]:
-                sub_data = create_resp.json().get('data', {})
+            if create_resp.get('status'):
+                sub_data = create_resp.get('data', {})
                 subscription_code = sub_data.get('subscription_code')
                 email_token = sub_data.get('email_token', '')
 
@@ -236,11 +199,11 @@ def sync_subscriptions_from_paystack():
 
                 print(f"[SYNC] SUCCESS - Created subscription {subscription_code} for {local_sub.user.email}")
             else:
-                print(f"[SYNC] FAILED to create subscription for {local_sub.user.email}: {create_resp.text}")
+                print(f"[SYNC] FAILED to create subscription for {local_sub.user.email}: {create_resp.get('message')}")
                 created_subscriptions.append({
                     "user": local_sub.user.email,
                     "status": "failed",
-                    "error": create_resp.text
+                    "error": create_resp.get('message', '')
                 })
         except Exception as e:
             print(f"[SYNC] ERROR creating subscription for {local_sub.user.email}: {str(e)}")
@@ -250,11 +213,19 @@ def sync_subscriptions_from_paystack():
                 "error": str(e)
             })
 
+        _report_sync_progress(task, 'creating', {
+            **sync_totals,
+            "created": len([s for s in created_subscriptions if s.get('status') == 'created']),
+            "failed": len([s for s in created_subscriptions if s.get('status') in ['failed', 'error']]),
+        })
+
     return {
-        "synced_from_paystack": results,
+        "synced_from_paystack": sync_totals,
         "created_on_paystack": created_subscriptions,
         "summary": {
-            "synced_count": len(results),
+            "synced_count": sync_totals["synced"],
+            "skipped_count": sync_totals["skipped"],
+            "completed": sync_totals["completed"],
             "created_count": len([s for s in created_subscriptions if s.get('status') == 'created']),
             "failed_count": len([s for s in created_subscriptions if s.get('status') in ['failed', 'error']])
         }
@@ -263,9 +234,10 @@ def sync_subscriptions_from_paystack():
 
 
 @shared_task(bind=True, max_retries=3)
-def send_due_payment_notification(self, payment_id):
+def send_due_payment_notification(self, payment_id, admin_ids=None, channels=None):
     """
     Send email and SMS notifications to estate admins when a resident submits payment evidence.
+    admin_ids and channels restrict delivery when called as a push fallback.
     """
     try:
         from estates.models import DuePayment
@@ -284,6 +256,10 @@ def send_due_payment_notification(self, payment_id):
             role='admin',
             is_active=True
         )
+        if admin_ids is not None:
+            estate_admins = estate_admins.filter(id__in=admin_ids)
+        if channels is None:
+            channels = ['email', 'sms']
 
         if not estate_admins.exists():
             logger.warning(f"No active admins found for estate {payment.due.estate.name}")
@@ -304,28 +280,37 @@ def send_due_payment_notification(self, payment_id):
         success_count = 0
         failed_notifications = []
 
-        for admin in estate_admins:
-            try:
-                # Send email notification
-                email_sent = send_email_notification(admin, context)
-                
-                # Send SMS notification if phone number exists
-                sms_sent = True
-                if hasattr(admin, 'phone_number') and admin.phone_number:
-                    sms_sent = send_sms_notification(admin, context)
-                
-                if email_sent:
-                    success_count += 1
-                    logger.info(f"Notification sent successfully to admin {admin.email}")
-                else:
+        if 'email' in channels:
+            for admin in estate_admins:
+                try:
+                    # Send email notification
+                    email_sent = send_email_notification(admin, context)
+
+                    if email_sent:
+                        success_count += 1
+                        logger.info(f"Notification sent successfully to admin {admin.email}")
+                    else:
+                        failed_notifications.append(admin.email)
+
+                except Exception as e:
+                    logger.error(f"Failed to send notification to admin {admin.email}: {str(e)}")
                     failed_notifications.append(admin.email)
-                    
-            except Exception as e:
-                logger.error(f"Failed to send notification to admin {admin.email}: {str(e)}")
-                failed_notifications.append(admin.email)
 
-        # Log results
-        result_message = f"Notifications sent to {success_count}/{estate_admins.count()} admins"
+        # Send SMS to every admin with a phone number in one concurrent fan-out
+        admin_phones = [admin.phone_number for admin in estate_admins if admin.phone_number]
+        sms_result = None
+        if admin_phones and 'sms' in channels:
+            sms_result = send_sms_notifications(admin_phones, context)
+            if sms_result:
+                failed_notifications.extend(sms_result['failed'])
+
+        # Log results, per channel
+        sent = []
+        if 'email' in channels:
+            sent.append(f"email to {success_count}/{estate_admins.count()} admins")
+        if sms_result:
+            sent.append(f"SMS to {len(sms_result['sent'])}/{sms_result['total']} numbers")
+        result_message = f"Notifications sent: {', '.join(sent)}" if sent else "No notifications sent"
         if failed_notifications:
             result_message += f". Failed: {', '.join(failed_notifications)}"
             
@@ -374,38 +359,22 @@ def send_email_notification(admin, context):
         return False
 
 
-def send_sms_notification(admin, context):
-    """Send SMS notification to admin."""
+def build_payment_sms_body(context):
+    """Build the SMS text for a payment submission notification."""
+    return (
+        f"New payment submitted by {context['resident_name']} "
+        f"for {context['due_title']} (₦{context['amount']}). "
+        f"Estate: {context['estate_name']}. Please review in admin portal."
+    )
+
+
+def send_sms_notifications(phone_numbers, context):
+    """Send the payment SMS notification to several admins concurrently."""
     if not TWILIO_AVAILABLE:
         logger.warning("SMS notification skipped - Twilio not available")
-        return True  # Don't fail the task if SMS is not configured
-        
-    try:
-        # Configure Twilio client
-        client = Client(
-            settings.TWILIO_ACCOUNT_SID, 
-            settings.TWILIO_AUTH_TOKEN
-        )
-        
-        # Create SMS message
-        message_body = (
-            f"New payment submitted by {context['resident_name']} "
-            f"for {context['due_title']} (₦{context['amount']}). "
-            f"Estate: {context['estate_name']}. Please review in admin portal."
-        )
-        
-        message = client.messages.create(
-            body=message_body,
-            from_=settings.TWILIO_PHONE_NUMBER,
-            to=admin.phone_number
-        )
-        
-        logger.info(f"SMS sent to {admin.phone_number}, SID: {message.sid}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"SMS sending failed for {admin.phone_number}: {str(e)}")
-        return False
+        return None
+
+    return send_bulk_sms(phone_numbers, build_payment_sms_body(context))
 
 
 #tasks for sending Alert
@@ -452,40 +421,349 @@ def send_email_alert(self, recipient_email, alert_id):
             return f"Failed to send email alert to {recipient_email} after retries"
 
 
+def build_alert_sms_body(alert):
+    """Build the SMS text for an estate alert."""
+    return (
+        f"[{alert.estate.name}] ALERT\n"
+        f"From: {alert.sender.first_name} {alert.sender.last_name} ({alert.sender.role})\n"
+        f"{alert.alert_type}: {alert.other_reason}"
+    )
+
+
 @shared_task(bind=True, max_retries=3)
-def send_sms_alert(self, recipient_phone, alert_id):
+def send_sms_alert_batch(self, recipient_phones, alert_id):
     """
-    Send an estate alert to a recipient by SMS.
+    Send an estate alert by SMS to many recipients in one concurrent fan-out.
+    Duplicate numbers are only messaged once; only failed numbers are retried.
     """
-    from estates.models import Alert  
+    from estates.models import Alert
     if not TWILIO_AVAILABLE:
         logger.warning("SMS alert skipped - Twilio not installed")
-        return f"Skipped SMS to {recipient_phone}"
+        return f"Skipped SMS to {len(recipient_phones)} recipients"
 
     try:
-        alert = Alert.objects.get(id=alert_id)
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+        alert = Alert.objects.select_related('estate', 'sender').get(id=alert_id)
+    except Alert.DoesNotExist:
+        logger.error(f"Alert with ID {alert_id} not found for SMS")
+        return f"Alert {alert_id} not found"
+
+    result = send_bulk_sms(recipient_phones, build_alert_sms_body(alert))
+    logger.info(f"Alert {alert_id} SMS sent to {len(result['sent'])}/{result['total']} recipients")
+
+    if result['failed']:
+        try:
+            self.retry(
+                args=[list(result['failed'].keys()), alert_id],
+                countdown=60 * (2 ** self.request.retries)
+            )
+        except self.MaxRetriesExceededError:
+            return f"Failed to send SMS alert to {len(result['failed'])} recipients after retries"
+
+    return f"Alert SMS sent to {len(result['sent'])}/{result['total']} recipients"
+
 
-        message_body = (
-            f"[{alert.estate.name}] ALERT\n"
-            f"From: {alert.sender.first_name} {alert.sender.last_name} ({alert.sender.role})\n"
-            f"{alert.alert_type}: {alert.other_reason}"
+#push-first delivery fallback
+@shared_task
+def escalate_notification(notification_type, related_model, related_object_id, user_ids):
+    """
+    Escalate a push notification to SMS/email for recipients who did not get
+    a successful push, following the notification type's delivery policy.
+    """
+    from estates.utils.delivery import get_delivery_policy, users_needing_fallback
+
+    policy = get_delivery_policy(notification_type)
+    pending_ids = users_needing_fallback(user_ids, related_model, related_object_id)
+
+    if not pending_ids:
+        return f"No fallback needed for {related_model} {related_object_id}"
+
+    channels = policy['fallback_channels']
+
+    if notification_type == 'alert':
+        recipients = User.objects.filter(id__in=pending_ids).only('email', 'phone_number')
+        if 'email' in channels:
+            for recipient in recipients:
+                if recipient.email:
+                    send_email_alert.delay(recipient.email, related_object_id)
+        if 'sms' in channels:
+            phones = [r.phone_number for r in recipients if r.phone_number]
+            if phones:
+                send_sms_alert_batch.delay(phones, related_object_id)
+
+    elif notification_type == 'payment':
+        send_due_payment_notification.delay(
+            related_object_id, admin_ids=pending_ids, channels=channels
         )
 
-        message = client.messages.create(
-            body=message_body,
-            from_=settings.TWILIO_PHONE_NUMBER,
-            to=recipient_phone
+    else:
+        logger.warning(f"No fallback handler for notification type '{notification_type}'")
+        return f"No fallback handler for {notification_type}"
+
+    logger.info(f"Escalated {notification_type} {related_object_id} to {channels} for {len(pending_ids)} recipients")
+    return f"Escalated {len(pending_ids)}/{len(user_ids)} recipients to {', '.join(channels)}"
+
+
+def _pending_webhook_events(customer_key, max_attempts):
+    from .models import WebhookEvent
+    return WebhookEvent.objects.filter(
+        models.Q(status='pending') | models.Q(status='failed', attempts__lt=max_attempts),
+        customer_key=customer_key,
+    ).order_by('id')
+
+
+def _claim_webhook_events(customer_key, max_attempts):
+    """
+    Lock a customer's pending events for this worker until its transaction ends.
+
+    Rows another worker has locked are skipped, so if the oldest pending event
+    isn't among the ones locked here, that worker owns the customer's stream.
+
+    Returns:
+        list: The locked events oldest first, or None if another worker has them
+    """
+    pending = _pending_webhook_events(customer_key, max_attempts)
+    events = list(pending.select_for_update(skip_locked=True))
+    head = pending.values_list('id', flat=True).first()
+    if head is not None and (not events or events[0].id != head):
+        return None
+    return events
+
+
+def _drain_webhook_events(events, max_attempts):
+    """
+    Apply claimed events oldest first.
+
+    Returns:
+        WebhookEvent: the event that failed and should be retried, or None
+    """
+    from .models import WebhookEvent
+    from .webhooks import handle_paystack_event
+
+    for event in events:
+        try:
+            with transaction.atomic():
+                outcome = handle_paystack_event(event.event, (event.payload or {}).get('data') or {})
+                WebhookEvent.objects.filter(pk=event.pk).update(
+                    status=outcome,
+                    attempts=event.attempts + 1,
+                    last_error='',
+                    processed_at=timezone.now(),
+                )
+        except Exception as e:
+            event.attempts += 1
+            WebhookEvent.objects.filter(pk=event.pk).update(
+                status='failed', attempts=event.attempts, last_error=str(e)
+            )
+            logger.exception(f"Webhook event {event.id} ({event.event}) failed on attempt {event.attempts}")
+            if event.attempts < max_attempts:
+                # Later events for this customer wait until this one goes through
+                return event
+    return None
+
+
+@shared_task(bind=True, max_retries=None)
+def process_webhook_events(self, customer_key):
+    """
+    Apply a customer's stored Paystack events in arrival order.
+    Only one worker handles a customer at a time (its events are row-locked
+    while it works through them); a failing event holds back the events
+    after it until it succeeds or runs out of attempts.
+    """
+    max_attempts = getattr(settings, 'WEBHOOK_MAX_ATTEMPTS', 5)
+
+    while True:
+        with transaction.atomic():
+            events = _claim_webhook_events(customer_key, max_attempts)
+            if events is None:
+                # The worker holding them re-checks for new events once it commits
+                return f"Events for {customer_key} are already being processed"
+            failed = _drain_webhook_events(events, max_attempts)
+
+        if failed is not None:
+            raise self.retry(countdown=min(300, 5 * 2 ** failed.attempts))
+        if not _pending_webhook_events(customer_key, max_attempts).exists():
+            return f"Processed webhook events for {customer_key}"
+
+
+@shared_task
+def requeue_pending_webhook_events(min_age=60):
+    """Re-dispatch customers whose stored events were never picked up, e.g. after a broker outage."""
+    from .models import WebhookEvent
+
+    max_attempts = getattr(settings, 'WEBHOOK_MAX_ATTEMPTS', 5)
+    customer_keys = WebhookEvent.objects.filter(
+        models.Q(status='pending') | models.Q(status='failed', attempts__lt=max_attempts),
+        received_at__lt=timezone.now() - timezone.timedelta(seconds=min_age),
+    ).values_list('customer_key', flat=True).distinct()
+
+    count = 0
+    for customer_key in customer_keys:
+        process_webhook_events.delay(customer_key)
+        count += 1
+    return f"Re-queued webhook events for {count} customers"
+
+
+EXPIRY_NOTICES = {
+    'past_due': (
+        "Subscription payment overdue",
+        "Your subscription renewal hasn't gone through. Please update your payment method to keep access.",
+    ),
+    'cancelled': (
+        "Subscription cancelled",
+        "Your subscription has been cancelled after an unpaid renewal. Renew any time to restore access.",
+    ),
+}
+
+
+def _transition_subscriptions(from_status, to_status, billed_before, now):
+    """
+    Move matching subscriptions to a new status in one bulk UPDATE.
+
+    Returns:
+        list: user ids whose subscription changed
+    """
+    with transaction.atomic():
+        rows = list(
+            UserSubscription.objects.select_for_update()
+            .filter(status=from_status, next_billing_date__lt=billed_before)
+            .values_list('pk', 'user_id')
         )
-        logger.info(f"SMS alert sent to {recipient_phone}, SID: {message.sid}")
-        return f"Alert SMS sent to {recipient_phone}"
+        if rows:
+            UserSubscription.objects.filter(pk__in=[pk for pk, _ in rows]).update(
+                status=to_status, updated_at=now
+            )
+    return [user_id for _, user_id in rows]
 
-    except Alert.DoesNotExist:
-        logger.error(f"Alert with ID {alert_id} not found for SMS")
-        return f"Alert {alert_id} not found"
+
+@shared_task
+def expire_subscriptions():
+    """
+    Nightly sweep that moves lapsed subscriptions on from 'active'.
+
+    Active subscriptions unpaid past the 1-day grace period become past_due,
+    and past_due ones SUBSCRIPTION_CANCEL_AFTER_DAYS past their billing date
+    become cancelled. Cancellations run first so a subscription moves at most
+    one step per night and each affected user gets a single notice.
+    """
+    from .entitlements import invalidate_entitlements
+
+    now = timezone.now()
+    cancel_after = getattr(settings, 'SUBSCRIPTION_CANCEL_AFTER_DAYS', 14)
+
+    cancelled = _transition_subscriptions(
+        'past_due', 'cancelled', now - timezone.timedelta(days=cancel_after), now
+    )
+    past_due = _transition_subscriptions(
+        'active', 'past_due', now - timezone.timedelta(days=1), now
+    )
+
+    # The UPDATEs skip the post_save receiver that drops cached entitlements
+    invalidate_entitlements(cancelled + past_due)
+    if cancelled:
+        notify_subscription_expiry.delay(cancelled, 'cancelled')
+    if past_due:
+        notify_subscription_expiry.delay(past_due, 'past_due')
+
+    return f"Expired subscriptions: {len(past_due)} past due, {len(cancelled)} cancelled"
+
+
+@shared_task
+def notify_subscription_expiry(user_ids, new_status):
+    """Send each user one notice that their subscription moved to new_status."""
+    from .utils.push_notification import send_push_notification
+
+    title, message = EXPIRY_NOTICES[new_status]
+    sent = 0
+    for user in User.objects.filter(id__in=user_ids).iterator():
+        try:
+            send_push_notification(
+                user=user,
+                title=title,
+                message=message,
+                notification_type='payment',
+                action_url='/subscription'
+            )
+            sent += 1
+        except Exception as e:
+            logger.error(f"Failed to send subscription notice to {user.email}: {str(e)}")
+    return f"Sent {sent} {new_status} subscription notices"
+
+
+@shared_task
+def generate_report(job_pk):
+    """Render a queued ReportJob; see reports.request_report."""
+    from .models import ReportJob
+    from .reports import run_report_job
+
+    job = ReportJob.objects.select_related('estate').filter(pk=job_pk, status='pending').first()
+    if not job:
+        return f"Report job {job_pk} is not pending"
+    run_report_job(job)
+    return f"Rendered {job.report} report with {job.row_count} rows"
+
+
+
+@shared_task(bind=True, max_retries=3)
+def generate_receipt(self, payment_id):
+    """
+    Render and upload the receipt PDF for an approved payment.
+
+    Queued by approve_payment_view once the approval commits. Retries with
+    exponential backoff; after the last attempt the payment's receipt_status
+    is set to 'failed' with the error, so admins can see it and queue it again
+    (retry_receipt_view).
+    """
+    from .models import DuePayment
+    from .receipts import store_payment_receipt
+
+    payment = DuePayment.objects.select_related(
+        'due', 'due__estate', 'resident', 'approved_by'
+    ).filter(pk=payment_id, status='approved').first()
+    if not payment:
+        return f"Payment {payment_id} is not approved"
+
+    try:
+        name = store_payment_receipt(payment)
     except Exception as e:
-        logger.error(f"SMS alert sending failed for {recipient_phone}: {str(e)}")
+        logger.error(f"Error generating receipt for payment {payment_id}: {str(e)}")
         try:
-            self.retry(countdown=60 * (2 ** self.request.retries))
+            raise self.retry(countdown=30 * (2 ** self.request.retries))
         except self.MaxRetriesExceededError:
-            return f"Failed to send SMS alert to {recipient_phone} after retries"
+            DuePayment.objects.filter(pk=payment_id).update(receipt_status='failed', receipt_error=str(e))
+            return f"Failed to generate receipt for payment {payment_id}: {str(e)}"
+    return f"Stored receipt {name}"
+
+
+@shared_task
+def cleanup_report_jobs(batch_size=500):
+    """
+    Fail report jobs that stalled and delete jobs, with their files, once
+    they're older than REPORT_RETENTION.
+    """
+    from .models import ReportJob
+    from .reports import expire_stalled_jobs
+
+    stalled = expire_stalled_jobs()
+    cutoff = timezone.now() - timezone.timedelta(seconds=getattr(settings, 'REPORT_RETENTION', 24 * 60 * 60))
+    deleted = 0
+    last_pk = 0
+
+    while True:
+        jobs = list(ReportJob.objects.filter(created_at__lt=cutoff, pk__gt=last_pk).order_by('pk')[:batch_size])
+        if not jobs:
+            break
+        removable = []
+        for job in jobs:
+            try:
+                if job.file:
+                    job.file.delete(save=False)
+                removable.append(job.pk)
+            except Exception as e:
+                # Keep the row so the next run tries the file again
+                logger.error(f"Failed to delete report file {job.file.name}: {str(e)}")
+        deleted += ReportJob.objects.filter(pk__in=removable).delete()[0]
+        last_pk = jobs[-1].pk
+        if len(jobs) < batch_size:
+            break
+
+    return f"Deleted {deleted} report jobs, failed {stalled} stalled ones"
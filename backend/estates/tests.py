@@ -91,3 +91,1655 @@ class VisitorCodeModelTest(TestCase):
         )
         expected_str = f"Visitor Code {visitor.code} for {visitor.visitor_name} by {self.user.email}"
         self.assertEqual(str(visitor), expected_str)
+
+
+class _TwilioStandIn:
+    """Minimal local stand-in for the Twilio Messages API."""
+
+    def __init__(self, delay=0):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs
+
+        stand_in = self
+        self.delay = delay
+        self.messages = []
+        self.connections = set()
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                import json, time
+                length = int(self.headers.get('Content-Length', 0))
+                form = parse_qs(self.rfile.read(length).decode())
+                if stand_in.delay:
+                    time.sleep(stand_in.delay)
+                with stand_in._lock:
+                    stand_in.messages.append(form['To'][0])
+                    stand_in.connections.add(self.client_address)
+                    sid = f"SM{len(stand_in.messages):032d}"
+                body = json.dumps({'sid': sid, 'to': form['To'][0], 'status': 'queued'}).encode()
+                self.send_response(201)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class BulkSMSTest(TestCase):
+
+    def setUp(self):
+        from .utils.sms import reset_twilio_client
+        reset_twilio_client()
+        self.addCleanup(reset_twilio_client)
+
+    def _settings(self, stand_in, **extra):
+        from django.test import override_settings
+        return override_settings(
+            TWILIO_ACCOUNT_SID='AC' + '0' * 32,
+            TWILIO_AUTH_TOKEN='token',
+            TWILIO_PHONE_NUMBER='+15005550006',
+            TWILIO_API_BASE_URL=stand_in.base_url,
+            **extra
+        )
+
+    def test_phone_numbers_are_deduplicated(self):
+        from .utils.sms import dedupe_phone_numbers
+        numbers = ['08031234567', '+2348031234567', '0803 123 4567', '', None, '08099999999']
+        self.assertEqual(dedupe_phone_numbers(numbers), ['08031234567', '08099999999'])
+
+    def test_bulk_sms_sends_once_per_unique_number(self):
+        from .utils.sms import send_bulk_sms
+        with _TwilioStandIn() as stand_in, self._settings(stand_in):
+            result = send_bulk_sms(['08031234567', '+2348031234567', '08099999999'], 'Fire at gate 2')
+
+        self.assertEqual(result['total'], 2)
+        self.assertEqual(len(result['sent']), 2)
+        self.assertEqual(result['failed'], {})
+        self.assertEqual(sorted(stand_in.messages), ['08031234567', '08099999999'])
+
+    def test_bulk_sms_runs_concurrently_on_shared_client(self):
+        import time
+        from .utils.sms import send_bulk_sms, get_twilio_client
+        numbers = [f"0803000{i:04d}" for i in range(20)]
+
+        with _TwilioStandIn(delay=0.2) as stand_in, self._settings(stand_in, SMS_MAX_CONCURRENCY=10):
+            client = get_twilio_client()
+            started = time.monotonic()
+            result = send_bulk_sms(numbers, 'Intruder alert')
+            elapsed = time.monotonic() - started
+            self.assertIs(get_twilio_client(), client)
+
+        self.assertEqual(len(result['sent']), 20)
+        # 20 sends at 0.2s each would take 4s serially; 10-way concurrency needs ~0.4s
+        self.assertLess(elapsed, 2.0)
+        # Connections are reused from the pool rather than opened per message
+        self.assertLessEqual(len(stand_in.connections), 10)
+
+    def test_failed_numbers_are_reported_without_stopping_fan_out(self):
+        from .utils.sms import send_bulk_sms
+        with _TwilioStandIn() as stand_in, self._settings(stand_in):
+            stand_in.server.server_close()
+            result = send_bulk_sms(['08031234567'], 'Water leakage')
+
+        self.assertEqual(result['sent'], {})
+        self.assertIn('08031234567', result['failed'])
+
+
+class QueueLatencyMetricsTest(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_publish_stamps_enqueue_time(self):
+        from .task_metrics import stamp_enqueue_time, ENQUEUED_AT_HEADER
+        headers = {}
+        stamp_enqueue_time(headers=headers)
+        self.assertIn(ENQUEUED_AT_HEADER, headers)
+
+    def test_prerun_records_wait_per_queue(self):
+        import time
+        from types import SimpleNamespace
+        from .task_metrics import record_task_queue_wait, get_queue_latency_metrics
+
+        for wait in (0.5, 1.5):
+            task = SimpleNamespace(
+                name='estates.tasks.send_sms_alert_batch',
+                request=SimpleNamespace(
+                    enqueued_at=time.time() - wait,
+                    delivery_info={'routing_key': 'alerts'},
+                ),
+            )
+            record_task_queue_wait(task=task)
+
+        metrics = get_queue_latency_metrics()['alerts']
+        self.assertEqual(metrics['count'], 2)
+        self.assertAlmostEqual(metrics['avg_wait_ms'], 1000, delta=100)
+        self.assertGreaterEqual(metrics['max_wait_ms'], 1500)
+
+    def test_task_timing_failures_and_retries(self):
+        from types import SimpleNamespace
+        from .task_metrics import (
+            record_task_queue_wait, record_task_run_time, count_task_failure,
+            count_task_retry, get_task_metrics
+        )
+
+        name = 'estates.tasks.send_due_payment_notification'
+        for task_id, state in (('t1', 'SUCCESS'), ('t2', 'FAILURE')):
+            task = SimpleNamespace(name=name, request=SimpleNamespace())
+            record_task_queue_wait(task_id=task_id, task=task)
+            record_task_run_time(task_id=task_id, task=task, state=state)
+        count_task_failure(sender=SimpleNamespace(name=name))
+        count_task_retry(sender=SimpleNamespace(name=name))
+
+        metrics = get_task_metrics()[name]
+        self.assertEqual(metrics['count'], 2)
+        self.assertEqual(metrics['successes'], 1)
+        self.assertEqual(metrics['failures'], 1)
+        self.assertEqual(metrics['retries'], 1)
+
+    def test_metrics_endpoint_is_staff_only(self):
+        from rest_framework.test import APIClient
+        user = User.objects.create_user(email='ops@example.com', password='password123', phone_number='08077770000')
+        client = APIClient()
+        client.force_authenticate(user)
+        self.assertEqual(client.get('/api/admin/task-metrics/').status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        response = client.get('/api/admin/task-metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('tasks', response.json())
+
+
+class CleanupExpiredCodesTest(TestCase):
+
+    def setUp(self):
+        self.estate = Estate.objects.create(
+            name="Cleanup Estate", address="1 Gate Rd",
+            phone_number="08000000001", email="cleanup@estate.com"
+        )
+        self.user = User.objects.create_user(
+            email='codes@example.com', password='password123',
+            role='resident', estate=self.estate, phone_number='08012340000'
+        )
+
+    def _code(self, minutes, is_used=False):
+        return VisitorCode.objects.create(
+            resident=self.user, visitor_name='Guest', is_used=is_used,
+            expires_at=timezone.now() + timedelta(minutes=minutes)
+        )
+
+    def test_deletes_only_expired_unused_codes_in_batches(self):
+        from .tasks import cleanup_expired_codes
+        expired = [self._code(-5) for _ in range(5)]
+        used = self._code(-5, is_used=True)
+        valid = self._code(30)
+
+        result = cleanup_expired_codes(batch_size=2)
+
+        self.assertEqual(result, "Cleaned up 5 expired visitor codes")
+        self.assertFalse(VisitorCode.objects.filter(pk__in=[c.pk for c in expired]).exists())
+        self.assertTrue(VisitorCode.objects.filter(pk=used.pk).exists())
+        self.assertTrue(VisitorCode.objects.filter(pk=valid.pk).exists())
+
+    def test_stops_when_runtime_budget_is_spent(self):
+        from .tasks import cleanup_expired_codes
+        for _ in range(3):
+            self._code(-5)
+
+        self.assertEqual(cleanup_expired_codes(max_runtime=0), "Cleaned up 0 expired visitor codes")
+        self.assertEqual(VisitorCode.objects.count(), 3)
+
+
+class PushFirstDeliveryTest(TestCase):
+
+    def setUp(self):
+        from .models import Alert
+        self.estate = Estate.objects.create(
+            name="Fallback Estate", address="2 Gate Rd",
+            phone_number="08000000002", email="fallback@estate.com"
+        )
+        self.sender = User.objects.create_user(
+            email='sender@example.com', password='password123', role='admin',
+            estate=self.estate, phone_number='08011110000', is_approved=True
+        )
+        self.pushed = User.objects.create_user(
+            email='pushed@example.com', password='password123', role='resident',
+            estate=self.estate, phone_number='08011110001', is_approved=True
+        )
+        self.unreachable = User.objects.create_user(
+            email='nopush@example.com', password='password123', role='resident',
+            estate=self.estate, phone_number='08011110002', is_approved=True
+        )
+        self.alert = Alert.objects.create(sender=self.sender, estate=self.estate, alert_type='fire')
+
+    def test_sms_only_payment_fallback_reports_what_was_sent(self):
+        from decimal import Decimal
+        from unittest import mock
+        from .models import Due, DuePayment
+        from .tasks import send_due_payment_notification
+
+        due = Due.objects.create(
+            estate=self.estate, title='Levy', description='Monthly', amount=Decimal('5000'),
+            due_date=timezone.now() + timedelta(days=30), created_by=self.sender
+        )
+        payment = DuePayment.objects.create(
+            due=due, resident=self.pushed, amount_paid=Decimal('5000'),
+            payment_evidence='payment_evidence/evidence.png'
+        )
+        summary = {'sent': {'08011110000': 'SM1'}, 'failed': {}, 'total': 1}
+        with mock.patch('estates.tasks.send_sms_notifications', return_value=summary) as sms, \
+                mock.patch('estates.tasks.send_email_notification') as email:
+            result = send_due_payment_notification.apply(
+                args=[payment.id], kwargs={'admin_ids': [self.sender.id], 'channels': ['sms']}
+            ).get()
+
+        email.assert_not_called()
+        sms.assert_called_once()
+        self.assertEqual(result, 'Notifications sent: SMS to 1/1 numbers')
+
+    def test_schedule_escalates_unreachable_now_and_defers_the_rest(self):
+        from unittest import mock
+        from .models import PushSubscription
+        from .tasks import escalate_notification
+        from .utils.delivery import schedule_fallback
+
+        PushSubscription.objects.create(user=self.pushed, endpoint='https://push.example/1', auth='a', p256dh='p')
+
+        with mock.patch.object(escalate_notification, 'apply_async') as apply_async:
+            counts = schedule_fallback('alert', 'Alert', self.alert.id, [self.pushed.id, self.unreachable.id])
+
+        self.assertEqual(counts, {'immediate': 1, 'deferred': 1})
+        immediate, deferred = apply_async.call_args_list
+        self.assertEqual(immediate.kwargs['args'][-1], [self.unreachable.id])
+        self.assertNotIn('countdown', immediate.kwargs)
+        self.assertEqual(deferred.kwargs['args'][-1], [self.pushed.id])
+        self.assertEqual(deferred.kwargs['countdown'], 30)
+
+    def test_escalation_skips_recipients_with_successful_push(self):
+        from unittest import mock
+        from .models import Notification
+        from .tasks import escalate_notification, send_sms_alert_batch, send_email_alert
+
+        Notification.objects.filter(
+            recipient=self.pushed, related_model='Alert', related_object_id=self.alert.id
+        ).update(is_push_sent=True)
+
+        with mock.patch.object(send_sms_alert_batch, 'delay') as sms, \
+                mock.patch.object(send_email_alert, 'delay') as email:
+            escalate_notification('alert', 'Alert', self.alert.id, [self.pushed.id, self.unreachable.id])
+
+        sms.assert_called_once_with(['08011110002'], self.alert.id)
+        email.assert_called_once_with('nopush@example.com', self.alert.id)
+
+    def test_types_without_policy_are_push_only(self):
+        from .utils.delivery import schedule_fallback
+        self.assertEqual(
+            schedule_fallback('announcement', 'Announcement', 1, [self.pushed.id]),
+            {'immediate': 0, 'deferred': 0}
+        )
+
+
+class PaginatedSubscriptionSyncTest(TestCase):
+
+    def setUp(self):
+        from .models import SubscriptionPlan
+        SubscriptionPlan.objects.create(paystack_plan_code='PLN_basic', name='Basic', amount=100000)
+        self.emails = [f'sub{i}@example.com' for i in range(5)]
+        for email in self.emails:
+            User.objects.create_user(email=email, password='password123', phone_number=f'0809000000{email[3]}')
+
+    def _sub(self, email, code, status='active', updated='2025-01-01T00:00:00.000Z'):
+        return {
+            'subscription_code': code, 'status': status, 'email_token': 'tok',
+            'updatedAt': updated,
+            'next_payment_date': '2030-01-01T00:00:00Z',
+            'customer': {'email': email, 'customer_code': f'CUS_{code}'},
+            'plan': {'plan_code': 'PLN_basic'},
+            'authorization': {'authorization_code': 'AUTH_x'},
+        }
+
+    def _pages(self, fail_on=None):
+        pages = {
+            1: [self._sub(self.emails[0], 'SUB_0'), self._sub(self.emails[1], 'SUB_1')],
+            2: [self._sub(self.emails[2], 'SUB_2'), self._sub(self.emails[0], 'SUB_0_old', 'cancelled')],
+            3: [self._sub(self.emails[3], 'SUB_3'), self._sub(self.emails[4], 'SUB_4')],
+        }
+
+        def fetch(page, per_page):
+            from .subscription_sync import PaystackSyncError
+            if page == fail_on:
+                raise PaystackSyncError('boom')
+            return pages[page], 3
+        return fetch
+
+    def test_walks_all_pages_and_resumes_from_checkpoint(self):
+        from unittest import mock
+        from .models import PaystackSyncState, UserSubscription
+        from .subscription_sync import sync_all_subscriptions
+
+        with mock.patch('estates.subscription_sync.fetch_subscription_page', side_effect=self._pages(fail_on=2)):
+            first = sync_all_subscriptions(per_page=2)
+        self.assertFalse(first['completed'])
+        self.assertEqual(PaystackSyncState.objects.get().next_page, 2)
+
+        with mock.patch('estates.subscription_sync.fetch_subscription_page', side_effect=self._pages()) as fetch:
+            second = sync_all_subscriptions(per_page=2)
+        self.assertTrue(second['completed'])
+        self.assertEqual([c.args[0] for c in fetch.call_args_list], [2, 3])
+        self.assertEqual(UserSubscription.objects.count(), 5)
+
+        # A cancelled sub on a later page doesn't replace the active one chosen earlier
+        self.assertEqual(
+            UserSubscription.objects.get(user__email=self.emails[0]).paystack_subscription_code, 'SUB_0'
+        )
+        self.assertFalse(PaystackSyncState.objects.get().in_progress)
+
+    def test_failed_page_is_recorded_and_does_not_wedge_the_sync(self):
+        from unittest import mock
+        from .models import PaystackSyncState, UserSubscription
+        from .subscription_sync import sync_all_subscriptions
+
+        with mock.patch('estates.subscription_sync.fetch_subscription_page', side_effect=self._pages()), \
+                mock.patch('estates.subscription_sync.sync_subscription_page', side_effect=RuntimeError('bad row')):
+            failed = sync_all_subscriptions(per_page=2)
+        self.assertFalse(failed['completed'])
+        self.assertEqual(failed['error'], 'bad row')
+        state = PaystackSyncState.objects.get()
+        self.assertFalse(state.in_progress)
+        self.assertEqual(state.last_error, 'Page 1: bad row')
+
+        # The next run starts over instead of retrying the failed page for good
+        with mock.patch('estates.subscription_sync.fetch_subscription_page', side_effect=self._pages()) as fetch:
+            retried = sync_all_subscriptions(per_page=2)
+        self.assertTrue(retried['completed'])
+        self.assertEqual([c.args[0] for c in fetch.call_args_list], [1, 2, 3])
+        self.assertEqual(UserSubscription.objects.count(), 5)
+        self.assertEqual(PaystackSyncState.objects.get().last_error, '')
+
+    def test_page_writes_roll_back_with_the_checkpoint(self):
+        from unittest import mock
+        from django.db import DatabaseError
+        from .models import PaystackSyncState, UserSubscription
+        from .subscription_sync import sync_all_subscriptions
+
+        save = PaystackSyncState.save
+
+        def crash_on_checkpoint(state, *args, **kwargs):
+            if state.next_page > 1:
+                raise DatabaseError('connection lost')
+            return save(state, *args, **kwargs)
+
+        with mock.patch('estates.subscription_sync.fetch_subscription_page', side_effect=self._pages()), \
+                mock.patch.object(PaystackSyncState, 'save', autospec=True, side_effect=crash_on_checkpoint):
+            with self.assertRaises(DatabaseError):
+                sync_all_subscriptions(per_page=2)
+
+        # Neither the page nor the checkpoint was kept, so a rerun applies page 1 again
+        self.assertFalse(UserSubscription.objects.exists())
+        self.assertEqual(PaystackSyncState.objects.get().next_page, 1)
+
+    def test_incremental_run_writes_only_changed_and_stops_early(self):
+        from unittest import mock
+        from .models import PaystackSyncState, UserSubscription
+        from .subscription_sync import sync_all_subscriptions
+
+        with mock.patch('estates.subscription_sync.fetch_subscription_page', side_effect=self._pages()):
+            full = sync_all_subscriptions(per_page=2)
+        self.assertEqual(full['mode'], 'full')
+        self.assertIsNotNone(PaystackSyncState.objects.get().watermark)
+
+        pages = {
+            1: [self._sub(self.emails[1], 'SUB_1_new', updated='2025-06-01T00:00:00.000Z'),
+                self._sub(self.emails[2], 'SUB_2')],
+            2: [self._sub(self.emails[3], 'SUB_3'), self._sub(self.emails[4], 'SUB_4')],
+            3: [],
+        }
+        with mock.patch(
+            'estates.subscription_sync.fetch_subscription_page',
+            side_effect=lambda page, per_page: (pages[page], 3)
+        ) as fetch:
+            incremental = sync_all_subscriptions(per_page=2)
+
+        self.assertEqual(incremental['mode'], 'incremental')
+        self.assertEqual((incremental['synced'], incremental['unchanged']), (1, 3))
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(
+            UserSubscription.objects.get(user__email=self.emails[1]).paystack_subscription_code, 'SUB_1_new'
+        )
+
+    def test_incremental_run_keeps_an_active_sub_from_an_unapplied_page(self):
+        from unittest import mock
+        from .models import UserSubscription
+        from .subscription_sync import sync_all_subscriptions
+
+        with mock.patch('estates.subscription_sync.fetch_subscription_page', side_effect=self._pages()):
+            sync_all_subscriptions(per_page=2)
+
+        # Only the customer's old cancelled sub changed; the page holding the
+        # active one is never reached
+        pages = {
+            1: [self._sub(self.emails[0], 'SUB_0_old', 'cancelled', updated='2025-06-01T00:00:00.000Z'),
+                self._sub(self.emails[1], 'SUB_1')],
+            2: [self._sub(self.emails[0], 'SUB_0'), self._sub(self.emails[2], 'SUB_2')],
+        }
+        with mock.patch(
+            'estates.subscription_sync.fetch_subscription_page',
+            side_effect=lambda page, per_page: (pages[page], 2)
+        ) as fetch:
+            sync_all_subscriptions(per_page=2, full=False)
+
+        self.assertEqual(fetch.call_count, 2)
+        record = UserSubscription.objects.get(user__email=self.emails[0])
+        self.assertEqual((record.paystack_subscription_code, record.status), ('SUB_0', 'active'))
+
+    def test_page_query_count_does_not_grow_with_page_size(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .plan_registry import get_all_plans
+        from .subscription_sync import sync_subscription_page
+
+        small = [self._sub(self.emails[0], 'SUB_0')]
+        large = [self._sub(email, f'SUB_{i}') for i, email in enumerate(self.emails) if i]
+
+        get_all_plans()  # warm the plan registry
+        with CaptureQueriesContext(connection) as small_queries:
+            sync_subscription_page(small)
+        with CaptureQueriesContext(connection) as large_queries:
+            sync_subscription_page(large)
+
+        self.assertEqual(len(small_queries), len(large_queries))
+
+    def test_cancelled_subscription_without_next_payment_date(self):
+        from .models import UserSubscription
+        from .subscription_sync import sync_subscription_page
+
+        sync_subscription_page([self._sub(self.emails[0], 'SUB_0')])
+        billed_until = UserSubscription.objects.get(user__email=self.emails[0]).next_billing_date
+
+        cancelled = [self._sub(self.emails[0], 'SUB_0', status='cancelled'),
+                     self._sub(self.emails[1], 'SUB_1', status='cancelled')]
+        for sub in cancelled:
+            sub['next_payment_date'] = None
+        counts = sync_subscription_page(cancelled)
+
+        self.assertEqual(counts['synced'], 2)
+        existing = UserSubscription.objects.get(user__email=self.emails[0])
+        self.assertEqual((existing.status, existing.next_billing_date), ('cancelled', billed_until))
+        created = UserSubscription.objects.get(user__email=self.emails[1])
+        self.assertEqual(created.status, 'cancelled')
+        self.assertFalse(created.is_active())
+
+    def test_history_written_only_on_change(self):
+        from .models import UserSubscriptionHistory
+        from .subscription_sync import sync_subscription_page
+
+        page = [self._sub(self.emails[0], 'SUB_0')]
+        sync_subscription_page(page)
+        sync_subscription_page(page)
+        self.assertEqual(UserSubscriptionHistory.objects.count(), 1)
+
+        sync_subscription_page([self._sub(self.emails[0], 'SUB_0', status='non-renewing')])
+        self.assertEqual(UserSubscriptionHistory.objects.count(), 2)
+
+    def test_change_check_compares_against_the_newest_row(self):
+        from .models import UserSubscriptionHistory
+        from .subscription_sync import _latest_history, sync_subscription_page
+
+        page = [self._sub(self.emails[0], 'SUB_0')]
+        sync_subscription_page(page)
+        sync_subscription_page([self._sub(self.emails[0], 'SUB_0', status='non-renewing')])
+        newest = UserSubscriptionHistory.objects.order_by('-synced_at', '-id').first()
+
+        user = User.objects.get(email=self.emails[0])
+        self.assertEqual(_latest_history([user.id])[user.id]['SUB_0'].pk, newest.pk)
+
+        # Back to active differs from the newest row, even though an older row matches
+        sync_subscription_page(page)
+        self.assertEqual(UserSubscriptionHistory.objects.count(), 3)
+
+    def test_compaction_collapses_unchanged_runs(self):
+        from django.core.management import call_command
+        from io import StringIO
+        from .models import SubscriptionPlan, UserSubscriptionHistory
+
+        user = User.objects.get(email=self.emails[0])
+        plan = SubscriptionPlan.objects.get()
+        for status in ('active', 'active', 'active', 'cancelled', 'cancelled', 'active'):
+            UserSubscriptionHistory.objects.create(
+                user=user, plan=plan, paystack_subscription_code='SUB_0', status=status
+            )
+
+        call_command('compact_subscription_history', stdout=StringIO())
+
+        remaining = UserSubscriptionHistory.objects.order_by('synced_at', 'id')
+        self.assertEqual([h.status for h in remaining], ['active', 'cancelled', 'active'])
+        self.assertTrue(all(h.content_hash for h in remaining))
+
+
+class SyncJobApiTest(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.admin = User.objects.create_user(
+            email='staff@example.com', password='password123', phone_number='08066660000', is_staff=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_enqueues_once_and_reports_running_job(self):
+        from unittest import mock
+        from .tasks import sync_subscriptions_from_paystack
+
+        with mock.patch.object(sync_subscriptions_from_paystack, 'apply_async') as apply_async:
+            first = self.client.post('/api/paystack/sync-subscriptions/')
+            second = self.client.post('/api/paystack/sync-subscriptions/')
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(apply_async.call_count, 1)
+        self.assertEqual(apply_async.call_args.kwargs['task_id'], first.data['job_id'])
+        self.assertEqual(second.status_code, 409)
+        self.assertEqual(second.data['job_id'], first.data['job_id'])
+
+    def test_lock_released_between_checks(self):
+        from unittest import mock
+        from .tasks import sync_subscriptions_from_paystack
+
+        # The running job releases the lock after the first acquire fails
+        with mock.patch('estates.subscription_sync.acquire_sync_lock', side_effect=[False, True]), \
+                mock.patch('estates.subscription_sync.current_sync_job', return_value=None), \
+                mock.patch.object(sync_subscriptions_from_paystack, 'apply_async') as apply_async:
+            retried = self.client.post('/api/paystack/sync-subscriptions/')
+        self.assertEqual(retried.status_code, 202)
+        apply_async.assert_called_once()
+
+        # ...and another request takes it first
+        with mock.patch('estates.subscription_sync.acquire_sync_lock', return_value=False), \
+                mock.patch('estates.subscription_sync.current_sync_job', return_value=None):
+            lost = self.client.post('/api/paystack/sync-subscriptions/')
+        self.assertEqual(lost.status_code, 409)
+        self.assertNotIn('status_url', lost.data)
+
+    def test_requires_staff(self):
+        user = User.objects.create_user(email='res@example.com', password='password123', phone_number='08066660001')
+        client = APIClient()
+        client.force_authenticate(user)
+        self.assertEqual(client.post('/api/paystack/sync-subscriptions/').status_code, 403)
+
+    def test_task_skips_while_another_sync_holds_the_lock(self):
+        from .subscription_sync import acquire_sync_lock
+        from .tasks import sync_subscriptions_from_paystack
+
+        acquire_sync_lock('other-job')
+        result = sync_subscriptions_from_paystack.apply(task_id='new-job').get()
+        self.assertEqual(result, {'skipped': True, 'running_job_id': 'other-job'})
+
+    def test_lock_is_shared_through_the_database(self):
+        from django.core.cache import cache
+        from django.test import override_settings
+        from .subscription_sync import acquire_sync_lock, current_sync_job, release_sync_lock
+
+        self.assertTrue(acquire_sync_lock('web-job'))
+        # Another process's cache knows nothing about the lock; the row still holds it
+        cache.clear()
+        self.assertFalse(acquire_sync_lock('beat-job'))
+        self.assertEqual(current_sync_job(), 'web-job')
+
+        # The worker releasing the job frees it for everyone
+        release_sync_lock('web-job')
+        self.assertIsNone(current_sync_job())
+        self.assertTrue(acquire_sync_lock('beat-job'))
+
+        # A holder that never released is taken over once the lock goes stale
+        with override_settings(PAYSTACK_SYNC_LOCK_TIMEOUT=0):
+            self.assertIsNone(current_sync_job())
+            self.assertTrue(acquire_sync_lock('next-job'))
+
+
+class WebhookInboxTest(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import SubscriptionPlan, UserSubscription
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='payer@example.com', password='password123', phone_number='08055550000'
+        )
+        plan = SubscriptionPlan.objects.create(paystack_plan_code='PLN_hook', name='Hook', amount=100000)
+        self.sub = UserSubscription.objects.create(
+            user=self.user, plan=plan, paystack_customer_code='CUS_payer',
+            paystack_subscription_code='SUB_payer', next_billing_date=timezone.now() + timedelta(days=20)
+        )
+
+    def _post(self, event, **data):
+        import hashlib, hmac, json
+        data.setdefault('customer', {'email': self.user.email, 'customer_code': 'CUS_payer'})
+        body = json.dumps({'event': event, 'data': data}).encode()
+        signature = hmac.new(b'sk_test_hook', msg=body, digestmod=hashlib.sha512).hexdigest()
+        return self.client.post(
+            '/api/paystack/webhook/', data=body, content_type='application/json',
+            HTTP_X_PAYSTACK_SIGNATURE=signature
+        )
+
+    def test_stores_event_acks_and_dedupes_redelivery(self):
+        from unittest import mock
+        from django.test import override_settings
+        from .models import WebhookEvent
+        from .tasks import process_webhook_events
+
+        with override_settings(PAYSTACK_SECRET_KEY='sk_test_hook'), \
+                mock.patch.object(process_webhook_events, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                first = self._post('subscription.disable', subscription_code='SUB_payer')
+            second = self._post('subscription.disable', subscription_code='SUB_payer')
+
+        self.assertEqual(first.json(), {'status': 'queued'})
+        self.assertEqual(second.json(), {'status': 'duplicate'})
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        delay.assert_called_once_with('CUS_payer')
+
+        # Nothing is applied until the worker runs
+        self.sub.refresh_from_db()
+        self.assertEqual(self.sub.status, 'active')
+
+    def test_worker_applies_customer_events_in_order(self):
+        from django.test import override_settings
+        from .models import WebhookEvent
+        from .tasks import process_webhook_events
+
+        with override_settings(PAYSTACK_SECRET_KEY='sk_test_hook'):
+            self._post('subscription.disable', subscription_code='SUB_payer')
+            self._post('subscription.enable', subscription_code='SUB_payer')
+
+        process_webhook_events.apply(args=['CUS_payer'])
+
+        self.sub.refresh_from_db()
+        self.assertEqual(self.sub.status, 'active')
+        self.assertEqual(
+            list(WebhookEvent.objects.values_list('status', flat=True)), ['processed', 'processed']
+        )
+
+    def test_worker_leaves_a_customer_owned_by_another_worker_alone(self):
+        from unittest import mock
+        from django.db.models import QuerySet
+        from django.test import override_settings
+        from .models import WebhookEvent
+        from .tasks import process_webhook_events
+
+        with override_settings(PAYSTACK_SECRET_KEY='sk_test_hook'):
+            self._post('subscription.disable', subscription_code='SUB_payer')
+            self._post('subscription.enable', subscription_code='SUB_payer')
+        head = WebhookEvent.objects.order_by('id').first()
+
+        # Another worker has the oldest event locked, so SKIP LOCKED only returns the later one
+        original = QuerySet.select_for_update
+
+        def skip_head(qs, **kwargs):
+            return original(qs, **kwargs).exclude(pk=head.pk)
+
+        with mock.patch.object(QuerySet, 'select_for_update', skip_head):
+            result = process_webhook_events.apply(args=['CUS_payer']).get()
+
+        self.assertIn('already being processed', result)
+        self.assertEqual(
+            list(WebhookEvent.objects.values_list('status', flat=True)), ['pending', 'pending']
+        )
+
+    def test_rejects_bad_signature(self):
+        from .models import WebhookEvent
+        response = self.client.post(
+            '/api/paystack/webhook/', data=b'{"event": "x"}', content_type='application/json',
+            HTTP_X_PAYSTACK_SIGNATURE='nope'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+
+class _PaystackStandIn:
+    """Local stand-in for the Paystack API that replays scripted status codes."""
+
+    def __init__(self, statuses):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        stand_in = self
+        self.statuses = list(statuses)
+        self.requests = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _reply(self):
+                import json
+                length = int(self.headers.get('Content-Length', 0))
+                if length:
+                    self.rfile.read(length)
+                stand_in.requests.append((self.command, self.path))
+                code = stand_in.statuses.pop(0) if stand_in.statuses else 200
+                body = json.dumps({'status': code == 200, 'message': str(code), 'data': []}).encode()
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = _reply
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class PaystackClientTest(TestCase):
+
+    def _client(self, base_url):
+        from .paystack_client import PaystackClient
+        return PaystackClient('sk_test', base_url=base_url, timeout=5, backoff_factor=0)
+
+    def test_get_retries_server_errors(self):
+        with _PaystackStandIn([503, 502, 200]) as api:
+            resp = self._client(api.base_url).list_subscriptions(page=2, per_page=50)
+        self.assertTrue(resp['status'])
+        self.assertEqual(len(api.requests), 3)
+        self.assertIn('perPage=50', api.requests[0][1])
+
+    def test_post_only_retried_when_rate_limited(self):
+        with _PaystackStandIn([500]) as api:
+            resp = self._client(api.base_url).create_subscription('CUS_1', 'PLN_1', 'AUTH_1')
+        self.assertFalse(resp['status'])
+        self.assertEqual(len(api.requests), 1)
+
+        with _PaystackStandIn([429, 200]) as api:
+            resp = self._client(api.base_url).create_subscription('CUS_1', 'PLN_1', 'AUTH_1')
+        self.assertTrue(resp['status'])
+        self.assertEqual(len(api.requests), 2)
+
+
+class PlanRegistryTest(TestCase):
+
+    def setUp(self):
+        from .models import SubscriptionPlan
+        self.plan = SubscriptionPlan.objects.create(paystack_plan_code='PLN_cached', name='Cached', amount=5000)
+
+    def test_lookups_are_served_from_memory(self):
+        from .plan_registry import get_plan_by_code, get_plans_by_codes
+        get_plan_by_code('PLN_cached')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_plan_by_code('PLN_cached'), self.plan)
+            self.assertEqual(list(get_plans_by_codes(['PLN_cached'])), ['PLN_cached'])
+        # Unknown codes are checked against the database before being reported missing
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_plan_by_code('PLN_missing'))
+        with self.assertNumQueries(1):
+            self.assertEqual(list(get_plans_by_codes(['PLN_cached', 'PLN_missing'])), ['PLN_cached'])
+
+    def test_plan_added_by_another_process_is_found(self):
+        from .models import SubscriptionPlan
+        from .plan_registry import get_plan_by_code, get_plans_by_codes
+        get_plan_by_code('PLN_cached')
+
+        # bulk_create skips the save signal, like a plan saved where the token never arrives
+        SubscriptionPlan.objects.bulk_create([
+            SubscriptionPlan(paystack_plan_code='PLN_admin', name='Admin', amount=1),
+            SubscriptionPlan(paystack_plan_code='PLN_other', name='Other', amount=1),
+        ])
+        self.assertEqual(get_plan_by_code('PLN_admin').name, 'Admin')
+        self.assertEqual(sorted(get_plans_by_codes(['PLN_other', 'PLN_cached'])), ['PLN_cached', 'PLN_other'])
+        with self.assertNumQueries(0):
+            get_plan_by_code('PLN_other')
+
+    def test_save_and_delete_invalidate(self):
+        from .models import SubscriptionPlan
+        from .plan_registry import get_plan_by_code
+        get_plan_by_code('PLN_cached')
+
+        self.plan.name = 'Renamed'
+        self.plan.save()
+        self.assertEqual(get_plan_by_code('PLN_cached').name, 'Renamed')
+
+        new_plan = SubscriptionPlan.objects.create(paystack_plan_code='PLN_new', name='New', amount=1)
+        self.assertEqual(get_plan_by_code('PLN_new'), new_plan)
+
+        new_plan.delete()
+        self.assertIsNone(get_plan_by_code('PLN_new'))
+
+
+    def test_lookups_return_copies_in_pk_order(self):
+        from .models import SubscriptionPlan
+        from .plan_registry import get_all_plans, get_plan_by_code
+        SubscriptionPlan.objects.create(paystack_plan_code='PLN_a_second', name='Second', amount=1)
+
+        self.assertEqual([p.paystack_plan_code for p in get_all_plans()], ['PLN_cached', 'PLN_a_second'])
+        get_plan_by_code('PLN_cached').name = 'Changed by a caller'
+        self.assertEqual(get_plan_by_code('PLN_cached').name, 'Cached')
+
+
+class WebhookBenchmarkCommandTest(TestCase):
+
+    def test_replays_and_rolls_back(self):
+        from django.core.management import call_command
+        from io import StringIO
+        from .models import WebhookEvent
+
+        out = StringIO()
+        call_command('benchmark_webhooks', events=12, customers=3, duplicates=0.5, process=True, stdout=out)
+
+        self.assertIn('events/sec', out.getvalue())
+        self.assertIn('duplicate=', out.getvalue())
+        self.assertFalse(WebhookEvent.objects.exists())
+        self.assertFalse(User.objects.filter(email__startswith='webhook-bench').exists())
+
+
+class WebhookStateUpdateTest(TestCase):
+
+    def setUp(self):
+        from .models import SubscriptionPlan, UserSubscription
+        self.user = User.objects.create_user(
+            email='renewer@example.com', password='password123', phone_number='08055550100'
+        )
+        plan = SubscriptionPlan.objects.create(paystack_plan_code='PLN_renew', name='Renew', amount=100000)
+        self.sub = UserSubscription.objects.create(
+            user=self.user, plan=plan, paystack_customer_code='CUS_renewer',
+            paystack_subscription_code='SUB_renewer', status='past_due',
+            next_billing_date=timezone.now() - timedelta(days=2)
+        )
+
+    def test_renewal_is_a_lookup_and_one_update(self):
+        from .signals import _pre_save_instances
+        from .webhooks import handle_paystack_event
+
+        data = {
+            'customer': {'email': self.user.email, 'customer_code': 'CUS_renewer'},
+            'subscription_code': 'SUB_renewer',
+            'authorization': {'authorization_code': 'AUTH_renewed'},
+            'paid_at': timezone.now().isoformat(),
+        }
+        # User, subscription (joined with user and plan), UPDATE
+        with self.assertNumQueries(3):
+            self.assertEqual(handle_paystack_event('charge.success', data), 'processed')
+
+        self.sub.refresh_from_db()
+        self.assertEqual(self.sub.status, 'active')
+        self.assertEqual(self.sub.authorization_code, 'AUTH_renewed')
+        self.assertGreater(self.sub.next_billing_date, timezone.now() + timedelta(days=25))
+        self.assertNotIn(f'UserSubscription_{self.sub.pk}', _pre_save_instances)
+
+    def test_disable_keeps_access_until_billing_date(self):
+        from .webhooks import handle_paystack_event, set_user_active_state
+
+        self.sub.status = 'active'
+        self.sub.next_billing_date = timezone.now() + timedelta(days=5)
+        self.sub.save()
+
+        with self.assertNumQueries(2):
+            handle_paystack_event('subscription.disable', {
+                'subscription_code': 'SUB_renewer', 'customer': {'email': self.user.email},
+            })
+
+        self.sub.refresh_from_db()
+        self.assertEqual(self.sub.status, 'cancelled')
+        self.assertTrue(set_user_active_state(self.user))
+
+
+class EntitlementCacheTest(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import SubscriptionPlan, UserSubscription
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='gated@example.com', password='password123', phone_number='08055550200', role='resident'
+        )
+        plan = SubscriptionPlan.objects.create(paystack_plan_code='PLN_gate', name='Gate', amount=100000)
+        self.sub = UserSubscription.objects.create(
+            user=self.user, plan=plan, paystack_customer_code='CUS_gated',
+            paystack_subscription_code='SUB_gated', next_billing_date=timezone.now() + timedelta(days=10)
+        )
+
+    def _get(self, user=None):
+        from rest_framework.decorators import api_view
+        from rest_framework.response import Response
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from .decorators import subscription_required
+
+        @api_view(['GET'])
+        @subscription_required
+        def gated(request):
+            return Response({'ok': True})
+
+        request = APIRequestFactory().get('/gated/')
+        force_authenticate(request, user=user or self.user)
+        return gated(request)
+
+    def test_check_is_served_from_cache_after_first_request(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self._get().status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get().status_code, 200)
+
+    def test_webhook_and_model_updates_invalidate(self):
+        from .webhooks import update_subscription
+
+        self.assertEqual(self._get().status_code, 200)
+
+        update_subscription(self.sub, status='cancelled')
+        resp = self._get()
+        self.assertEqual(resp.status_code, 402)
+        self.assertEqual(resp.data['error'], 'Your subscription has been cancelled.')
+
+        self.sub.status = 'active'
+        self.sub.save()
+        self.assertEqual(self._get().status_code, 200)
+
+    def test_missing_subscription_is_cached(self):
+        other = User.objects.create_user(
+            email='unpaid@example.com', password='password123', phone_number='08055550201', role='resident'
+        )
+        self.assertEqual(self._get(other).data['action_required'], 'setup_subscription')
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get(other).status_code, 402)
+
+
+class SubscriptionGateMiddlewareTest(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        from rest_framework.authtoken.models import Token
+        from .models import SubscriptionPlan, UserSubscription
+        cache.clear()
+        self.estate = Estate.objects.create(
+            name="Gate Estate", address="2 Gate Rd",
+            phone_number="08000000042", email="gate@estate.com"
+        )
+        self.admin = User.objects.create_user(
+            email='gate-admin@example.com', password='password123', role='admin',
+            estate=self.estate, phone_number='08055550300', is_approved=True
+        )
+        plan = SubscriptionPlan.objects.create(paystack_plan_code='PLN_mw', name='Gate', amount=100000)
+        self.sub = UserSubscription.objects.create(
+            user=self.admin, plan=plan, paystack_customer_code='CUS_gate_admin',
+            paystack_subscription_code='SUB_gate_admin', status='cancelled',
+            next_billing_date=timezone.now() - timedelta(days=3)
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.admin).key}')
+
+    def test_token_request_to_gated_path_is_denied_before_the_view(self):
+        resp = self.client.get('/api/admin/pending-residents/')
+
+        self.assertEqual(resp.status_code, 402)
+        self.assertEqual(resp.json()['error'], 'User subscription is not active.')
+        self.assertEqual(resp.json()['status'], 'cancelled')
+
+    def test_entitlement_is_resolved_once_per_request(self):
+        from unittest import mock
+        from . import entitlements
+
+        self.sub.status = 'active'
+        self.sub.next_billing_date = timezone.now() + timedelta(days=30)
+        self.sub.save()
+
+        with mock.patch.object(entitlements, 'get_entitlement', wraps=entitlements.get_entitlement) as lookup:
+            resp = self.client.get('/api/admin/pending-residents/')
+
+        self.assertEqual(resp.status_code, 200)
+        lookup.assert_called_once()
+
+    def test_ungated_paths_and_anonymous_requests_pass_through(self):
+        self.assertNotEqual(self.client.get('/api/subscription/plans/').status_code, 402)
+        # Left to the view's own authentication, which rejects it
+        self.assertEqual(APIClient().get('/api/admin/pending-residents/').status_code, 403)
+
+
+class ResidentListQueryTest(TestCase):
+
+    def setUp(self):
+        from .models import SubscriptionPlan
+        self.estate = Estate.objects.create(
+            name="List Estate", address="3 Gate Rd",
+            phone_number="08000000043", email="list@estate.com"
+        )
+        self.admin = User.objects.create_user(
+            email='list-admin@example.com', password='password123', role='admin',
+            estate=self.estate, phone_number='08055550400', is_approved=True
+        )
+        self.plan = SubscriptionPlan.objects.create(paystack_plan_code='PLN_list', name='List', amount=100000)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _add_residents(self, count):
+        from .models import UserSubscription
+        start = User.objects.count()
+        for n in range(start, start + count):
+            resident = User.objects.create_user(
+                email=f'list-resident-{n}@example.com', password='password123', role='resident',
+                estate=self.estate, phone_number=f'0805555{n:04d}'
+            )
+            UserSubscription.objects.create(
+                user=resident, plan=self.plan, paystack_customer_code=f'CUS_list_{n}',
+                paystack_subscription_code=f'SUB_list_{n}',
+                status='active' if n % 2 else 'cancelled',
+                next_billing_date=timezone.now() + timedelta(days=10)
+            )
+
+    def _queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return len(queries), resp.json()
+
+    def test_query_count_does_not_grow_with_residents(self):
+        urls = ('/api/admin/residents/', '/api/admin/pending-residents/')
+        self._add_residents(2)
+        few = {url: self._queries(url)[0] for url in urls}
+        self._add_residents(6)
+        many = {url: self._queries(url)[0] for url in urls}
+        self.assertEqual(few, many)
+
+        _, rows = self._queries('/api/admin/pending-residents/')
+        self.assertEqual(len(rows), 8)
+        by_email = {row['email']: row for row in rows}
+        self.assertTrue(by_email['list-resident-1@example.com']['subscription_active'])
+        self.assertFalse(by_email['list-resident-2@example.com']['subscription_active'])
+        self.assertEqual(by_email['list-resident-2@example.com']['estate_name'], 'List Estate')
+
+
+class ExpireSubscriptionsTest(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import SubscriptionPlan
+        cache.clear()
+        self.plan = SubscriptionPlan.objects.create(paystack_plan_code='PLN_expire', name='Expire', amount=100000)
+
+    def _sub(self, n, status, days_from_now):
+        from .models import UserSubscription
+        user = User.objects.create_user(
+            email=f'expire-{n}@example.com', password='password123', phone_number=f'0805556{n:04d}'
+        )
+        return UserSubscription.objects.create(
+            user=user, plan=self.plan, paystack_customer_code=f'CUS_expire_{n}',
+            paystack_subscription_code=f'SUB_expire_{n}', status=status,
+            next_billing_date=timezone.now() + timedelta(days=days_from_now)
+        )
+
+    def test_moves_lapsed_subscriptions_one_step_and_notifies_once(self):
+        from unittest import mock
+        from .entitlements import get_entitlement
+        from .tasks import expire_subscriptions, notify_subscription_expiry
+
+        current = self._sub(1, 'active', 5)
+        in_grace = self._sub(2, 'active', -0.5)
+        lapsed = self._sub(3, 'active', -3)
+        long_lapsed = self._sub(4, 'active', -30)
+        overdue = self._sub(5, 'past_due', -20)
+        recent_overdue = self._sub(6, 'past_due', -3)
+
+        # Warm the entitlement cache so the sweep has to drop it
+        self.assertEqual(get_entitlement(lapsed.user).status, 'active')
+
+        with mock.patch.object(notify_subscription_expiry, 'delay') as delay:
+            expire_subscriptions()
+
+        expected = [
+            (current, 'active'), (in_grace, 'active'), (lapsed, 'past_due'),
+            (long_lapsed, 'past_due'), (overdue, 'cancelled'), (recent_overdue, 'past_due'),
+        ]
+        for sub, status in expected:
+            sub.refresh_from_db()
+            self.assertEqual(sub.status, status, sub.user.email)
+
+        self.assertEqual(get_entitlement(lapsed.user).status, 'past_due')
+        delay.assert_has_calls([
+            mock.call([overdue.user_id], 'cancelled'),
+            mock.call(mock.ANY, 'past_due'),
+        ])
+        self.assertCountEqual(delay.call_args_list[1].args[0], [lapsed.user_id, long_lapsed.user_id])
+
+    def test_notifies_each_user_once(self):
+        from .models import Notification
+        from .tasks import notify_subscription_expiry
+
+        subs = [self._sub(n, 'past_due', -3) for n in (10, 11)]
+        notify_subscription_expiry([sub.user_id for sub in subs], 'past_due')
+
+        self.assertEqual(
+            sorted(Notification.objects.values_list('recipient_id', flat=True)),
+            sorted(sub.user_id for sub in subs)
+        )
+
+
+class EstateEntitlementTest(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import EstateSubscription, SubscriptionPlan
+        cache.clear()
+        self.estate = Estate.objects.create(
+            name="Scoped Estate", address="5 Gate Rd",
+            phone_number="08000000045", email="scoped@estate.com"
+        )
+        self.plan = SubscriptionPlan.objects.create(paystack_plan_code='PLN_estate', name='Estate', amount=500000)
+        self.estate_sub = EstateSubscription.objects.create(
+            estate=self.estate, plan=self.plan, paystack_customer_code='CUS_estate',
+            paystack_subscription_code='SUB_estate', next_billing_date=timezone.now() + timedelta(days=30)
+        )
+        self.residents = [
+            User.objects.create_user(
+                email=f'scoped-{n}@example.com', password='password123', role='resident',
+                estate=self.estate, phone_number=f'0805557{n:04d}'
+            )
+            for n in range(3)
+        ]
+
+    def test_residents_share_one_estate_lookup(self):
+        from django.test import override_settings
+        from .entitlements import get_entitlement
+
+        with override_settings(SUBSCRIPTION_ENTITLEMENT_SCOPE='estate'):
+            with self.assertNumQueries(1):
+                self.assertTrue(all(get_entitlement(user).is_active() for user in self.residents))
+
+            self.estate_sub.status = 'cancelled'
+            self.estate_sub.save()
+            self.assertEqual(get_entitlement(self.residents[0]).status, 'cancelled')
+
+        # User scope ignores the estate subscription
+        self.assertIsNone(get_entitlement(self.residents[0]))
+
+    def test_falls_back_to_own_subscription_without_an_estate_subscription(self):
+        from django.test import override_settings
+        from .entitlements import get_entitlement
+        from .models import UserSubscription
+
+        resident = self.residents[0]
+        UserSubscription.objects.create(
+            user=resident, plan=self.plan, paystack_customer_code='CUS_scoped_own',
+            paystack_subscription_code='SUB_scoped_own', next_billing_date=timezone.now() + timedelta(days=5)
+        )
+        self.estate_sub.delete()
+
+        with override_settings(SUBSCRIPTION_ENTITLEMENT_SCOPE='estate'):
+            self.assertTrue(get_entitlement(resident).is_active())
+            self.assertIsNone(get_entitlement(self.residents[1]))
+
+            active = dict(User.objects.with_subscription_state().filter(
+                estate=self.estate
+            ).values_list('email', 'is_subscription_active'))
+        self.assertEqual(active, {
+            'scoped-0@example.com': True, 'scoped-1@example.com': False, 'scoped-2@example.com': False,
+        })
+
+
+class StreamingReportTest(TestCase):
+
+    def setUp(self):
+        self.estate = Estate.objects.create(
+            name="Report Estate", address="6 Gate Rd",
+            phone_number="08000000046", email="report@estate.com"
+        )
+        self.admin = User.objects.create_user(
+            email='report-admin@example.com', password='password123', role='admin',
+            estate=self.estate, phone_number='08055550600', is_approved=True
+        )
+        User.objects.bulk_create([
+            User(
+                email=f'report-resident-{n}@example.com', phone_number=f'0805558{n:04d}',
+                first_name='Resident', last_name=str(n), estate=self.estate, is_approved=True,
+                role='resident', home_address=f'{n} Report Close\nFlat {n}',
+            )
+            for n in range(120)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_residents_pdf_is_streamed_as_an_attachment(self):
+        resp = self.client.get('/api/admin/residents/pdf/')
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp['Content-Type'], 'application/pdf')
+        self.assertIn('residents_report.pdf', resp['Content-Disposition'])
+        self.assertTrue(b''.join(resp.streaming_content).startswith(b'%PDF'))
+
+    def test_rows_are_laid_out_a_page_at_a_time(self):
+        from io import BytesIO
+        from .reports import build_table_report, RESIDENT_COLUMNS, RESIDENT_COL_WIDTHS, RESIDENT_TABLE_STYLE, resident_rows
+
+        pulled = []
+
+        def rows():
+            for row in resident_rows(self.estate):
+                pulled.append(row)
+                yield row
+
+        from unittest import mock
+        from . import reports
+
+        pulled_per_table = []
+        page_table = reports._page_table
+
+        def record(*args):
+            pulled_per_table.append(len(pulled))
+            return page_table(*args)
+
+        out = BytesIO()
+        with mock.patch.object(reports, '_page_table', side_effect=record):
+            written = build_table_report(
+                out, 'Residents', RESIDENT_COLUMNS, RESIDENT_COL_WIDTHS, RESIDENT_TABLE_STYLE, rows()
+            )
+
+        # The admin is approved too
+        self.assertEqual(written, 121)
+        # One table per page, each built only once the previous page is laid out
+        pages = out.getvalue().count(b'/Type /Page\n')
+        self.assertEqual(len(pulled_per_table), pages)
+        self.assertLess(pulled_per_table[0], 121)
+
+
+    def test_taller_rows_move_to_the_next_page(self):
+        from io import BytesIO
+        from unittest import mock
+        from . import reports
+        from .reports import build_table_report, RESIDENT_COLUMNS, RESIDENT_COL_WIDTHS, RESIDENT_TABLE_STYLE, resident_rows
+
+        def render():
+            out = BytesIO()
+            written = build_table_report(
+                out, 'Residents', RESIDENT_COLUMNS, RESIDENT_COL_WIDTHS, RESIDENT_TABLE_STYLE,
+                resident_rows(self.estate)
+            )
+            return written, out.getvalue().count(b'/Type /Page\n')
+
+        single_line = render()
+        # Keep the addresses' line breaks, so those rows are two lines high
+        with mock.patch.object(reports, '_cell', side_effect=lambda v: '' if v is None else str(v)):
+            two_line = render()
+
+        self.assertEqual((single_line[0], two_line[0]), (121, 121))
+        self.assertGreater(two_line[1], single_line[1])
+
+
+class ReportJobTest(TestCase):
+
+    def setUp(self):
+        self.estate = Estate.objects.create(
+            name="Job Estate", address="7 Gate Rd",
+            phone_number="08000000047", email="jobs@estate.com"
+        )
+        self.admin = User.objects.create_user(
+            email='jobs-admin@example.com', password='password123', role='admin',
+            estate=self.estate, phone_number='08055550700', is_approved=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _request(self):
+        from unittest import mock
+        from .tasks import generate_report
+
+        with mock.patch.object(generate_report, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.post('/api/admin/reports/', {'report': 'residents'}, format='json')
+        for call in delay.call_args_list:
+            generate_report(*call.args)
+        return resp, delay
+
+    def test_renders_in_background_and_reuses_until_data_changes(self):
+        from django.test import override_settings
+
+        from django.conf import settings
+        storages = {**settings.STORAGES, 'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'}}
+
+        with override_settings(STORAGES=storages):
+            first, delay = self._request()
+            self.assertEqual(first.status_code, 202)
+            delay.assert_called_once()
+
+            status_resp = self.client.get(first.json()['status_url'])
+            self.assertEqual(status_resp.json()['status'], 'done')
+            self.assertEqual(status_resp.json()['rows'], 1)
+
+            download = self.client.get(status_resp.json()['download_url'])
+            self.assertEqual(download.status_code, 200)
+            self.assertTrue(b''.join(download.streaming_content).startswith(b'%PDF'))
+
+            # Same data: the stored report is reused, nothing is queued
+            again, delay = self._request()
+            self.assertEqual(again.status_code, 200)
+            self.assertEqual(again.json()['job_id'], first.json()['job_id'])
+            delay.assert_not_called()
+
+            User.objects.create_user(
+                email='jobs-resident@example.com', password='password123', role='resident',
+                estate=self.estate, phone_number='08055550701', is_approved=True
+            )
+            changed, delay = self._request()
+            self.assertEqual(changed.status_code, 202)
+            self.assertNotEqual(changed.json()['job_id'], first.json()['job_id'])
+            delay.assert_called_once()
+
+    def test_payment_watermark_moves_on_status_change(self):
+        from decimal import Decimal
+        from .models import Due, DuePayment
+        from .reports import report_watermark
+
+        self.estate.name = 'E' * 255
+        self.estate.save()
+        due = Due.objects.create(
+            estate=self.estate, title='Service charge', description='Monthly',
+            amount=Decimal('5000'), due_date=timezone.now() + timedelta(days=30), created_by=self.admin
+        )
+        payment = DuePayment.objects.create(
+            due=due, resident=self.admin, amount_paid=Decimal('5000'),
+            payment_evidence='payment_evidence/evidence.png'
+        )
+        before = report_watermark(self.estate, 'payments')
+        self.assertEqual(len(before), 64)
+
+        payment.status = 'rejected'
+        payment.save()
+        self.assertNotEqual(report_watermark(self.estate, 'payments'), before)
+
+    def test_jobs_are_scoped_to_the_admins_estate(self):
+        from .models import ReportJob
+
+        other = Estate.objects.create(
+            name="Other Estate", address="8 Gate Rd",
+            phone_number="08000000048", email="other@estate.com"
+        )
+        job = ReportJob.objects.create(estate=other, report='residents', watermark='x')
+
+        self.assertEqual(self.client.get(f'/api/admin/reports/{job.job_id}/').status_code, 404)
+        self.assertEqual(
+            self.client.post('/api/admin/reports/', {'report': 'visitors'}, format='json').status_code, 400
+        )
+
+    def test_stalled_jobs_are_failed_instead_of_reused(self):
+        from django.conf import settings
+        from django.test import override_settings
+        from .models import ReportJob
+        from .reports import report_watermark
+
+        stalled = ReportJob.objects.create(
+            estate=self.estate, report='residents', watermark=report_watermark(self.estate, 'residents')
+        )
+        ReportJob.objects.filter(pk=stalled.pk).update(created_at=timezone.now() - timedelta(hours=1))
+
+        storages = {**settings.STORAGES, 'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'}}
+        with override_settings(STORAGES=storages):
+            resp, delay = self._request()
+        self.assertEqual(resp.status_code, 202)
+        self.assertNotEqual(resp.json()['job_id'], str(stalled.job_id))
+        delay.assert_called_once()
+        stalled.refresh_from_db()
+        self.assertEqual(stalled.status, 'failed')
+
+    def test_cleanup_deletes_old_jobs_and_files(self):
+        from django.conf import settings
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        from django.test import override_settings
+        from .models import ReportJob
+        from .tasks import cleanup_report_jobs
+
+        storages = {**settings.STORAGES, 'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'}}
+        with override_settings(STORAGES=storages):
+            old, recent = [
+                ReportJob.objects.create(estate=self.estate, report='residents', watermark='w', status='done')
+                for _ in range(2)
+            ]
+            for job in (old, recent):
+                job.file.save(f'{job.job_id}.pdf', ContentFile(b'%PDF'), save=True)
+            ReportJob.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=2))
+
+            cleanup_report_jobs()
+
+            self.assertEqual(list(ReportJob.objects.values_list('pk', flat=True)), [recent.pk])
+            self.assertFalse(default_storage.exists(old.file.name))
+            self.assertTrue(default_storage.exists(recent.file.name))
+
+    def test_reports_require_an_active_subscription(self):
+        from rest_framework.authtoken.models import Token
+        from .models import ReportJob, UserSubscription
+
+        UserSubscription.objects.filter(user=self.admin).delete()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.admin).key}')
+
+        resp = client.post('/api/admin/reports/', {'report': 'residents'}, format='json')
+        self.assertEqual(resp.status_code, 402)
+        self.assertFalse(ReportJob.objects.exists())
+
+
+class ReceiptTaskTest(TestCase):
+
+    def setUp(self):
+        from datetime import timedelta
+        from decimal import Decimal
+        from .models import Due, DuePayment
+
+        self.estate = Estate.objects.create(
+            name="Receipt Estate", address="9 Till Rd",
+            phone_number="08000000048", email="receipts@estate.com"
+        )
+        self.admin = User.objects.create_user(
+            email='receipt-admin@example.com', password='password123', role='admin',
+            estate=self.estate, phone_number='08055550800', is_approved=True
+        )
+        self.resident = User.objects.create_user(
+            email='receipt-resident@example.com', password='password123', role='resident',
+            estate=self.estate, phone_number='08055550801', is_approved=True
+        )
+        due = Due.objects.create(
+            estate=self.estate, title='Service charge', description='Monthly',
+            amount=Decimal('5000'), due_date=timezone.now() + timedelta(days=30), created_by=self.admin
+        )
+        self.payment = DuePayment.objects.create(
+            due=due, resident=self.resident, amount_paid=Decimal('5000'),
+            payment_evidence='payment_evidence/evidence.png'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _approve(self):
+        from unittest import mock
+        from .tasks import generate_receipt, send_payment_approved_email
+
+        with mock.patch.object(generate_receipt, 'delay') as delay, \
+                mock.patch.object(send_payment_approved_email, 'delay'):
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.post(f'/api/admin/approve-payment/{self.payment.id}/', {}, format='json')
+        return resp, delay
+
+    def test_approval_queues_receipt_after_commit(self):
+        from django.conf import settings
+        from django.test import override_settings
+        from .tasks import generate_receipt
+
+        resp, delay = self._approve()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['receipt_status'], 'pending')
+        delay.assert_called_once_with(self.payment.id)
+
+        storages = {**settings.STORAGES, 'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'}}
+        with override_settings(STORAGES=storages):
+            generate_receipt(self.payment.id)
+            self.payment.refresh_from_db()
+            self.assertEqual(self.payment.receipt_status, 'ready')
+            self.assertTrue(self.payment.receipt.read().startswith(b'%PDF'))
+
+        info = self.client.get(f'/api/payments/{self.payment.id}/receipt/info/')
+        self.assertTrue(info.json()['has_receipt'])
+        self.assertEqual(info.json()['receipt_status'], 'ready')
+
+    def test_failure_is_recorded_after_last_retry(self):
+        from unittest import mock
+        from .tasks import generate_receipt
+
+        self._approve()
+        with mock.patch('estates.receipts.generate_payment_receipt', side_effect=RuntimeError('storage down')), \
+                mock.patch.object(generate_receipt, 'max_retries', 0):
+            generate_receipt.apply(args=[self.payment.id])
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.receipt_status, 'failed')
+        self.assertEqual(self.payment.receipt_error, 'storage down')
+        self.assertFalse(self.payment.receipt)
+
+    def test_admin_can_retry_a_failed_receipt(self):
+        from unittest import mock
+        from .models import DuePayment
+        from .tasks import generate_receipt
+
+        self._approve()
+        DuePayment.objects.filter(pk=self.payment.pk).update(receipt_status='failed', receipt_error='storage down')
+
+        with mock.patch.object(generate_receipt, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.post(f'/api/payments/{self.payment.id}/receipt/retry/')
+        self.assertEqual(resp.status_code, 202)
+        delay.assert_called_once_with(self.payment.id)
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.receipt_status, self.payment.receipt_error), ('pending', ''))
+
+        resident = APIClient()
+        resident.force_authenticate(self.resident)
+        self.assertEqual(resident.post(f'/api/payments/{self.payment.id}/receipt/retry/').status_code, 403)
+
+    def test_renderer_is_shared_and_reusable(self):
+        from .receipts import ReceiptRenderer, get_receipt_renderer
+
+        self.payment.status = 'approved'
+        self.payment.approved_by = self.admin
+        self.payment.approved_at = timezone.now()
+        renderer = get_receipt_renderer()
+        self.assertIs(get_receipt_renderer(), renderer)
+
+        first, second = [pdf for _, pdf in renderer.render_many([self.payment, self.payment])]
+        self.assertTrue(first.startswith(b'%PDF'))
+        self.assertEqual(len(first), len(second))
+        self.assertEqual(len(first), len(ReceiptRenderer().render(self.payment)))
+
+
+class ExportTest(TestCase):
+
+    def setUp(self):
+        from decimal import Decimal
+        from .models import Due, DuePayment, SubscriptionPlan, UserSubscription
+
+        self.estate = Estate.objects.create(
+            name="Export Estate", address="3 Ledger Rd",
+            phone_number="08000000050", email="exports@estate.com"
+        )
+        self.admin = User.objects.create_user(
+            email='export-admin@example.com', password='password123', role='admin',
+            estate=self.estate, phone_number='08055550900', is_approved=True
+        )
+        plan = SubscriptionPlan.objects.create(paystack_plan_code='PLN_export', name='Export', amount=100000)
+        UserSubscription.objects.create(
+            user=self.admin, plan=plan, paystack_customer_code='CUS_export',
+            paystack_subscription_code='SUB_export', next_billing_date=timezone.now() + timedelta(days=20)
+        )
+        resident = User.objects.create_user(
+            email='export-resident@example.com', password='password123', role='resident',
+            estate=self.estate, phone_number='+2348055550901', is_approved=True,
+            first_name='=cmd', last_name='Ade'
+        )
+        self.dues = [
+            Due.objects.create(
+                estate=self.estate, title=title, description='Levy', amount=Decimal('5000'),
+                due_date=timezone.now() + timedelta(days=30), created_by=self.admin
+            )
+            for title in ('Security', 'Waste')
+        ]
+        for due, payment_status in ((self.dues[0], 'approved'), (self.dues[0], 'pending'), (self.dues[1], 'approved')):
+            DuePayment.objects.create(
+                due=due, resident=resident, amount_paid=Decimal('5000'),
+                payment_evidence='payment_evidence/evidence.png', status=payment_status
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _csv(self, url, **params):
+        import csv
+        resp = self.client.get(url, params)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        content = b''.join(resp.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(content.splitlines()))
+
+    def test_payments_csv_is_streamed_and_filtered(self):
+        rows = self._csv('/api/payments/report/export/')
+        self.assertEqual(rows[0][0], 'Payment ID')
+        self.assertEqual(len(rows), 4)
+        # Formula-like names are escaped for spreadsheet apps
+        self.assertEqual(rows[1][1], "'=cmd Ade")
+
+        rows = self._csv('/api/payments/report/export/', due=self.dues[0].id, status='approved')
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][3], 'Security')
+
+        today = timezone.localdate().isoformat()
+        self.assertEqual(len(self._csv('/api/payments/report/export/', date_from=today, date_to=today)), 4)
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        self.assertEqual(len(self._csv('/api/payments/report/export/', date_from=tomorrow)), 1)
+
+    def test_residents_csv_keeps_phone_numbers(self):
+        rows = self._csv('/api/admin/residents/export/')
+        self.assertEqual(rows[0][0], 'Name')
+        self.assertIn('+2348055550901', [row[2] for row in rows])
+
+    def test_bad_filters_are_rejected(self):
+        for params in ({'status': 'lost'}, {'date_from': 'yesterday'}, {'due': 'x'}, {'file_format': 'pdf'}):
+            resp = self.client.get('/api/payments/report/export/', params)
+            self.assertEqual(resp.status_code, 400, params)
+
+    def test_payments_xlsx(self):
+        from io import BytesIO
+        from openpyxl import load_workbook
+
+        resp = self.client.get('/api/payments/report/export/', {'file_format': 'xlsx', 'status': 'approved'})
+        self.assertEqual(resp.status_code, 200)
+        sheet = load_workbook(BytesIO(b''.join(resp.streaming_content))).active
+        self.assertEqual(sheet.max_row, 3)
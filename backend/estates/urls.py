@@ -41,9 +41,14 @@ urlpatterns = [
     path('admin/approve-resident/<int:user_id>/', views.approve_resident_view, name='approve-resident'),
     path('admin/delete-resident/<int:user_id>/', views.delete_resident_view, name='delete-resident'),
     path('admin/residents/pdf/', views.generate_residents_pdf, name='residents-pdf'),
+    path('admin/residents/export/', views.residents_export_view, name='residents-export'),
+    path('admin/reports/', views.report_jobs_view, name='report-jobs'),
+    path('admin/reports/<uuid:job_id>/', views.report_job_status_view, name='report-job-status'),
+    path('admin/reports/<uuid:job_id>/download/', views.report_job_download_view, name='report-job-download'),
     path('admin/approve-payment/<int:payment_id>/', views.approve_payment_view, name='approve-payment'),
     path('admin/reject-payment/<int:payment_id>/', views.reject_payment_view, name='reject-payment'),
     path('admin/pending-payments/', views.pending_payments_view, name='pending-payments'),
+    path('admin/task-metrics/', views.task_metrics_view, name='task-metrics'),
     
     # Visitor Codes
     path('visitor-codes/', views.VisitorCodeListCreateView.as_view(), name='visitor-codes'),
@@ -60,6 +65,7 @@ urlpatterns = [
 
     # paymnts report view
     path('payments/report/pdf/', views.payment_records_pdf_view, name='payment-report'),
+    path('payments/report/export/', views.payment_records_export_view, name='payment-export'),
 
     #get csrf token
     path('csrf-cookie/', views.get_csrf_token),
@@ -83,6 +89,7 @@ urlpatterns = [
 
    #paystack subscription sync
     path("paystack/sync-subscriptions/", views.sync_subscriptions_view, name="sync_subscriptions"),
+    path("paystack/sync-subscriptions/<uuid:job_id>/", views.sync_subscriptions_status_view, name="sync_subscriptions_status"),
 
     #contact support views
     path("contact-support/", views.ContactSupportView.as_view(), name="contact-support"),
@@ -100,6 +107,10 @@ urlpatterns = [
          views.payment_receipt_info, 
          name='receipt-info'),
 
+    path('payments/<int:payment_id>/receipt/retry/',
+         views.retry_receipt_view,
+         name='retry-receipt'),
+
      # Artisan and Domestic Staff
     path("artisans-domestics/", views.ArtisanOrDomesticStaffListCreateView.as_view(), name="artisan_domestic_list_create"),
     path("artisans-domestics/<int:pk>/", views.ArtisanOrDomesticStaffDetailView.as_view(), name="artisan_domestic_detail"),
@@ -0,0 +1,140 @@
+# utils/delivery.py
+"""
+EstatePadi Notification Delivery Policies
+
+Web Push is the cheapest channel we have, so every notification goes out as a
+push first (see signals.py). This module decides which recipients still need
+a costlier channel (SMS/email) and when: recipients with no active push
+subscription are escalated straight away, everyone else only if no push for
+the notification was delivered to them within the policy deadline.
+"""
+
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Per notification type:
+#   fallback_channels: channels to escalate to, in order, when push didn't land
+#   deadline: seconds to wait for a successful push before escalating
+#   queue: Celery queue the escalation runs on
+DEFAULT_DELIVERY_POLICIES = {
+    'alert': {
+        'fallback_channels': ['sms', 'email'],
+        'deadline': 30,
+        'queue': 'alerts',
+    },
+    'payment': {
+        'fallback_channels': ['email', 'sms'],
+        'deadline': 300,
+        'queue': 'notifications',
+    },
+}
+
+
+def get_delivery_policy(notification_type):
+    """
+    Get the delivery policy for a notification type.
+
+    Policies from the NOTIFICATION_DELIVERY_POLICIES setting override the
+    defaults. Types without a policy are push-only.
+
+    Returns:
+        dict: fallback_channels (list), deadline (int seconds), queue (str)
+    """
+    policies = {
+        **DEFAULT_DELIVERY_POLICIES,
+        **getattr(settings, 'NOTIFICATION_DELIVERY_POLICIES', {}),
+    }
+    policy = policies.get(notification_type, {})
+    return {
+        'fallback_channels': list(policy.get('fallback_channels', [])),
+        'deadline': policy.get('deadline', 0),
+        'queue': policy.get('queue', 'notifications'),
+    }
+
+
+def split_by_push_reach(user_ids):
+    """
+    Split users into those with at least one active push subscription and
+    those push can never reach.
+
+    Returns:
+        tuple: (reachable_ids, unreachable_ids) as lists
+    """
+    from estates.models import PushSubscription
+
+    user_ids = list(dict.fromkeys(user_ids))
+    reachable = set(
+        PushSubscription.objects.filter(
+            user_id__in=user_ids,
+            is_active=True
+        ).values_list('user_id', flat=True)
+    )
+    return (
+        [uid for uid in user_ids if uid in reachable],
+        [uid for uid in user_ids if uid not in reachable],
+    )
+
+
+def users_needing_fallback(user_ids, related_model, related_object_id):
+    """
+    Get the users who have not had a successful push for a related object.
+
+    Returns:
+        list: User IDs with no push-delivered Notification for the object
+    """
+    from estates.models import Notification
+
+    user_ids = list(dict.fromkeys(user_ids))
+    pushed = set(
+        Notification.objects.filter(
+            recipient_id__in=user_ids,
+            related_model=related_model,
+            related_object_id=related_object_id,
+            is_push_sent=True
+        ).values_list('recipient_id', flat=True)
+    )
+    return [uid for uid in user_ids if uid not in pushed]
+
+
+def schedule_fallback(notification_type, related_model, related_object_id, user_ids):
+    """
+    Schedule SMS/email escalation for recipients of a push notification.
+
+    Args:
+        notification_type (str): Policy key, e.g. 'alert' or 'payment'
+        related_model (str): Model name the push notifications were tagged with
+        related_object_id (int): ID of the related object
+        user_ids: IDs of every intended recipient
+
+    Returns:
+        dict: counts of recipients escalated immediately and deferred
+    """
+    from estates.tasks import escalate_notification
+
+    policy = get_delivery_policy(notification_type)
+    if not policy['fallback_channels'] or not user_ids:
+        return {'immediate': 0, 'deferred': 0}
+
+    reachable, unreachable = split_by_push_reach(user_ids)
+    args = [notification_type, related_model, related_object_id]
+
+    if unreachable:
+        escalate_notification.apply_async(
+            args=args + [unreachable],
+            queue=policy['queue']
+        )
+    if reachable:
+        escalate_notification.apply_async(
+            args=args + [reachable],
+            countdown=policy['deadline'],
+            queue=policy['queue']
+        )
+
+    logger.info(
+        f"Scheduled {notification_type} fallback for {related_model} {related_object_id}: "
+        f"{len(unreachable)} now, {len(reachable)} after {policy['deadline']}s"
+    )
+    return {'immediate': len(unreachable), 'deferred': len(reachable)}
@@ -0,0 +1,194 @@
+# utils/sms.py
+"""
+EstatePadi SMS Utilities
+
+A single, process-wide Twilio client backed by a pooled HTTP session, plus a
+bounded concurrent sender used for alert fan-outs. Reusing one client keeps the
+TLS connections to Twilio warm, so a burst of messages does not pay a new
+handshake per recipient.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+try:
+    from twilio.rest import Client
+    from twilio.http.http_client import TwilioHttpClient
+    TWILIO_AVAILABLE = True
+except ImportError:
+    TWILIO_AVAILABLE = False
+    logging.warning("Twilio not installed. SMS notifications will be skipped.")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _build_client():
+    """Create a Twilio client whose HTTP session is shared by every send."""
+    max_workers = getattr(settings, 'SMS_MAX_CONCURRENCY', 8)
+
+    http_client = TwilioHttpClient(
+        pool_connections=True,
+        timeout=getattr(settings, 'TWILIO_HTTP_TIMEOUT', 10),
+    )
+    # Size the pool to the sender's concurrency so threads never queue for a socket
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    http_client.session.mount('https://', adapter)
+    http_client.session.mount('http://', adapter)
+
+    client = Client(
+        settings.TWILIO_ACCOUNT_SID,
+        settings.TWILIO_AUTH_TOKEN,
+        http_client=http_client,
+    )
+
+    # Lets tests and load runs point the client at a local stand-in for the API
+    base_url = getattr(settings, 'TWILIO_API_BASE_URL', '')
+    if base_url:
+        client.api.base_url = base_url.rstrip('/')
+
+    return client
+
+
+def get_twilio_client():
+    """
+    Return the shared Twilio client, creating it on first use.
+
+    Returns:
+        Client: Twilio REST client, or None if Twilio is not installed
+    """
+    global _client
+
+    if not TWILIO_AVAILABLE:
+        return None
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
+
+
+def reset_twilio_client():
+    """Drop the shared client so the next send picks up fresh settings."""
+    global _client
+    with _client_lock:
+        _client = None
+
+
+def normalize_phone_number(phone_number):
+    """
+    Build a comparison key for a phone number so the same handset written two
+    ways (e.g. '0803 123 4567' and '+2348031234567') is only messaged once.
+    """
+    if not phone_number:
+        return ''
+
+    digits = re.sub(r'\D', '', str(phone_number))
+    country_code = getattr(settings, 'SMS_DEFAULT_COUNTRY_CODE', '234')
+
+    # Local format: leading trunk 0 instead of the country code
+    if country_code and digits.startswith('0') and not digits.startswith('00'):
+        digits = country_code + digits[1:]
+    elif digits.startswith('00'):
+        digits = digits[2:]
+
+    return digits
+
+
+def dedupe_phone_numbers(phone_numbers):
+    """
+    Remove empty and duplicate phone numbers, keeping the first spelling seen.
+
+    Args:
+        phone_numbers: Iterable of phone number strings
+
+    Returns:
+        list: Unique phone numbers in their original order
+    """
+    seen = set()
+    unique = []
+    for phone_number in phone_numbers:
+        key = normalize_phone_number(phone_number)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        unique.append(phone_number)
+    return unique
+
+
+def send_sms(to, body):
+    """
+    Send a single SMS through the shared client.
+
+    Args:
+        to (str): Recipient phone number
+        body (str): Message text
+
+    Returns:
+        str: Twilio message SID
+    """
+    client = get_twilio_client()
+    message = client.messages.create(
+        body=body,
+        from_=settings.TWILIO_PHONE_NUMBER,
+        to=to
+    )
+    logger.info(f"SMS sent to {to}, SID: {message.sid}")
+    return message.sid
+
+
+def send_bulk_sms(phone_numbers, body, max_workers=None):
+    """
+    Send the same SMS to many recipients concurrently.
+
+    Phone numbers are de-duplicated first, then delivered by a bounded pool of
+    threads sharing the pooled Twilio session. One failing number never stops
+    the rest of the fan-out.
+
+    Args:
+        phone_numbers: Iterable of recipient phone numbers
+        body (str): Message text
+        max_workers (int, optional): Concurrency cap, defaults to SMS_MAX_CONCURRENCY
+
+    Returns:
+        dict: Delivery summary containing:
+            - sent (dict): phone number -> Twilio SID
+            - failed (dict): phone number -> error message
+            - total (int): Number of unique recipients attempted
+    """
+    recipients = dedupe_phone_numbers(phone_numbers)
+
+    if not recipients:
+        return {'sent': {}, 'failed': {}, 'total': 0}
+
+    if max_workers is None:
+        max_workers = getattr(settings, 'SMS_MAX_CONCURRENCY', 8)
+    max_workers = max(1, min(max_workers, len(recipients)))
+
+    def _send(phone_number):
+        try:
+            return phone_number, send_sms(phone_number, body), None
+        except Exception as e:
+            logger.error(f"SMS sending failed for {phone_number}: {str(e)}")
+            return phone_number, None, str(e)
+
+    sent = {}
+    failed = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for phone_number, sid, error in executor.map(_send, recipients):
+            if error is None:
+                sent[phone_number] = sid
+            else:
+                failed[phone_number] = error
+
+    logger.info(f"Bulk SMS delivered to {len(sent)}/{len(recipients)} recipients")
+
+    return {'sent': sent, 'failed': failed, 'total': len(recipients)}
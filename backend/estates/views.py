@@ -3,29 +3,30 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.contrib.auth import authenticate, login, logout
 from django.utils import timezone
-from django.http import HttpResponse, JsonResponse, Http404
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from django.core.files.base import ContentFile
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER
-from io import BytesIO
+from django.http import FileResponse, HttpResponse, JsonResponse, Http404
 from .models import *
 from .serializers import *
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.utils.translation import gettext as _
-from io import BytesIO
 from .permissions import IsEstateAdmin
+from .exports import (
+    EXPORT_FORMATS, PAYMENT_EXPORT_COLUMNS, RESIDENT_EXPORT_COLUMNS, export_response,
+    payment_export_filters, payment_export_rows, resident_export_filters, resident_export_rows,
+)
+from .reports import (
+    REPORT_FILENAMES, REPORT_RENDERERS, report_response, render_residents_report,
+    render_payments_report, request_report,
+)
 from postmarker.core import PostmarkClient
 from django.conf import settings
 from .tasks import *
-from .decorators import subscription_required, admin_subscription_required
+from .utils.delivery import schedule_fallback
 from django.core.cache import cache
 from estates.tasks import sync_subscriptions_from_paystack
 import json, logging, uuid
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.urls import reverse
 import mimetypes
 from rest_framework.views import APIView
 from rest_framework.exceptions import PermissionDenied
@@ -450,34 +451,32 @@ class EstateLeadershipListView(generics.ListCreateAPIView):
 # Admin Views
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
-@admin_subscription_required
 def pending_residents_view(request):
     if request.user.role != 'admin':
         return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
     
-    pending_residents = User.objects.filter(
-        estate=request.user.estate,
+    pending_residents = list(User.objects.with_subscription_state().filter(
+        estate_id=request.user.estate_id,
         role='resident',
         is_approved=False
-    )
+    ))
     
     # Optional: Only log if there are pending residents
-    if pending_residents.exists():
+    if pending_residents:
         ActivityLog.objects.create(
             user=request.user,
-            estate=request.user.estate,  
+            estate_id=request.user.estate_id,
             type=ActivityLog.ActivityType.NEW_RESIDENT,
             description=_(
-                f"Admin {request.user.first_name} viewed {pending_residents.count()} pending resident(s)."
+                f"Admin {request.user.first_name} viewed {len(pending_residents)} pending resident(s)."
             ),
-            related_id=request.user.estate.id
+            related_id=request.user.estate_id
         )
     
     serializer = UserSerializer(pending_residents, many=True)
     return Response(serializer.data)
 
 @api_view(['POST'])
-@admin_subscription_required
 def approve_resident_view(request, user_id):
     if request.user.role != 'admin':
         return Response({'error': 'Admin access required'}, 
@@ -522,73 +521,18 @@ def residents_list_view(request):
             status=status.HTTP_403_FORBIDDEN
         )
 
-    residents = User.objects.filter(
-        estate=request.user.estate,
+    residents = User.objects.with_subscription_state().filter(
+        estate_id=request.user.estate_id,
     )
     serializer = UserSerializer(residents, many=True)
     return Response(serializer.data)
 
 @api_view(['GET'])
-@admin_subscription_required
 def generate_residents_pdf(request):
     if request.user.role != 'admin':
         return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
 
-    residents = User.objects.filter(
-        estate=request.user.estate,
-        is_approved=True
-    )   
-
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-
-    styles = getSampleStyleSheet()
-
-    # Title & Generated Time
-    elements.append(Paragraph(f"<b>Residents Report - {request.user.estate.name}</b>", styles['Title']))
-    elements.append(Paragraph(f"Generated on: {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
-    elements.append(Spacer(1, 12))
-
-    # Table Headers
-    data = [
-        ["Name", "Email", "Phone", "Address", "House Type", "Type"]
-    ]
-
-    # Populate table data
-    for resident in residents:
-        data.append([
-            resident.get_full_name(),
-            resident.email,
-            resident.phone_number,
-            resident.home_address,
-            resident.house_type,
-            resident.resident_type
-        ])
-
-    # Create table
-    table = Table(data, colWidths=[100, 120, 80, 180, 60, 80])
-
-    # Style table
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-    ]))
-
-    elements.append(table)
-
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
-
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="residents_report.pdf"'
-    return response
+    return report_response(render_residents_report, request.user.estate, 'residents_report.pdf')
 
 
 class VisitorCodeListCreateView(generics.ListCreateAPIView):
@@ -705,8 +649,14 @@ class DuePaymentListCreateView(generics.ListCreateAPIView):
             related_id=payment.id
         )
 
-         # Trigger notification task asynchronously
-        send_due_payment_notification.delay(payment.id)
+        # Admins were pushed by the post_save signal; email/SMS only go to
+        # admins the push didn't reach, per the 'payment' delivery policy
+        admin_ids = User.objects.filter(
+            estate=payment.due.estate,
+            role='admin',
+            is_active=True
+        ).values_list('id', flat=True)
+        schedule_fallback('payment', 'DuePayment', payment.id, list(admin_ids))
 
 @api_view(['GET'])
 def pending_payments_view(request):
@@ -720,171 +670,6 @@ def pending_payments_view(request):
     serializer = DuePaymentSerializer(pending_payments, many=True)
     return Response(serializer.data)
 
-def generate_payment_receipt(payment):
-    """
-    Generate a PDF receipt for an approved payment
-    """
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72,
-                           topMargin=72, bottomMargin=18)
-    
-    # Container for the 'Flowable' objects
-    elements = []
-    
-    # Define styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        textColor=colors.darkblue
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=16,
-        spaceAfter=12,
-        textColor=colors.darkblue
-    )
-    
-    normal_style = styles['Normal']
-    
-    # Style for wrapping text in table cells
-    wrap_style = ParagraphStyle(
-        'WrapStyle',
-        parent=styles['Normal'],
-        fontSize=11,
-        leading=13,
-        wordWrap='LTR'
-    )
-    
-    # Header
-    title = Paragraph("PAYMENT RECEIPT", title_style)
-    elements.append(title)
-    elements.append(Spacer(1, 20))
-    
-    # Estate Information (if available)
-    if hasattr(payment, 'due') and hasattr(payment.due, 'estate'):
-        estate_info = Paragraph(f"<b>{payment.due.estate.name}</b><br/>"
-                               f"{getattr(payment.due.estate, 'address', '')}", 
-                               normal_style)
-        elements.append(estate_info)
-        elements.append(Spacer(1, 20))
-    
-    # Receipt Details Table
-    receipt_data = [
-        ['Receipt Number:', f'RCP-{payment.id}-{payment.approved_at.strftime("%Y%m%d")}'],
-        ['Date Issued:', payment.approved_at.strftime("%B %d, %Y at %I:%M %p")],
-        ['Status:', 'APPROVED'],
-    ]
-    
-    receipt_table = Table(receipt_data, colWidths=[2*inch, 3*inch])
-    receipt_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
-    
-    elements.append(receipt_table)
-    elements.append(Spacer(1, 30))
-    
-    # Payment Information
-    payment_heading = Paragraph("Payment Information", heading_style)
-    elements.append(payment_heading)
-    
-    # Get description and format it properly for table display
-    due_description = getattr(payment.due, 'description', 'N/A')
-    if due_description and due_description != 'N/A':
-        # Wrap long descriptions in Paragraph for proper text wrapping
-        description_para = Paragraph(due_description, wrap_style)
-    else:
-        description_para = 'N/A'
-    
-    payment_data = [
-        ['Resident Name:', f"{payment.resident.first_name} {payment.resident.last_name}"],
-        ['Due Title:', payment.due.title],
-        ['Due Description:', description_para],  # Use Paragraph for text wrapping
-        ['Original Amount:', f"₦{payment.due.amount:,.2f}"],
-        ['Amount Paid:', f"₦{payment.amount_paid:,.2f}"]
-    ]
-    
-    # Increased column widths, especially for the second column to accommodate longer descriptions
-    payment_table = Table(payment_data, colWidths=[1.8*inch, 4.2*inch])
-    payment_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),  # Top alignment for better readability
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),  # Increased padding for better spacing
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightblue),
-        # Special styling for the description row to allow more height
-        ('ROWBACKGROUNDS', (0, 2), (-1, 2), [colors.white]),  # Description row background
-    ]))
-    
-    elements.append(payment_table)
-    elements.append(Spacer(1, 30))
-    
-    # Approval Information
-    approval_heading = Paragraph("Approval Information", heading_style)
-    elements.append(approval_heading)
-    
-    # Format admin notes with proper text wrapping
-    admin_notes = payment.admin_notes if payment.admin_notes else 'No additional notes'
-    if admin_notes and len(admin_notes) > 50:
-        notes_para = Paragraph(admin_notes, wrap_style)
-    else:
-        notes_para = admin_notes
-    
-    approval_data = [
-        ['Approved By:', f"{payment.approved_by.first_name} {payment.approved_by.last_name}" if payment.approved_by else 'Admin'],
-        ['Approval Date:', payment.approved_at.strftime("%B %d, %Y at %I:%M %p")],
-        ['Admin Notes:', notes_para],  # Use Paragraph for text wrapping if needed
-    ]
-    
-    approval_table = Table(approval_data, colWidths=[1.8*inch, 4.2*inch])
-    approval_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),  # Top alignment for better readability
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),  # Increased padding
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgreen),
-    ]))
-    
-    elements.append(approval_table)
-    elements.append(Spacer(1, 50))
-    
-    # Footer
-    footer_text = Paragraph(
-        "This is an official receipt for the approved payment. "
-        "Please keep this receipt for your records.",
-        ParagraphStyle(
-            'Footer',
-            parent=normal_style,
-            fontSize=10,
-            alignment=TA_CENTER,
-            textColor=colors.grey
-        )
-    )
-    elements.append(footer_text)
-    
-    # Build PDF
-    doc.build(elements)
-    
-    # Get the value of the BytesIO buffer and return it
-    pdf_data = buffer.getvalue()
-    buffer.close()
-    
-    return pdf_data
-
 @api_view(['POST'])
 def approve_payment_view(request, payment_id):
     if request.user.role != 'admin':
@@ -902,28 +687,12 @@ def approve_payment_view(request, payment_id):
         payment.approved_by = request.user
         payment.approved_at = timezone.now()
         payment.admin_notes = request.data.get('admin_notes', '')
+        payment.receipt_status = 'pending'
+        payment.receipt_error = ''
         payment.save()
 
-        # Generate receipt PDF
-        try:
-            pdf_data = generate_payment_receipt(payment)
-            
-            # Create filename
-            receipt_filename = f"receipt_{payment.id}_{payment.approved_at.strftime('%Y%m%d_%H%M%S')}.pdf"
-            
-            # Save the PDF file to the payment model
-            # receipt = models.FileField(upload_to='receipts/', null=True, blank=True)
-            
-            if hasattr(payment, 'receipt'):
-                payment.receipt.save(
-                    receipt_filename,
-                    ContentFile(pdf_data),
-                    save=True
-                )
-            
-        except Exception as e:
-            # Log the error but don't fail the approval process
-            print(f"Error generating receipt: {str(e)}")
+        # Receipt PDF is rendered and uploaded by a worker once the approval commits
+        transaction.on_commit(lambda: generate_receipt.delay(payment.id))
         
         # Create activity log
         ActivityLog.objects.create(
@@ -947,7 +716,9 @@ def approve_payment_view(request, payment_id):
                 
         return Response({
             'message': 'Payment approved successfully',
-            'receipt_url': payment.receipt.url if hasattr(payment, 'receipt') and payment.receipt else None
+            # Not generated yet; poll the receipt info endpoint for it
+            'receipt_url': None,
+            'receipt_status': payment.receipt_status,
         })
         
     except DuePayment.DoesNotExist:
@@ -991,7 +762,6 @@ def reject_payment_view(request, payment_id):
 # Dashboard Views
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
-@subscription_required
 def dashboard_view(request):
     estate = request.user.estate
     if request.user.role == 'admin':
@@ -1073,57 +843,104 @@ def payment_records_pdf_view(request):
     if request.user.role != 'admin':
         return Response({'error': 'Admin access required'}, status=403)
 
-    # Fetch all payments for this estate
-    payments = DuePayment.objects.filter(due__estate=request.user.estate).select_related('resident', 'due')
-
-    # Begin PDF build
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    elements = []
-
-    # Title & timestamp
-    elements.append(Paragraph(f"<b>All Payment Records - {request.user.estate.name}</b>", styles['Title']))
-    elements.append(Paragraph(f"Generated on: {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
-    elements.append(Spacer(1, 12))
-
-    # Table header
-    data = [
-        ['Resident', 'Description', 'Amount', 'Date', 'Status']
-    ]
-
-    # Populate rows
-    for p in payments:
-        resident_name = f"{p.resident.first_name} {p.resident.last_name}"
-        description   = p.due.title
-        amount_str    = f"₦{p.amount_paid:.2f}"
-        date_str      = timezone.localtime(p.payment_date).strftime('%Y-%m-%d')
-        status        = p.status.capitalize()
-
-        data.append([resident_name, description, amount_str, date_str, status])
-
-    # Create table
-    table = Table(data, colWidths=[120, 150, 80, 80, 80])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR',   (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN',       (2, 1), (4, -1), 'RIGHT'),
-        ('FONTNAME',    (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE',    (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING',(0,0),(-1,0),8),
-        ('GRID',        (0, 0), (-1, -1), 0.5, colors.black),
-    ]))
-
-    elements.append(table)
-    elements.append(Spacer(1, 12))
-
-    doc.build(elements)
-    buffer.seek(0)
-
-    # Stream back as PDF
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="payment_records.pdf"'
-    return response
+    return report_response(render_payments_report, request.user.estate, 'payment_records.pdf')
+
+def _export(request, columns, rows, filters, basename, title):
+    """Shared body of the CSV/XLSX export views"""
+    file_format = request.query_params.get('file_format', 'csv')
+    if file_format not in EXPORT_FORMATS:
+        return Response({'error': f"file_format must be one of: {', '.join(EXPORT_FORMATS)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        lookups = filters(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return export_response(file_format, columns, rows(request.user.estate, **lookups), basename, title)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def payment_records_export_view(request):
+    """Export payment records as CSV (streamed) or XLSX"""
+    if request.user.role != 'admin':
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+
+    return _export(request, PAYMENT_EXPORT_COLUMNS, payment_export_rows, payment_export_filters,
+                   'payment_records', 'Payments')
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def residents_export_view(request):
+    """Export residents as CSV (streamed) or XLSX"""
+    if request.user.role != 'admin':
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+
+    return _export(request, RESIDENT_EXPORT_COLUMNS, resident_export_rows, resident_export_filters,
+                   'residents', 'Residents')
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def report_jobs_view(request):
+    """Queue a PDF report, or reuse one already rendered over the same data"""
+    if request.user.role != 'admin':
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+
+    report = request.data.get('report')
+    if report not in REPORT_RENDERERS:
+        return Response({'error': f"report must be one of: {', '.join(REPORT_RENDERERS)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    job, created = request_report(request.user.estate, report, request.user)
+    if created:
+        transaction.on_commit(lambda: generate_report.delay(job.pk))
+
+    return Response(
+        _report_job_data(request, job),
+        status=status.HTTP_202_ACCEPTED if job.status != 'done' else status.HTTP_200_OK
+    )
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def report_job_status_view(request, job_id):
+    """Status of a report job, with a download link once it's done"""
+    if request.user.role != 'admin':
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+    job = get_object_or_404(ReportJob, job_id=job_id, estate_id=request.user.estate_id)
+    return Response(_report_job_data(request, job))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def report_job_download_view(request, job_id):
+    if request.user.role != 'admin':
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+    job = get_object_or_404(ReportJob, job_id=job_id, estate_id=request.user.estate_id)
+    if job.status != 'done' or not job.file:
+        return Response({'error': 'Report is not ready', 'status': job.status},
+                        status=status.HTTP_409_CONFLICT)
+
+    return FileResponse(job.file.open('rb'), as_attachment=True,
+                        filename=REPORT_FILENAMES[job.report], content_type='application/pdf')
+
+
+def _report_job_data(request, job):
+    data = {
+        'job_id': str(job.job_id),
+        'report': job.report,
+        'status': job.status,
+        'created_at': job.created_at,
+        'status_url': request.build_absolute_uri(reverse('report-job-status', args=[job.job_id])),
+    }
+    if job.status == 'done':
+        data['rows'] = job.row_count
+        data['download_url'] = request.build_absolute_uri(reverse('report-job-download', args=[job.job_id]))
+    elif job.status == 'failed':
+        data['error'] = job.error
+    return data
+
 
 @ensure_csrf_cookie
 def get_csrf_token(request):
@@ -1184,9 +1001,69 @@ class AnnouncementRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIVie
     def get_queryset(self):
         return Announcement.objects.filter(estate=self.request.user.estate)
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def task_metrics_view(request):
+    """Queue-wait and per-task timing aggregates for sizing Celery workers"""
+    from .task_metrics import get_queue_latency_metrics, get_task_metrics
+
+    return Response({
+        'queues': get_queue_latency_metrics(),
+        'tasks': get_task_metrics(),
+    })
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAdminUser])
 def sync_subscriptions_view(request):
-    results = sync_subscriptions_from_paystack()  # run synchronously
-    return JsonResponse({"results": results})
+    """Start a background Paystack sync, or point at the one already running"""
+    from .subscription_sync import acquire_sync_lock, current_sync_job
+
+    job_id = str(uuid.uuid4())
+    acquired = acquire_sync_lock(job_id)
+    running = None
+    if not acquired:
+        running = current_sync_job()
+        if running is None:
+            # The running job finished in between; try once more
+            acquired = acquire_sync_lock(job_id)
+    if not acquired:
+        data = {'job_id': running, 'status': 'already_running'}
+        if running:
+            data['status_url'] = request.build_absolute_uri(reverse('sync_subscriptions_status', args=[running]))
+        return Response(data, status=status.HTTP_409_CONFLICT)
+
+    full = str(request.data.get('full', '')).lower() in ['1', 'true', 'yes']
+    try:
+        sync_subscriptions_from_paystack.apply_async(kwargs={'full': full or None}, task_id=job_id)
+    except Exception:
+        from .subscription_sync import release_sync_lock
+        release_sync_lock(job_id)
+        raise
+
+    return Response({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': request.build_absolute_uri(reverse('sync_subscriptions_status', args=[job_id])),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def sync_subscriptions_status_view(request, job_id):
+    """Progress of a background Paystack sync"""
+    from celery.result import AsyncResult
+
+    result = AsyncResult(str(job_id))
+    data = {'job_id': str(job_id), 'state': result.state}
+
+    if result.state == 'PROGRESS':
+        data['progress'] = result.info
+    elif result.state == 'SUCCESS':
+        data['result'] = result.result
+    elif result.state == 'FAILURE':
+        data['error'] = str(result.result)
+
+    return Response(data)
 
 class ContactSupportView(generics.CreateAPIView):
     serializer_class = ContactSupportSerializer
@@ -1349,6 +1226,7 @@ def payment_receipt_info(request, payment_id):
             'payment_id': payment.id,
             'has_receipt': has_receipt,
             'status': payment.status,
+            'receipt_status': payment.receipt_status,
             'approved_at': payment.approved_at,
             'receipt_url': f'/api/payments/{payment_id}/receipt/view/' if has_receipt else None,
             'download_url': f'/api/payments/{payment_id}/receipt/download/' if has_receipt else None
@@ -1357,6 +1235,33 @@ def payment_receipt_info(request, payment_id):
     except DuePayment.DoesNotExist:
         return Response({'error': 'Payment not found'}, 
                       status=status.HTTP_404_NOT_FOUND)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def retry_receipt_view(request, payment_id):
+    """
+    Queue receipt generation again for an approved payment whose receipt
+    failed (or never arrived)
+    """
+    if request.user.role != 'admin':
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+
+    payment = get_object_or_404(DuePayment, id=payment_id, due__estate=request.user.estate)
+    if payment.status != 'approved':
+        return Response({'error': 'Only approved payments have receipts'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if payment.receipt_status == 'ready' and payment.receipt:
+        return Response({'error': 'Receipt already generated'}, status=status.HTTP_409_CONFLICT)
+
+    # A queryset update, so the DuePayment save signals don't fire again
+    DuePayment.objects.filter(pk=payment.pk).update(receipt_status='pending', receipt_error='')
+    transaction.on_commit(lambda: generate_receipt.delay(payment.id))
+
+    return Response({
+        'message': 'Receipt generation queued',
+        'receipt_status': 'pending',
+    }, status=status.HTTP_202_ACCEPTED)
     
 #Artisan and Domestic Staff Views
 class ArtisanOrDomesticStaffListCreateView(generics.ListCreateAPIView):
@@ -1472,18 +1377,15 @@ class AlertListCreateView(generics.ListCreateAPIView):
             else:
                 recipients = User.objects.none()
 
-            # Send notifications (with error handling)
-            for recipient in recipients:
-                try:
-                    if recipient.email:
-                        send_email_alert.delay(recipient.email, alert.id)
-                    if recipient.phone_number:
-                        send_sms_alert.delay(recipient.phone_number, alert.id)
-                except Exception as e:
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.error(f"Notification failed for user {recipient.id}: {str(e)}")
-                    
+            # Push already went out from the post_save signal; SMS/email only
+            # reach recipients the push didn't, per the 'alert' delivery policy
+            try:
+                schedule_fallback('alert', 'Alert', alert.id, list(recipients.values_list('id', flat=True)))
+            except Exception as e:
+                import logging
+                logger = logging.getLogger(__name__)
+                logger.error(f"Alert fallback scheduling failed for alert {alert.id}: {str(e)}")
+
         except Exception as e:
             import logging
             logger = logging.getLogger(__name__)
@@ -6,9 +6,13 @@ from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework import permissions
-from .models import UserSubscription, SubscriptionPlan
+from .models import UserSubscription, WebhookEvent
+from .entitlements import invalidate_entitlement
+from .plan_registry import get_plan_by_code, get_plan_codes
+from .paystack_client import get_paystack_client
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 
 User = get_user_model()
@@ -43,10 +47,79 @@ def parse_paystack_date(date_string):
         return None
 
 
+def get_subscription(subscription_code=None, customer_code=None, email=None):
+    """Resolve subscription, preferring subscription_code > customer_code > email."""
+    subs = UserSubscription.objects.select_related('user', 'plan')
+    if subscription_code:
+        sub = subs.filter(paystack_subscription_code=subscription_code).first()
+        if sub:
+            return sub
+    if customer_code:
+        sub = subs.filter(paystack_customer_code=customer_code).first()
+        if sub:
+            return sub
+    if email:
+        return subs.filter(user__email=email).order_by('-id').first()
+    return None
+
+
+def set_user_active_state(user, sub=None):
+    """
+    Set user.subscription_active from the user's subscription + grace period.
+
+    subscription_active isn't a model field, so nothing is written; pass the
+    subscription the handler already has to avoid looking it up again.
+
+    Returns:
+        bool: Whether the user has an active subscription
+    """
+    if sub is None:
+        sub = UserSubscription.objects.filter(user=user).first()
+    # If a cancelled sub still has time left, keep active
+    user.subscription_active = bool(sub) and (
+        sub.status == 'active'
+        or bool(sub.next_billing_date and sub.next_billing_date > timezone.now())
+    )
+    return user.subscription_active
+
+
+def update_subscription(sub, **fields):
+    """
+    Write only the given fields of a subscription in a single UPDATE.
+
+    A queryset update skips the model save signals (the audit snapshot SELECT
+    and friends), which webhook and sync writes have no use for. The instance
+    is updated in place so callers can keep using it, and the user's cached
+    entitlement is dropped since no signal will do it.
+    """
+    fields['updated_at'] = timezone.now()
+    UserSubscription.objects.filter(pk=sub.pk).update(**fields)
+    invalidate_entitlement(sub.user_id)
+    for name, value in fields.items():
+        setattr(sub, name, value)
+    return sub
+
+
+def _customer_key(data):
+    """Key that orders a customer's events: customer code, else email."""
+    customer = data.get('customer') or (data.get('subscription') or {}).get('customer') or {}
+    if not isinstance(customer, dict):
+        customer = {}
+    return customer.get('customer_code') or customer.get('email') or 'unknown'
+
+
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([])  # signed by Paystack; the anon rate would drop deliveries past 100/hour
 @csrf_exempt
 def paystack_webhook(request):
+    """
+    Verify and store a Paystack event, then acknowledge it straight away.
+
+    The event is handled by process_webhook_events in a worker. Paystack sends
+    no event id, so a digest of the raw body identifies redeliveries of the
+    same event.
+    """
     paystack_secret = settings.PAYSTACK_SECRET_KEY
     signature = request.headers.get('x-paystack-signature')
 
@@ -56,44 +129,40 @@ def paystack_webhook(request):
         digestmod=hashlib.sha512
     ).hexdigest()
 
-    if signature != computed_hash:
+    if not signature or not hmac.compare_digest(signature, computed_hash):
         return Response({'error': 'Invalid signature'}, status=400)
 
     event = request.data.get('event')
-    data = request.data.get('data', {})
-    print(f"Webhook received event: {event}")
-
-    # -------------------- HELPERS --------------------
-    def get_subscription(subscription_code=None, customer_code=None, email=None):
-        """Resolve subscription, preferring subscription_code > customer_code > email."""
-        if subscription_code:
-            sub = UserSubscription.objects.filter(paystack_subscription_code=subscription_code).first()
-            if sub:
-                return sub
-        if customer_code:
-            sub = UserSubscription.objects.filter(paystack_customer_code=customer_code).first()
-            if sub:
-                return sub
-        if email:
-            user = User.objects.filter(email=email).first()
-            if user:
-                return UserSubscription.objects.filter(user=user).order_by('-id').first()
-        return None
+    data = request.data.get('data') or {}
+    event_id = hashlib.sha256(request.body).hexdigest()
+    customer_key = _customer_key(data)
 
-    def set_user_active_state(user):
-        """Update user.subscription_active depending on subs + grace period."""
-        active_subs = UserSubscription.objects.filter(user=user, status="active")
-        if active_subs.exists():
-            user.subscription_active = True
-        else:
-            # If last cancelled sub still has time left, keep active
-            last_sub = UserSubscription.objects.filter(user=user).order_by('-next_billing_date').first()
-            if last_sub and last_sub.next_billing_date and last_sub.next_billing_date > timezone.now():
-                user.subscription_active = True
-            else:
-                user.subscription_active = False
-        user.save()
+    try:
+        with transaction.atomic():
+            webhook_event = WebhookEvent.objects.create(
+                event_id=event_id,
+                event=event or '',
+                customer_key=customer_key,
+                payload=request.data,
+            )
+    except IntegrityError:
+        print(f"Duplicate webhook delivery ignored: {event} ({event_id[:12]})")
+        return Response({'status': 'duplicate'}, status=200)
+
+    from .tasks import process_webhook_events
+    transaction.on_commit(lambda: process_webhook_events.delay(customer_key))
 
+    print(f"Webhook received event: {event} (inbox #{webhook_event.id})")
+    return Response({'status': 'queued'}, status=200)
+
+
+def handle_paystack_event(event, data):
+    """
+    Apply one Paystack event to local subscriptions.
+
+    Returns:
+        str: 'processed' or 'ignored'
+    """
     # ---------- CHARGE SUCCESS (first payment OR renewal) ----------
     if event == 'charge.success':
         print(f"[WEBHOOK DEBUG] Processing charge.success event")
@@ -115,7 +184,7 @@ def paystack_webhook(request):
 
         if not user:
             print(f"[WEBHOOK DEBUG] FAILURE - User not found - Email: {customer_email}")
-            return Response({'status': 'ignored'}, status=200)
+            return 'ignored'
 
         # Check if this is a renewal (no plan_data) or first payment (has plan_data)
         if not plan_data or not plan_code:
@@ -135,30 +204,32 @@ def paystack_webhook(request):
                 print(f"[WEBHOOK DEBUG] Renewal - Calculated dates - payment_date: {payment_date}, next_date: {next_date}")
 
                 # Update existing subscription
-                sub.authorization_code = authorization_code or sub.authorization_code
-                sub.status = 'active'
-                sub.next_billing_date = next_date
+                changes = {
+                    'authorization_code': authorization_code or sub.authorization_code,
+                    'status': 'active',
+                    'next_billing_date': next_date,
+                }
                 if subscription_code:
-                    sub.paystack_subscription_code = subscription_code
-                sub.save()
+                    changes['paystack_subscription_code'] = subscription_code
+                update_subscription(sub, **changes)
                 print(f"[WEBHOOK DEBUG] SUCCESS - Updated subscription {sub.id} for renewal payment for {user.email}")
 
-                set_user_active_state(user)
+                set_user_active_state(user, sub)
                 print(f"[WEBHOOK DEBUG] Updated user active state for {user.email}")
-                return Response({'status': 'success'}, status=200)
+                return 'processed'
             else:
                 print(f"[WEBHOOK DEBUG] FAILURE - No existing subscription found for renewal - Email: {customer_email}")
-                return Response({'status': 'ignored'}, status=200)
+                return 'ignored'
 
         # First-time payment with plan_data
-        plan = SubscriptionPlan.objects.filter(paystack_plan_code=plan_code).first()
+        plan = get_plan_by_code(plan_code)
 
         print(f"[WEBHOOK DEBUG] User found: {user is not None}, Plan found: {plan is not None}")
 
         if not plan:
             print(f"[WEBHOOK DEBUG] FAILURE - Plan not found - Plan: {plan_code}")
-            print(f"[WEBHOOK DEBUG] Available plans: {list(SubscriptionPlan.objects.values_list('paystack_plan_code', flat=True))}")
-            return Response({'status': 'ignored'}, status=200)
+            print(f"[WEBHOOK DEBUG] Available plans: {get_plan_codes()}")
+            return 'ignored'
 
         # Payment date
         paid_at = data.get('paid_at') or data.get('created_at')
@@ -177,52 +248,42 @@ def paystack_webhook(request):
         if not subscription_code and authorization_code:
             print(f"[WEBHOOK DEBUG] No subscription_code - Creating subscription on Paystack")
             try:
-                import requests
-                PAYSTACK_SECRET_KEY = settings.PAYSTACK_SECRET_KEY
-                headers = {
-                    "Authorization": f"Bearer {PAYSTACK_SECRET_KEY}",
-                    "Content-Type": "application/json"
-                }
-                payload = {
-                    "customer": customer_code,
-                    "plan": plan_code,
-                    "authorization": authorization_code
-                }
-
-                response = requests.post(
-                    "https://api.paystack.co/subscription",
-                    json=payload,
-                    headers=headers
+                response = get_paystack_client().create_subscription(
+                    customer=customer_code,
+                    plan=plan_code,
+                    authorization=authorization_code
                 )
 
-                print(f"[WEBHOOK DEBUG] Paystack subscription creation response: {response.status_code}")
+                print(f"[WEBHOOK DEBUG] Paystack subscription creation response: {response.get('status')}")
 
-                if response.status_code == 200 or response.status_code == 201:
-                    sub_data = response.json().get('data', {})
+                if response.get('status'):
+                    sub_data = response.get('data', {})
                     subscription_code = sub_data.get('subscription_code')
                     email_token = sub_data.get('email_token', '')
                     print(f"[WEBHOOK DEBUG] Created subscription on Paystack: {subscription_code}, email_token: {email_token}")
                 else:
-                    print(f"[WEBHOOK DEBUG] Failed to create subscription on Paystack: {response.text}")
+                    print(f"[WEBHOOK DEBUG] Failed to create subscription on Paystack: {response.get('message')}")
             except Exception as e:
                 print(f"[WEBHOOK DEBUG] Error creating subscription on Paystack: {str(e)}")
 
         if sub:
             print(f"[WEBHOOK DEBUG] Updating existing subscription {sub.id}")
-            sub.authorization_code = authorization_code or sub.authorization_code
-            sub.plan = plan
-            sub.status = 'active'
-            sub.next_billing_date = next_date
+            changes = {
+                'authorization_code': authorization_code or sub.authorization_code,
+                'plan': plan,
+                'status': 'active',
+                'next_billing_date': next_date,
+            }
             if subscription_code:
-                sub.paystack_subscription_code = subscription_code
+                changes['paystack_subscription_code'] = subscription_code
             if email_token:
-                sub.email_token = email_token
-            sub.save()
+                changes['email_token'] = email_token
+            update_subscription(sub, **changes)
             print(f"[WEBHOOK DEBUG] SUCCESS - Updated subscription {sub.id} for {user.email}")
         else:
             print(f"[WEBHOOK DEBUG] Creating new subscription for {user.email}")
             try:
-                new_sub = UserSubscription.objects.create(
+                sub = UserSubscription.objects.create(
                     user=user,
                     paystack_customer_code=customer_code,
                     paystack_subscription_code=subscription_code or '',
@@ -232,12 +293,12 @@ def paystack_webhook(request):
                     status='active',
                     next_billing_date=next_date
                 )
-                print(f"[WEBHOOK DEBUG] SUCCESS - Created subscription {new_sub.id} for {user.email}")
+                print(f"[WEBHOOK DEBUG] SUCCESS - Created subscription {sub.id} for {user.email}")
             except Exception as e:
                 print(f"[WEBHOOK DEBUG] FAILURE - Error creating subscription: {str(e)}")
                 raise
 
-        set_user_active_state(user)
+        set_user_active_state(user, sub)
         print(f"[WEBHOOK DEBUG] Updated user active state for {user.email}")
 
     # ---------- SUBSCRIPTION CREATE ----------
@@ -252,24 +313,26 @@ def paystack_webhook(request):
         plan_code = plan_data.get('plan_code')
 
         user = User.objects.filter(email=customer_email).first()
-        plan = SubscriptionPlan.objects.filter(paystack_plan_code=plan_code).first()
+        plan = get_plan_by_code(plan_code)
         if not user or not plan:
             print(f"User or plan not found - Email: {customer_email}, Plan: {plan_code}")
-            return Response({'status': 'ignored'}, status=200)
+            return 'ignored'
 
         next_date = parse_paystack_date(next_payment_date) or calculate_next_billing_date(plan)
 
         sub = get_subscription(subscription_code, customer_code, customer_email)
 
         if sub:
-            sub.paystack_subscription_code = subscription_code
-            sub.plan = plan
-            sub.status = "active"
-            sub.next_billing_date = next_date
-            sub.save()
+            update_subscription(
+                sub,
+                paystack_subscription_code=subscription_code,
+                plan=plan,
+                status="active",
+                next_billing_date=next_date,
+            )
             print(f"Updated subscription {sub.id} for {user.email}")
         else:
-            UserSubscription.objects.create(
+            sub = UserSubscription.objects.create(
                 user=user,
                 paystack_customer_code=customer_code,
                 paystack_subscription_code=subscription_code,
@@ -279,7 +342,7 @@ def paystack_webhook(request):
             )
             print(f"Created subscription for {user.email}")
 
-        set_user_active_state(user)
+        set_user_active_state(user, sub)
 
     # ---------- PAYMENT SUCCESSFUL ----------
     elif event == 'invoice.payment_successful':
@@ -298,11 +361,9 @@ def paystack_webhook(request):
                 payment_date = parse_paystack_date(paid_at) or datetime.datetime.now(datetime.timezone.utc)
                 next_date = calculate_next_billing_date(sub.plan, payment_date)
 
-            sub.next_billing_date = next_date
-            sub.status = "active"
-            sub.save()
+            update_subscription(sub, next_billing_date=next_date, status="active")
 
-            set_user_active_state(sub.user)
+            set_user_active_state(sub.user, sub)
             print(f"Payment successful for {sub.user.email} - Next billing: {next_date}")
         else:
             print(f"No subscription found for payment successful - Email: {customer_email}")
@@ -316,9 +377,8 @@ def paystack_webhook(request):
         sub = get_subscription(subscription_code, customer_code, customer_email)
 
         if sub:
-            sub.status = "past_due"
-            sub.save()
-            set_user_active_state(sub.user)
+            update_subscription(sub, status="past_due")
+            set_user_active_state(sub.user, sub)
             print(f"Payment failed for {sub.user.email}")
         else:
             print(f"No subscription found for payment failed - Email: {customer_email}")
@@ -331,9 +391,8 @@ def paystack_webhook(request):
         sub = get_subscription(subscription_code, None, customer_email)
 
         if sub:
-            sub.status = "cancelled"
-            sub.save()
-            set_user_active_state(sub.user)
+            update_subscription(sub, status="cancelled")
+            set_user_active_state(sub.user, sub)
             print(f"Subscription disabled for {sub.user.email}")
         else:
             print(f"No subscription found for disable - Code: {subscription_code}")
@@ -346,17 +405,18 @@ def paystack_webhook(request):
         sub = get_subscription(subscription_code, None, customer_email)
 
         if sub:
-            sub.status = "active"
+            changes = {'status': "active"}
             next_payment_date = data.get('next_payment_date')
             if next_payment_date:
-                sub.next_billing_date = parse_paystack_date(next_payment_date) or calculate_next_billing_date(sub.plan)
-            sub.save()
-            set_user_active_state(sub.user)
+                changes['next_billing_date'] = parse_paystack_date(next_payment_date) or calculate_next_billing_date(sub.plan)
+            update_subscription(sub, **changes)
+            set_user_active_state(sub.user, sub)
             print(f"Subscription enabled for {sub.user.email}")
         else:
             print(f"No subscription found for enable - Code: {subscription_code}")
 
     else:
         print(f"Unhandled event type: {event}")
+        return 'ignored'
 
-    return Response({'status': 'success'}, status=200)
+    return 'processed'